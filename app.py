@@ -6,18 +6,36 @@ Servidor Flask para procesar imágenes de caudalímetros desde dispositivos móv
 
 import os
 import json
+import time
+import uuid
+import tempfile
+import threading
+from concurrent.futures import wait, FIRST_COMPLETED
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory, render_template_string
+from flask import Flask, Request, Response, request, jsonify, send_from_directory, g, url_for
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-import base64
-from io import BytesIO
 
-from extractor_rojo import procesar_caudalimetro, procesar_area_especifica
-from qr_processor import escanear_qr_desde_base64, parsear_url_google_forms
+from extractor_rojo import (procesar_caudalimetro, procesar_area_especifica, procesar_con_perfil,
+                            VERSION_PREPROCESADO, MOTORES_OCR)
+from qr_processor import (escanear_qr_bytes, es_formulario_google, parsear_url_google_forms,
+                          procesar_medidor_y_qr, caches_qr)
+from cache_resultados import CacheResultados
+from cola_ocr import ColaLlenaError, obtener_cola
+from trabajos import GestorTrabajos, vista_publica
+from perfiles_medidor import obtener_registro
+from sesion_imagenes import obtener_almacen, procesar_area_de_sesion, IMAGENES_TTL
+from pagina_web import construir_recursos
+
+# flask-sock es opcional: sin él el escaneo de QR usa solo peticiones HTTP
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 app = Flask(__name__)
 CORS(app)  # Permitir CORS para acceso desde móviles
+sock = Sock(app) if Sock is not None else None
 
 # Configuración
 # Usar /data/uploads en producción (Docker) o uploads local en desarrollo
@@ -25,9 +43,61 @@ UPLOAD_FOLDER = Path(os.getenv('UPLOAD_FOLDER', '/data/uploads'))
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# Tamaño hasta el que un archivo subido se mantiene en memoria; por encima se
+# vuelca a un temporal con nombre único en UPLOAD_FOLDER
+UPLOAD_MEMORIA_MAX = int(os.getenv('UPLOAD_MEMORIA_MAX', str(MAX_FILE_SIZE)))
+# Límites de /process-batch (varias fotos en una sola petición)
+BATCH_MAX_IMAGENES = int(os.getenv('BATCH_MAX_IMAGENES', '100'))
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', str(300 * 1024 * 1024)))  # 300MB
+# Segundos máximos que una imagen de un lote espera hueco en la cola de OCR
+BATCH_ESPERA_COLA = 60
+# Fotos que /process-batch procesa dentro de la petición; los lotes mayores
+# pasan a un trabajo asíncrono (/jobs) para no superar el timeout de gunicorn
+BATCH_MAX_SINCRONO = int(os.getenv('BATCH_MAX_SINCRONO', '10'))
+# Un solo OCR por imagen para todas las áreas rojas (en lugar de uno por área)
+OCR_MODO_LOTE = os.getenv('OCR_MODO_LOTE', 'false').lower() in ('1', 'true', 'yes')
+# Sensibilidad de la detección de rojo (0-255; más alto = rojo más saturado)
+UMBRAL_ROJO = int(os.getenv('RED_DETECTION_THRESHOLD', '100'))
+# Segundos máximos (y por defecto) de presupuesto de tiempo en /process
+OCR_PRESUPUESTO_MAX = float(os.getenv('OCR_PRESUPUESTO_MAX', '90'))
+# Motor de OCR por defecto ('tesseract' o 'lcd' para displays de siete segmentos)
+OCR_MOTOR = os.getenv('OCR_MOTOR', 'tesseract')
+# Sesiones de escaneo de QR por WebSocket abiertas a la vez por worker (cada una ocupa un thread)
+QR_SESIONES_MAX = int(os.getenv('QR_SESIONES_MAX', '1'))
+# Segundos máximos de una sesión de escaneo de QR
+QR_SESION_MAX_S = float(os.getenv('QR_SESION_MAX_S', '60'))
+# Parámetros de procesamiento de imagen completa (forman parte de la clave de caché)
+PARAMETROS_CAUDALIMETRO = {
+    'operacion': 'caudalimetro',
+    'idioma': 'spa',
+    'umbral_rojo': UMBRAL_ROJO,
+    'modo_lote': OCR_MODO_LOTE,
+    'psm': 11 if OCR_MODO_LOTE else 7,
+    'motor': OCR_MOTOR
+}
 
 app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
+
+
+class RequestEnMemoria(Request):
+    """
+    Petición cuyos archivos subidos se guardan en un buffer en memoria y solo
+    pasan a disco (temporal anónimo y único) si superan UPLOAD_MEMORIA_MAX.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_MEMORIA_MAX, mode='rb+',
+                                             dir=UPLOAD_FOLDER)
+
+
+app.request_class = RequestEnMemoria
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+# Mismo límite por frame en el WebSocket de escaneo de QR
+app.config['SOCK_SERVER_OPTIONS'] = {'max_message_size': MAX_FILE_SIZE, 'ping_interval': 25}
+
+# Caché de resultados en disco compartida por todos los workers (CACHE_DIR)
+cache_resultados = CacheResultados()
 
 
 def allowed_file(filename):
@@ -36,882 +106,192 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-@app.route('/')
-def index():
-    """Página principal con interfaz móvil."""
-    html = """
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
-    <title>Extractor Caudalímetros</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-        }
-        
-        .container {
-            background: white;
-            border-radius: 20px;
-            padding: 30px;
-            max-width: 500px;
-            width: 100%;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-        }
-        
-        h1 {
-            color: #333;
-            text-align: center;
-            margin-bottom: 10px;
-            font-size: 24px;
-        }
-        
-        .subtitle {
-            text-align: center;
-            color: #666;
-            margin-bottom: 30px;
-            font-size: 14px;
-        }
-        
-        .camera-container {
-            position: relative;
-            margin-bottom: 20px;
-        }
-        
-        #video {
-            width: 100%;
-            border-radius: 10px;
-            background: #000;
-            display: none;
-        }
-        
-        #canvas {
-            display: none;
-        }
-        
-        .preview-image {
-            width: 100%;
-            border-radius: 10px;
-            margin-bottom: 20px;
-            display: block;
-        }
-        
-        .preview-wrapper {
-            position: relative;
-            display: none;
-            margin-bottom: 20px;
-            width: 100%;
-        }
-        
-        #selectionCanvas {
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            border-radius: 10px;
-            cursor: crosshair;
-            display: none;
-        }
-        
-        .selection-info {
-            background: rgba(102, 126, 234, 0.9);
-            color: white;
-            padding: 10px;
-            border-radius: 5px;
-            margin-bottom: 10px;
-            display: none;
-            font-size: 14px;
-        }
-        
-        .button-group {
-            display: flex;
-            flex-direction: column;
-            gap: 10px;
-        }
-        
-        button {
-            padding: 15px 25px;
-            border: none;
-            border-radius: 10px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: all 0.3s;
-            color: white;
-        }
-        
-        .btn-primary {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        }
-        
-        .btn-primary:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(102, 126, 234, 0.4);
-        }
-        
-        .btn-secondary {
-            background: #6c757d;
-        }
-        
-        .btn-success {
-            background: #28a745;
-        }
-        
-        .btn-danger {
-            background: #dc3545;
-        }
-        
-        button:disabled {
-            opacity: 0.6;
-            cursor: not-allowed;
-        }
-        
-        .results {
-            margin-top: 20px;
-            padding: 20px;
-            background: #f8f9fa;
-            border-radius: 10px;
-            display: none;
-        }
-        
-        .results h2 {
-            color: #333;
-            margin-bottom: 15px;
-            font-size: 20px;
-        }
-        
-        .result-item {
-            background: white;
-            padding: 15px;
-            margin-bottom: 10px;
-            border-radius: 8px;
-            border-left: 4px solid #667eea;
-        }
-        
-        .result-item strong {
-            color: #667eea;
-            display: block;
-            margin-bottom: 5px;
-        }
-        
-        .result-value {
-            font-size: 18px;
-            color: #333;
-            font-weight: 600;
-        }
-        
-        .loading {
-            text-align: center;
-            padding: 20px;
-            display: none;
-        }
-        
-        .spinner {
-            border: 4px solid #f3f3f3;
-            border-top: 4px solid #667eea;
-            border-radius: 50%;
-            width: 40px;
-            height: 40px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 10px;
-        }
-        
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        
-        .error {
-            background: #f8d7da;
-            color: #721c24;
-            padding: 15px;
-            border-radius: 8px;
-            margin-top: 10px;
-            display: none;
-        }
-        
-        .file-input-wrapper {
-            position: relative;
-            overflow: hidden;
-            display: inline-block;
-            width: 100%;
-        }
-        
-        .file-input-wrapper input[type=file] {
-            position: absolute;
-            left: -9999px;
-        }
-        
-        .file-input-label {
-            display: block;
-            padding: 15px 25px;
-            background: #6c757d;
-            color: white;
-            border-radius: 10px;
-            text-align: center;
-            cursor: pointer;
-            transition: all 0.3s;
-        }
-        
-        .file-input-label:hover {
-            background: #5a6268;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>📊 Extractor Caudalímetros</h1>
-        <p class="subtitle">Captura y extrae datos de medidores</p>
-        
-        <div class="camera-container">
-            <video id="video" autoplay playsinline></video>
-            <canvas id="canvas"></canvas>
-            <div class="preview-wrapper" id="previewWrapper">
-                <img id="preview" class="preview-image" alt="Vista previa">
-                <canvas id="selectionCanvas"></canvas>
-            </div>
-        </div>
-        
-        <div class="selection-info" id="selectionInfo">
-            Selecciona un área arrastrando sobre la imagen
-        </div>
-        
-        <div class="button-group">
-            <button id="startCamera" class="btn-primary">📷 Activar Cámara</button>
-            <button id="capture" class="btn-success" style="display: none;">📸 Capturar</button>
-            <button id="retake" class="btn-secondary" style="display: none;">🔄 Volver a Capturar</button>
-            <button id="selectArea" class="btn-primary" style="display: none;">🎯 Seleccionar Área</button>
-            <button id="process" class="btn-primary" style="display: none;">⚙️ Procesar Imagen Completa</button>
-            <button id="processArea" class="btn-success" style="display: none;">✅ Procesar Área Seleccionada</button>
-            
-            <div class="file-input-wrapper">
-                <label for="fileInput" class="file-input-label">📁 Seleccionar desde Galería</label>
-                <input type="file" id="fileInput" accept="image/*" capture="environment">
-            </div>
-        </div>
-        
-        <div class="loading" id="loading">
-            <div class="spinner"></div>
-            <p>Procesando imagen...</p>
-        </div>
-        
-        <div class="error" id="error"></div>
-        
-        <div class="results" id="results">
-            <h2>📋 Resultados</h2>
-            <div id="resultsContent"></div>
-        </div>
-    </div>
+def clave_cache(datos, parametros):
+    """Clave de caché para estos bytes y parámetros en la versión actual del pipeline."""
+    return CacheResultados.clave(datos, {**parametros, 'version': VERSION_PREPROCESADO})
+
+
+def con_cache(datos, parametros, nombre, procesar):
+    """
+    Devuelve el resultado en caché para estos bytes y parámetros o lo calcula
+    con `procesar()` y lo guarda. Los resultados parciales (presupuesto de
+    tiempo agotado) no se guardan. Devuelve la tupla (resultados, acierto).
+    """
+    clave = clave_cache(datos, parametros)
+    resultados = cache_resultados.obtener(clave)
+    if resultados is not None:
+        resultados['archivo'] = nombre
+        return resultados, True
     
-    <script>
-        const video = document.getElementById('video');
-        const canvas = document.getElementById('canvas');
-        const preview = document.getElementById('preview');
-        const previewWrapper = document.getElementById('previewWrapper');
-        const selectionCanvas = document.getElementById('selectionCanvas');
-        const selectionInfo = document.getElementById('selectionInfo');
-        const startBtn = document.getElementById('startCamera');
-        const captureBtn = document.getElementById('capture');
-        const retakeBtn = document.getElementById('retake');
-        const selectAreaBtn = document.getElementById('selectArea');
-        const processBtn = document.getElementById('process');
-        const processAreaBtn = document.getElementById('processArea');
-        const fileInput = document.getElementById('fileInput');
-        const loading = document.getElementById('loading');
-        const error = document.getElementById('error');
-        const results = document.getElementById('results');
-        const resultsContent = document.getElementById('resultsContent');
-        
-        let stream = null;
-        let currentImageData = null;
-        let isSelecting = false;
-        let selectionStart = { x: 0, y: 0 };
-        let selectionEnd = { x: 0, y: 0 };
-        let selectedArea = null;
-        
-        // Activar cámara
-        startBtn.addEventListener('click', async () => {
-            try {
-                stream = await navigator.mediaDevices.getUserMedia({
-                    video: { 
-                        facingMode: 'environment', // Cámara trasera
-                        width: { ideal: 1920 },
-                        height: { ideal: 1080 }
-                    }
-                });
-                video.srcObject = stream;
-                video.style.display = 'block';
-                startBtn.style.display = 'none';
-                captureBtn.style.display = 'block';
-                hideError();
-            } catch (err) {
-                showError('Error al acceder a la cámara: ' + err.message);
-            }
-        });
-        
-        // Capturar foto
-        captureBtn.addEventListener('click', () => {
-            canvas.width = video.videoWidth;
-            canvas.height = video.videoHeight;
-            const ctx = canvas.getContext('2d');
-            ctx.drawImage(video, 0, 0);
-            
-            canvas.toBlob((blob) => {
-                const reader = new FileReader();
-                reader.onload = (e) => {
-                    currentImageData = e.target.result;
-                    preview.src = currentImageData;
-                    // Asegurar que la imagen se muestre
-                    previewWrapper.style.display = 'block';
-                    preview.style.display = 'block';
-                    
-                    preview.onload = () => {
-                        setupPreview();
-                        // Asegurar visibilidad después de cargar
-                        previewWrapper.style.display = 'block';
-                        preview.style.display = 'block';
-                    };
-                    
-                    video.style.display = 'none';
-                    captureBtn.style.display = 'none';
-                    retakeBtn.style.display = 'block';
-                    processBtn.style.display = 'block';
-                    selectAreaBtn.style.display = 'block';
-                    
-                    // Detener cámara
-                    if (stream) {
-                        stream.getTracks().forEach(track => track.stop());
-                        stream = null;
-                    }
-                };
-                reader.readAsDataURL(blob);
-            }, 'image/jpeg', 0.9);
-        });
-        
-        // Volver a capturar
-        retakeBtn.addEventListener('click', () => {
-            previewWrapper.style.display = 'none';
-            selectionCanvas.style.display = 'none';
-            selectionInfo.style.display = 'none';
-            currentImageData = null;
-            selectedArea = null;
-            retakeBtn.style.display = 'none';
-            processBtn.style.display = 'none';
-            selectAreaBtn.style.display = 'none';
-            processAreaBtn.style.display = 'none';
-            results.style.display = 'none';
-            startBtn.style.display = 'block';
-            hideError();
-        });
-        
-        // Configurar preview y canvas de selección
-        function setupPreview() {
-            // Esperar a que la imagen se cargue completamente
-            if (preview.complete) {
-                const rect = preview.getBoundingClientRect();
-                selectionCanvas.width = preview.offsetWidth;
-                selectionCanvas.height = preview.offsetHeight;
-            } else {
-                preview.onload = () => {
-                    const rect = preview.getBoundingClientRect();
-                    selectionCanvas.width = preview.offsetWidth;
-                    selectionCanvas.height = preview.offsetHeight;
-                };
-            }
-        }
-        
-        // Activar modo de selección
-        selectAreaBtn.addEventListener('click', () => {
-            isSelecting = true;
-            selectedArea = null;
-            // Asegurar que la imagen esté visible
-            previewWrapper.style.display = 'block';
-            preview.style.display = 'block';
-            // Mostrar canvas de selección sobre la imagen
-            selectionCanvas.style.display = 'block';
-            selectionInfo.style.display = 'block';
-            selectionCanvas.style.cursor = 'crosshair';
-            processAreaBtn.style.display = 'none';
-            // Ocultar botón de procesar imagen completa mientras se selecciona
-            processBtn.style.display = 'none';
-        });
-        
-        // Manejar selección de área
-        function getEventPos(e) {
-            const rect = selectionCanvas.getBoundingClientRect();
-            const scaleX = preview.naturalWidth / preview.offsetWidth;
-            const scaleY = preview.naturalHeight / preview.offsetHeight;
-            return {
-                x: (e.clientX - rect.left) * scaleX,
-                y: (e.clientY - rect.top) * scaleY
-            };
-        }
-        
-        selectionCanvas.addEventListener('mousedown', (e) => {
-            if (!isSelecting) return;
-            const pos = getEventPos(e);
-            selectionStart = pos;
-            selectionEnd = pos;
-        });
-        
-        selectionCanvas.addEventListener('mousemove', (e) => {
-            if (!isSelecting) return;
-            if (e.buttons === 1) {
-                selectionEnd = getEventPos(e);
-                drawSelection();
-            }
-        });
-        
-        selectionCanvas.addEventListener('mouseup', (e) => {
-            if (!isSelecting) return;
-            selectionEnd = getEventPos(e);
-            drawSelection();
-            finalizeSelection();
-        });
-        
-        // Touch events para móviles
-        selectionCanvas.addEventListener('touchstart', (e) => {
-            if (!isSelecting) return;
-            e.preventDefault();
-            const touch = e.touches[0];
-            const pos = getEventPos(touch);
-            selectionStart = pos;
-            selectionEnd = pos;
-        });
-        
-        selectionCanvas.addEventListener('touchmove', (e) => {
-            if (!isSelecting) return;
-            e.preventDefault();
-            const touch = e.touches[0];
-            selectionEnd = getEventPos(touch);
-            drawSelection();
-        });
-        
-        selectionCanvas.addEventListener('touchend', (e) => {
-            if (!isSelecting) return;
-            e.preventDefault();
-            finalizeSelection();
-        });
-        
-        function drawSelection() {
-            const ctx = selectionCanvas.getContext('2d');
-            ctx.clearRect(0, 0, selectionCanvas.width, selectionCanvas.height);
-            
-            const x = Math.min(selectionStart.x / (preview.naturalWidth / preview.offsetWidth), 
-                             selectionEnd.x / (preview.naturalWidth / preview.offsetWidth));
-            const y = Math.min(selectionStart.y / (preview.naturalHeight / preview.offsetHeight),
-                             selectionEnd.y / (preview.naturalHeight / preview.offsetHeight));
-            const w = Math.abs(selectionEnd.x - selectionStart.x) / (preview.naturalWidth / preview.offsetWidth);
-            const h = Math.abs(selectionEnd.y - selectionStart.y) / (preview.naturalHeight / preview.offsetHeight);
-            
-            // Dibujar rectángulo de selección
-            ctx.strokeStyle = '#667eea';
-            ctx.lineWidth = 2;
-            ctx.setLineDash([5, 5]);
-            ctx.strokeRect(x, y, w, h);
-            
-            // Relleno semitransparente
-            ctx.fillStyle = 'rgba(102, 126, 234, 0.2)';
-            ctx.fillRect(x, y, w, h);
-        }
-        
-        function finalizeSelection() {
-            const x = Math.min(selectionStart.x, selectionEnd.x);
-            const y = Math.min(selectionStart.y, selectionEnd.y);
-            const ancho = Math.abs(selectionEnd.x - selectionStart.x);
-            const alto = Math.abs(selectionEnd.y - selectionStart.y);
-            
-            if (ancho > 10 && alto > 10) {
-                selectedArea = { x, y, ancho, alto };
-                processAreaBtn.style.display = 'block';
-                selectionInfo.textContent = `✅ Área seleccionada: ${Math.round(ancho)}x${Math.round(alto)}px - Haz clic en "Procesar Área Seleccionada"`;
-                // Mostrar la imagen y el área seleccionada
-                previewWrapper.style.display = 'block';
-                preview.style.display = 'block';
-            }
-        }
-        
-        // Procesar área seleccionada
-        processAreaBtn.addEventListener('click', async () => {
-            if (!selectedArea || !currentImageData) {
-                showError('Por favor, selecciona un área primero');
-                return;
-            }
-            
-            // Asegurar que la imagen esté visible
-            previewWrapper.style.display = 'block';
-            preview.style.display = 'block';
-            
-            loading.style.display = 'block';
-            results.style.display = 'none';
-            hideError();
-            processAreaBtn.disabled = true;
-            
-            try {
-                const blob = await (await fetch(currentImageData)).blob();
-                const formData = new FormData();
-                formData.append('image', blob, 'caudalimetro.jpg');
-                formData.append('x', Math.round(selectedArea.x));
-                formData.append('y', Math.round(selectedArea.y));
-                formData.append('ancho', Math.round(selectedArea.ancho));
-                formData.append('alto', Math.round(selectedArea.alto));
-                
-                const response = await fetch('/process-area', {
-                    method: 'POST',
-                    body: formData
-                });
-                
-                const data = await response.json();
-                
-                if (data.error) {
-                    showError(data.error);
-                } else {
-                    // Mantener la imagen visible y mostrar resultados
-                    previewWrapper.style.display = 'block';
-                    preview.style.display = 'block';
-                    displayAreaResults(data);
-                }
-            } catch (err) {
-                showError('Error al procesar área: ' + err.message);
-            } finally {
-                loading.style.display = 'none';
-                processAreaBtn.disabled = false;
-            }
-        });
-        
-        let valorMedidorExtraido = null;
-        
-        function displayAreaResults(data) {
-            resultsContent.innerHTML = '';
-            
-            if (data.texto_una_linea || data.texto_extraido) {
-                const texto = data.texto_una_linea || data.texto_extraido;
-                valorMedidorExtraido = texto;
-                const div = document.createElement('div');
-                div.className = 'result-item';
-                div.innerHTML = `
-                    <strong>Texto Extraído (Izquierda a Derecha):</strong>
-                    <div class="result-value" style="font-size: 20px; font-weight: bold; color: #667eea;">${texto}</div>
-                `;
-                resultsContent.appendChild(div);
-            }
-            
-            if (data.numeros_encontrados && data.numeros_encontrados.length > 0) {
-                const div = document.createElement('div');
-                div.className = 'result-item';
-                div.innerHTML = `
-                    <strong>Números Detectados:</strong>
-                    <div class="result-value">${data.numeros_encontrados.map(n => n.valor).join(', ')}</div>
-                `;
-                resultsContent.appendChild(div);
-            }
-            
-            // Agregar botón para escanear QR y rellenar formulario
-            if (valorMedidorExtraido) {
-                const qrDiv = document.createElement('div');
-                qrDiv.className = 'result-item';
-                qrDiv.style.background = '#e7f3ff';
-                qrDiv.style.borderLeft = '4px solid #2196F3';
-                qrDiv.innerHTML = `
-                    <strong>📋 Siguiente Paso: Rellenar Formulario</strong>
-                    <p style="margin: 10px 0; color: #666;">Escanea el código QR del formulario de Google para rellenarlo automáticamente</p>
-                    <button id="scanQRBtn" class="btn-primary" style="width: 100%; margin-top: 10px;">
-                        📷 Escanear QR del Formulario
-                    </button>
-                `;
-                resultsContent.appendChild(qrDiv);
-            }
-            
-            results.style.display = 'block';
-        }
-        
-        // Procesar imagen
-        processBtn.addEventListener('click', async () => {
-            if (!currentImageData) return;
-            
-            loading.style.display = 'block';
-            results.style.display = 'none';
-            hideError();
-            processBtn.disabled = true;
-            
-            try {
-                // Convertir data URL a blob
-                const blob = await (await fetch(currentImageData)).blob();
-                const formData = new FormData();
-                formData.append('image', blob, 'caudalimetro.jpg');
-                
-                const response = await fetch('/process', {
-                    method: 'POST',
-                    body: formData
-                });
-                
-                const data = await response.json();
-                
-                if (data.error) {
-                    showError(data.error);
-                } else {
-                    displayResults(data);
-                }
-            } catch (err) {
-                showError('Error al procesar: ' + err.message);
-            } finally {
-                loading.style.display = 'none';
-                processBtn.disabled = false;
-            }
-        });
-        
-        function displayResults(data) {
-            resultsContent.innerHTML = '';
-            
-            if (data.texto_rojo && data.texto_rojo.length > 0) {
-                data.texto_rojo.forEach((area, index) => {
-                    const div = document.createElement('div');
-                    div.className = 'result-item';
-                    div.innerHTML = `
-                        <strong>Área ${area.area}:</strong>
-                        <div class="result-value">${area.texto}</div>
-                    `;
-                    resultsContent.appendChild(div);
-                });
-            }
-            
-            if (data.numeros_encontrados && data.numeros_encontrados.length > 0) {
-                const div = document.createElement('div');
-                div.className = 'result-item';
-                div.innerHTML = `
-                    <strong>Valores Detectados:</strong>
-                    <div class="result-value">${data.numeros_encontrados.map(n => n.valor).join(', ')}</div>
-                `;
-                resultsContent.appendChild(div);
-            }
-            
-            if (data.texto_completo) {
-                const div = document.createElement('div');
-                div.className = 'result-item';
-                div.innerHTML = `
-                    <strong>Texto Completo:</strong>
-                    <div>${data.texto_completo}</div>
-                `;
-                resultsContent.appendChild(div);
-            }
-            
-            results.style.display = 'block';
-        }
-        
-        function showError(message) {
-            error.textContent = message;
-            error.style.display = 'block';
-        }
-        
-        function hideError() {
-            error.style.display = 'none';
-        }
-        
-        // Seleccionar desde galería
-        fileInput.addEventListener('change', (e) => {
-            const file = e.target.files[0];
-            if (file) {
-                const reader = new FileReader();
-                reader.onload = (e) => {
-                    currentImageData = e.target.result;
-                    preview.src = currentImageData;
-                    
-                    // Asegurar que la imagen se muestre
-                    previewWrapper.style.display = 'block';
-                    preview.style.display = 'block';
-                    
-                    preview.onload = () => {
-                        setupPreview();
-                        // Asegurar visibilidad después de cargar
-                        previewWrapper.style.display = 'block';
-                        preview.style.display = 'block';
-                    };
-                    
-                    video.style.display = 'none';
-                    captureBtn.style.display = 'none';
-                    retakeBtn.style.display = 'block';
-                    processBtn.style.display = 'block';
-                    selectAreaBtn.style.display = 'block';
-                    
-                    if (stream) {
-                        stream.getTracks().forEach(track => track.stop());
-                        stream = null;
-                    }
-                };
-                reader.readAsDataURL(file);
-            }
-        });
-        
-        // Funcionalidad de escaneo de QR y rellenado de formulario
-        let qrStream = null;
-        let qrVideo = null;
-        let qrCanvas = null;
-        
-        // Escuchar clics en el botón de escanear QR (se crea dinámicamente)
-        document.addEventListener('click', async (e) => {
-            if (e.target.id === 'scanQRBtn') {
-                iniciarEscaneoQR();
-            }
-        });
-        
-        async function iniciarEscaneoQR() {
-            try {
-                // Crear modal para escanear QR
-                const modal = document.createElement('div');
-                modal.id = 'qrModal';
-                modal.style.cssText = 'position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: rgba(0,0,0,0.9); z-index: 10000; display: flex; flex-direction: column; align-items: center; justify-content: center;';
-                modal.innerHTML = `
-                    <div style="background: white; padding: 20px; border-radius: 10px; max-width: 90%; text-align: center;">
-                        <h2 style="margin-bottom: 20px;">📷 Escanear Código QR</h2>
-                        <video id="qrVideo" autoplay playsinline style="width: 100%; max-width: 400px; border-radius: 10px;"></video>
-                        <canvas id="qrCanvas" style="display: none;"></canvas>
-                        <p style="margin: 15px 0; color: #666;">Apunta la cámara hacia el código QR del formulario</p>
-                        <button id="cerrarQR" class="btn-danger" style="margin-top: 10px;">Cerrar</button>
-                    </div>
-                `;
-                document.body.appendChild(modal);
-                
-                qrVideo = document.getElementById('qrVideo');
-                qrCanvas = document.getElementById('qrCanvas');
-                
-                // Activar cámara
-                qrStream = await navigator.mediaDevices.getUserMedia({
-                    video: { facingMode: 'environment' }
-                });
-                qrVideo.srcObject = qrStream;
-                
-                // Iniciar detección de QR
-                iniciarDeteccionQR();
-                
-                // Cerrar modal
-                document.getElementById('cerrarQR').addEventListener('click', cerrarEscaneoQR);
-                
-            } catch (err) {
-                showError('Error al acceder a la cámara: ' + err.message);
-            }
-        }
-        
-        function cerrarEscaneoQR() {
-            if (qrStream) {
-                qrStream.getTracks().forEach(track => track.stop());
-                qrStream = null;
-            }
-            const modal = document.getElementById('qrModal');
-            if (modal) {
-                modal.remove();
-            }
-        }
-        
-        async function iniciarDeteccionQR() {
-            if (!qrVideo || !qrCanvas) return;
-            
-            const ctx = qrCanvas.getContext('2d');
-            
-            function detectarQR() {
-                if (!qrVideo || qrVideo.readyState !== qrVideo.HAVE_ENOUGH_DATA) {
-                    requestAnimationFrame(detectarQR);
-                    return;
-                }
-                
-                qrCanvas.width = qrVideo.videoWidth;
-                qrCanvas.height = qrVideo.videoHeight;
-                ctx.drawImage(qrVideo, 0, 0, qrCanvas.width, qrCanvas.height);
-                
-                // Capturar frame y enviar al servidor para escanear
-                qrCanvas.toBlob(async (blob) => {
-                    try {
-                        const formData = new FormData();
-                        formData.append('image', blob, 'qr.jpg');
-                        
-                        const response = await fetch('/scan-qr', {
-                            method: 'POST',
-                            body: formData
-                        });
-                        
-                        const data = await response.json();
-                        
-                        if (data.exito && data.es_google_forms) {
-                            // QR encontrado y es formulario de Google
-                            cerrarEscaneoQR();
-                            rellenarFormularioGoogle(data.url_formulario, valorMedidorExtraido);
-                        } else if (data.exito && !data.es_google_forms) {
-                            // QR encontrado pero no es formulario de Google
-                            showError('El QR code no apunta a un formulario de Google');
-                        }
-                        // Si no encuentra QR, continuar escaneando
-                    } catch (err) {
-                        console.error('Error al escanear QR:', err);
-                    }
-                }, 'image/jpeg', 0.9);
-                
-                // Continuar escaneando cada 500ms
-                setTimeout(detectarQR, 500);
-            }
-            
-            detectarQR();
-        }
-        
-        function rellenarFormularioGoogle(urlFormulario, valor) {
-            if (!valor) {
-                showError('No hay valor del medidor para rellenar');
-                return;
-            }
-            
-            // Abrir formulario en nueva ventana/iframe
-            const formWindow = window.open(urlFormulario, '_blank');
-            
-            // Intentar rellenar el formulario automáticamente
-            // Nota: Google Forms no permite rellenado directo desde JavaScript externo
-            // por políticas de seguridad. Mostramos instrucciones al usuario.
-            
-            const instrucciones = document.createElement('div');
-            instrucciones.className = 'result-item';
-            instrucciones.style.background = '#fff3cd';
-            instrucciones.style.borderLeft = '4px solid #ffc107';
-            instrucciones.innerHTML = `
-                <strong>📋 Instrucciones para Rellenar Formulario</strong>
-                <p style="margin: 10px 0;">Se abrió el formulario en una nueva ventana.</p>
-                <p style="margin: 10px 0;"><strong>Valor a ingresar:</strong></p>
-                <div style="background: white; padding: 15px; border-radius: 5px; font-size: 24px; font-weight: bold; color: #667eea; text-align: center; margin: 10px 0;">
-                    ${valor}
-                </div>
-                <p style="margin: 10px 0; color: #666;">
-                    Copia el valor de arriba y pégalo en el campo correspondiente del formulario.
-                </p>
-                <button onclick="navigator.clipboard.writeText('${valor}').then(() => alert('Valor copiado al portapapeles!'))" 
-                        class="btn-primary" style="width: 100%; margin-top: 10px;">
-                    📋 Copiar Valor al Portapapeles
-                </button>
-            `;
-            
-            resultsContent.appendChild(instrucciones);
-            results.style.display = 'block';
-        }
-    </script>
-</body>
-</html>
+    resultados = procesar()
+    if not resultados.get('parcial'):
+        cache_resultados.guardar(clave, resultados)
+    return resultados, False
+
+
+def leer_presupuesto():
+    """
+    Lee el presupuesto de tiempo (segundos) del formulario o la query string.
+    Sin valor se usa OCR_PRESUPUESTO_MAX, que también es el máximo admitido.
+    
+    Raises:
+        ValueError: Si el valor no es un número positivo
     """
-    return render_template_string(html)
+    valor = request.form.get('presupuesto') or request.args.get('presupuesto')
+    if not valor:
+        return OCR_PRESUPUESTO_MAX
+    presupuesto = float(valor)
+    if not presupuesto > 0:
+        raise ValueError(valor)
+    return min(presupuesto, OCR_PRESUPUESTO_MAX)
+
+
+def leer_motor():
+    """
+    Lee el motor de OCR del formulario (por defecto, OCR_MOTOR).
+    
+    Raises:
+        ValueError: Si el motor no es uno de MOTORES_OCR
+    """
+    motor = request.form.get('motor') or OCR_MOTOR
+    if motor not in MOTORES_OCR:
+        raise ValueError(motor)
+    return motor
+
+
+def respuesta_con_cache(resultados, acierto):
+    """Respuesta JSON indicando en la cabecera X-Cache si vino de la caché."""
+    respuesta = jsonify(resultados)
+    respuesta.headers['X-Cache'] = 'HIT' if acierto else 'MISS'
+    return respuesta
+
+
+def ejecutar_en_cola(funcion, *args, **kwargs):
+    """
+    Ejecuta el OCR en el pool de procesos acotado y guarda la espera en cola
+    para informarla en las cabeceras de la respuesta.
+    """
+    resultado, espera = obtener_cola().ejecutar(funcion, *args, **kwargs)
+    g.espera_cola = espera
+    return resultado
+
+
+def respuesta_cola_llena(error):
+    """Respuesta 429 inmediata cuando la cola de OCR está llena."""
+    respuesta = jsonify({'error': str(error), 'reintentar_en': error.reintentar_en})
+    respuesta.headers['Retry-After'] = str(error.reintentar_en)
+    return respuesta, 429
+
+
+def procesar_en_segundo_plano(datos, nombre, motor=OCR_MOTOR):
+    """
+    Procesa una imagen de un trabajo asíncrono. A diferencia de /process,
+    espera turno en la cola de OCR en lugar de rechazar con 429.
+    """
+    parametros = dict(PARAMETROS_CAUDALIMETRO, motor=motor)
+    resultados, _ = con_cache(datos, parametros, nombre, lambda: obtener_cola().enviar(
+        procesar_caudalimetro,
+        datos,
+        idioma='spa',
+        guardar_debug=False,
+        nombre_archivo=nombre,
+        modo_lote=OCR_MODO_LOTE,
+        umbral_rojo=UMBRAL_ROJO,
+        motor=motor,
+        bloquear=True
+    ).result()[0])
+    return resultados
+
+
+# Trabajos asíncronos (estado en disco, compartido entre workers)
+gestor_trabajos = GestorTrabajos(procesar_en_segundo_plano)
+
+# Huecos para sesiones de escaneo de QR por WebSocket en este worker
+sesiones_qr = threading.BoundedSemaphore(max(1, QR_SESIONES_MAX))
+
+
+def respuesta_qr(qr_content):
+    """Datos de respuesta para un QR leído, indicando si es un formulario de Google."""
+    if es_formulario_google(qr_content):
+        return {
+            'exito': True,
+            'qr_content': qr_content,
+            'es_google_forms': True,
+            'form_info': parsear_url_google_forms(qr_content),
+            'url_formulario': qr_content
+        }
+    return {
+        'exito': True,
+        'qr_content': qr_content,
+        'es_google_forms': False,
+        'mensaje': 'El QR code no apunta a un formulario de Google'
+    }
+
+
+# Página principal y sus recursos, construidos y comprimidos una sola vez al arrancar
+recursos_web = construir_recursos()
+
+
+def servir_recurso(ruta, cache_control):
+    """
+    Sirve un recurso precomprimido de la interfaz en la mejor codificación que
+    acepte el cliente (brotli, gzip o sin comprimir). Responde 304 si el
+    cliente ya tiene la misma versión (If-None-Match).
+    
+    Args:
+        ruta: Ruta del recurso en recursos_web
+        cache_control: Valor de la cabecera Cache-Control
+    
+    Returns:
+        Respuesta de Flask
+    """
+    recurso = recursos_web.get(ruta)
+    if recurso is None:
+        return jsonify({'error': 'Recurso no encontrado'}), 404
+    
+    codificacion = 'identity'
+    for candidata in ('br', 'gzip'):
+        if candidata in recurso['codificaciones'] and request.accept_encodings[candidata] > 0:
+            codificacion = candidata
+            break
+    
+    respuesta = Response(recurso['codificaciones'][codificacion], content_type=recurso['tipo'])
+    if codificacion != 'identity':
+        respuesta.headers['Content-Encoding'] = codificacion
+    # Cada codificación es una representación distinta: su propio ETag
+    respuesta.set_etag(f"{recurso['hash']}-{codificacion}")
+    respuesta.headers['Cache-Control'] = cache_control
+    respuesta.vary.add('Accept-Encoding')
+    return respuesta.make_conditional(request)
+
+
+@app.after_request
+def cabeceras_cola(respuesta):
+    """Añade la espera en cola y la profundidad actual a las respuestas de OCR."""
+    if 'espera_cola' in g:
+        estado = obtener_cola().estado()
+        respuesta.headers['X-Cola-Espera'] = f"{g.espera_cola:.3f}"
+        respuesta.headers['X-Cola-Pendientes'] = str(estado['pendientes'])
+    return respuesta
+
+
+@app.route('/')
+def index():
+    """Página principal con interfaz móvil (se revalida con ETag en cada visita)."""
+    return servir_recurso('/', 'no-cache')
+
+
+@app.route('/assets/<nombre>')
+def recurso_web(nombre):
+    """Estilos y JavaScript de la interfaz; su URL cambia con su contenido."""
+    return servir_recurso(f'/assets/{nombre}', 'public, max-age=31536000, immutable')
 
 
 @app.route('/process', methods=['POST'])
 def process_image():
     """Procesa una imagen subida y devuelve los resultados."""
+    # El presupuesto cuenta desde la llegada de la petición (incluye la espera en cola)
+    inicio = time.time()
     try:
         if 'image' not in request.files:
             return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
@@ -924,37 +304,72 @@ def process_image():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Tipo de archivo no permitido'}), 400
         
-        # Guardar archivo temporalmente
-        filename = secure_filename(file.filename)
-        filepath = UPLOAD_FOLDER / filename
-        file.save(str(filepath))
+        try:
+            presupuesto = leer_presupuesto()
+        except ValueError:
+            return jsonify({'error': 'El presupuesto debe ser un número de segundos positivo'}), 400
         
         try:
-            # Procesar imagen
-            resultados = procesar_caudalimetro(
-                str(filepath),
+            motor = leer_motor()
+        except ValueError:
+            return jsonify({'error': f'Motor de OCR no válido (usa: {", ".join(MOTORES_OCR)})'}), 400
+        
+        # Procesar imagen directamente desde memoria (sin escribir en UPLOAD_FOLDER)
+        datos = file.read()
+        nombre = secure_filename(file.filename)
+        
+        # Medidor conocido por su QR: leer solo las regiones de su perfil
+        perfil = obtener_registro().buscar(request.form.get('qr', ''))
+        if perfil is not None:
+            if not request.form.get('motor'):
+                motor = perfil.get('motor', motor)
+            # Si la foto no incluye el QR se procesa como un medidor sin perfil
+            parametros = dict(PARAMETROS_CAUDALIMETRO, operacion='perfil', perfil=perfil, motor=motor)
+            resultados, acierto = con_cache(datos, parametros, nombre, lambda: ejecutar_en_cola(
+                procesar_con_perfil,
+                datos,
+                perfil,
                 idioma='spa',
-                guardar_debug=False
-            )
-            
-            # Limpiar archivo temporal
-            filepath.unlink()
-            
-            return jsonify(resultados)
-        
-        except Exception as e:
-            # Limpiar archivo en caso de error
-            if filepath.exists():
-                filepath.unlink()
-            raise e
+                nombre_archivo=nombre,
+                motor=motor,
+                modo_lote=OCR_MODO_LOTE,
+                umbral_rojo=UMBRAL_ROJO,
+                presupuesto_s=presupuesto,
+                inicio=inicio
+            ))
+            return respuesta_con_cache(resultados, acierto)
+        
+        parametros = dict(PARAMETROS_CAUDALIMETRO, motor=motor)
+        resultados, acierto = con_cache(datos, parametros, nombre, lambda: ejecutar_en_cola(
+            procesar_caudalimetro,
+            datos,
+            idioma='spa',
+            guardar_debug=False,
+            nombre_archivo=nombre,
+            modo_lote=OCR_MODO_LOTE,
+            umbral_rojo=UMBRAL_ROJO,
+            presupuesto_s=presupuesto,
+            inicio=inicio,
+            motor=motor
+        ))
+        
+        return respuesta_con_cache(resultados, acierto)
     
+    except ColaLlenaError as e:
+        return respuesta_cola_llena(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/process-area', methods=['POST'])
-def process_area():
-    """Procesa un área específica de una imagen subida."""
+@app.route('/process-qr', methods=['POST'])
+def process_image_qr():
+    """
+    Procesa una foto que incluye el display y el QR del formulario: devuelve la
+    lectura y el formulario enlazado en una sola subida. Si el QR es de un
+    medidor con perfil, solo se leen las regiones del perfil.
+    """
+    # El presupuesto cuenta desde la llegada de la petición (incluye la espera en cola)
+    inicio = time.time()
     try:
         if 'image' not in request.files:
             return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
@@ -967,6 +382,68 @@ def process_area():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Tipo de archivo no permitido'}), 400
         
+        try:
+            presupuesto = leer_presupuesto()
+        except ValueError:
+            return jsonify({'error': 'El presupuesto debe ser un número de segundos positivo'}), 400
+        
+        try:
+            motor = leer_motor()
+        except ValueError:
+            return jsonify({'error': f'Motor de OCR no válido (usa: {", ".join(MOTORES_OCR)})'}), 400
+        motor_perfil = not request.form.get('motor')
+        
+        datos = file.read()
+        nombre = secure_filename(file.filename)
+        # El perfil se elige con el QR leído en la foto: la versión del registro
+        # forma parte de la clave para no servir lecturas anteriores a un alta
+        parametros = dict(PARAMETROS_CAUDALIMETRO, operacion='caudalimetro_qr', motor=motor,
+                          motor_perfil=motor_perfil, perfiles=obtener_registro().version())
+        resultados, acierto = con_cache(datos, parametros, nombre, lambda: ejecutar_en_cola(
+            procesar_medidor_y_qr,
+            datos,
+            idioma='spa',
+            nombre_archivo=nombre,
+            motor=motor,
+            motor_perfil=motor_perfil,
+            modo_lote=OCR_MODO_LOTE,
+            umbral_rojo=UMBRAL_ROJO,
+            presupuesto_s=presupuesto,
+            inicio=inicio
+        ))
+        
+        return respuesta_con_cache(resultados, acierto)
+    
+    except ColaLlenaError as e:
+        return respuesta_cola_llena(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/process-area', methods=['POST'])
+def process_area():
+    """
+    Procesa un área específica de una imagen, subida en la propia petición
+    (campo `image`) o antes con POST /images (campo `imagen_id`).
+    """
+    try:
+        imagen_id = request.form.get('imagen_id')
+        
+        if not imagen_id:
+            if 'image' not in request.files:
+                return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
+            
+            file = request.files['image']
+            
+            if file.filename == '':
+                return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
+            
+            if not allowed_file(file.filename):
+                return jsonify({'error': 'Tipo de archivo no permitido'}), 400
+        
+        elif obtener_almacen().ruta(imagen_id) is None:
+            return jsonify({'error': 'La imagen no existe o ha caducado, súbela de nuevo'}), 404
+        
         # Obtener coordenadas del área
         data = request.form
         try:
@@ -980,32 +457,80 @@ def process_area():
         if ancho <= 0 or alto <= 0:
             return jsonify({'error': 'El área seleccionada debe tener dimensiones válidas'}), 400
         
-        # Guardar archivo temporalmente
-        filename = secure_filename(file.filename)
-        filepath = UPLOAD_FOLDER / filename
-        file.save(str(filepath))
-        
         try:
-            # Procesar área específica
-            resultados = procesar_area_especifica(
-                str(filepath),
+            motor = leer_motor()
+        except ValueError:
+            return jsonify({'error': f'Motor de OCR no válido (usa: {", ".join(MOTORES_OCR)})'}), 400
+        
+        parametros = {
+            'operacion': 'area',
+            'idioma': 'spa',
+            'psm': 7,
+            'area': [x, y, ancho, alto],
+            'motor': motor
+        }
+        
+        if imagen_id:
+            # Imagen ya subida: tras la primera área su luminancia decodificada
+            # está en disco para todos los procesos, así que solo cuesta el OCR del recorte
+            resultados, acierto = con_cache(imagen_id.encode('ascii'), parametros, 'imagen', lambda: ejecutar_en_cola(
+                procesar_area_de_sesion,
+                imagen_id,
                 x=x,
                 y=y,
                 ancho=ancho,
                 alto=alto,
-                idioma='spa'
-            )
-            
-            # Limpiar archivo temporal
-            filepath.unlink()
-            
-            return jsonify(resultados)
+                idioma='spa',
+                motor=motor
+            ))
+            return respuesta_con_cache(resultados, acierto)
+        
+        # Procesar el área directamente desde memoria (sin escribir en UPLOAD_FOLDER)
+        datos = file.read()
+        filename = secure_filename(file.filename)
+        resultados, acierto = con_cache(datos, parametros, filename, lambda: ejecutar_en_cola(
+            procesar_area_especifica,
+            datos,
+            x=x,
+            y=y,
+            ancho=ancho,
+            alto=alto,
+            idioma='spa',
+            nombre_archivo=filename,
+            motor=motor
+        ))
+        
+        return respuesta_con_cache(resultados, acierto)
+    
+    except ColaLlenaError as e:
+        return respuesta_cola_llena(e)
+    except FileNotFoundError as e:
+        # La imagen de la sesión caducó mientras esperaba en la cola
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/images', methods=['POST'])
+def subir_imagen():
+    """
+    Guarda una imagen para procesar después varias áreas de ella con
+    /process-area sin volver a subirla. Devuelve su id (hash del contenido).
+    """
+    try:
+        if 'image' not in request.files:
+            return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
         
-        except Exception as e:
-            # Limpiar archivo en caso de error
-            if filepath.exists():
-                filepath.unlink()
-            raise e
+        file = request.files['image']
+        
+        if file.filename == '':
+            return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Tipo de archivo no permitido'}), 400
+        
+        imagen_id = obtener_almacen().guardar(file.read())
+        return jsonify({'imagen_id': imagen_id, 'expira_en': IMAGENES_TTL}), 201
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1023,14 +548,12 @@ def scan_qr():
         if file.filename == '':
             return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
         
-        # Leer imagen como base64
-        file_data = file.read()
-        import base64
-        imagen_base64 = base64.b64encode(file_data).decode('utf-8')
-        imagen_base64 = f'data:image/jpeg;base64,{imagen_base64}'
+        # Caché de lecturas solo dentro de la sesión de escaneo del cliente
+        sesion = request.form.get('sesion', '')[:64]
+        cache = caches_qr.de_sesion(sesion) if sesion else None
         
-        # Escanear QR
-        qr_content = escanear_qr_desde_base64(imagen_base64)
+        # Escanear QR directamente sobre los bytes subidos (decodificados en grises)
+        qr_content = escanear_qr_bytes(file.read(), cache=cache)
         
         if not qr_content:
             return jsonify({
@@ -1038,34 +561,231 @@ def scan_qr():
                 'exito': False
             }), 400
         
-        # Verificar si es un formulario de Google
-        es_google_forms = 'docs.google.com/forms' in qr_content or 'forms.gle' in qr_content
-        
-        if es_google_forms:
-            form_info = parsear_url_google_forms(qr_content)
-            return jsonify({
-                'exito': True,
-                'qr_content': qr_content,
-                'es_google_forms': True,
-                'form_info': form_info,
-                'url_formulario': qr_content
-            })
-        else:
-            return jsonify({
-                'exito': True,
-                'qr_content': qr_content,
-                'es_google_forms': False,
-                'mensaje': 'El QR code no apunta a un formulario de Google'
-            })
+        return jsonify(respuesta_qr(qr_content))
     
     except Exception as e:
         return jsonify({'error': str(e), 'exito': False}), 500
 
 
+if sock is not None:
+    @sock.route('/ws/scan-qr')
+    def scan_qr_ws(ws):
+        """
+        Sesión de escaneo de QR: el cliente envía frames (JPEG en binario) sin
+        esperar respuesta; solo se procesa el último recibido y los anteriores
+        se descartan. La sesión termina al leer el QR de un formulario de
+        Google, o con un error si el worker está ocupado o se agota
+        QR_SESION_MAX_S. Un QR que no es de un formulario se notifica una vez
+        y se sigue escaneando.
+        """
+        if not sesiones_qr.acquire(blocking=False):
+            ws.send(json.dumps({'exito': False, 'error': 'Servidor ocupado, usa /scan-qr'}))
+            return
+        
+        sesion = f'ws-{uuid.uuid4().hex}'
+        cache = caches_qr.de_sesion(sesion)
+        ultimo_qr = None
+        try:
+            fin = time.time() + QR_SESION_MAX_S
+            while time.time() < fin:
+                frame = ws.receive(timeout=fin - time.time())
+                if frame is None:
+                    continue
+                
+                # Descartar los frames que llegaron mientras se procesaba el anterior
+                while True:
+                    siguiente = ws.receive(timeout=0)
+                    if siguiente is None:
+                        break
+                    frame = siguiente
+                
+                if not isinstance(frame, (bytes, bytearray)):
+                    continue
+                
+                qr_content = escanear_qr_bytes(bytes(frame), cache=cache)
+                if qr_content and qr_content != ultimo_qr:
+                    respuesta = respuesta_qr(qr_content)
+                    ws.send(json.dumps(respuesta, ensure_ascii=False))
+                    if respuesta['es_google_forms']:
+                        return
+                    ultimo_qr = qr_content
+            
+            ws.send(json.dumps({'exito': False, 'error': 'Tiempo de escaneo agotado'}))
+        finally:
+            caches_qr.cerrar(sesion)
+            sesiones_qr.release()
+
+
+def respuesta_trabajo(estado):
+    """Respuesta 202 con el id y la URL de estado de un trabajo recién creado."""
+    url = url_for('estado_trabajo', id_trabajo=estado['id'])
+    respuesta = jsonify({
+        'id': estado['id'],
+        'estado': estado['estado'],
+        'total': estado['total'],
+        'url': url
+    })
+    respuesta.headers['Location'] = url
+    return respuesta, 202
+
+
+@app.route('/jobs', methods=['POST'])
+def crear_trabajo():
+    """Acepta una o varias imágenes y devuelve un id de trabajo sin esperar al OCR."""
+    try:
+        # Un trabajo puede traer varias fotos, como /process-batch
+        request.max_content_length = BATCH_MAX_SIZE
+        
+        archivos = request.files.getlist('image')
+        if not archivos:
+            return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
+        
+        if len(archivos) > BATCH_MAX_IMAGENES:
+            return jsonify({'error': f'Máximo {BATCH_MAX_IMAGENES} imágenes por trabajo'}), 400
+        
+        try:
+            motor = leer_motor()
+        except ValueError:
+            return jsonify({'error': f'Motor de OCR no válido (usa: {", ".join(MOTORES_OCR)})'}), 400
+        
+        imagenes = []
+        for file in archivos:
+            if file.filename == '':
+                return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
+            if not allowed_file(file.filename):
+                return jsonify({'error': f'Tipo de archivo no permitido: {file.filename}'}), 400
+            imagenes.append((file.stream, secure_filename(file.filename)))
+        
+        return respuesta_trabajo(gestor_trabajos.crear(imagenes, {'motor': motor}))
+    
+    except ColaLlenaError as e:
+        return respuesta_cola_llena(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/jobs/<id_trabajo>')
+def estado_trabajo(id_trabajo):
+    """Devuelve el estado de un trabajo y los resultados de las imágenes ya procesadas."""
+    estado = gestor_trabajos.obtener(id_trabajo)
+    if estado is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(vista_publica(estado))
+
+
+@app.route('/process-batch', methods=['POST'])
+def process_batch():
+    """
+    Procesa varias fotos en una sola petición, en paralelo en el pool de OCR.
+    Devuelve un resultado por imagen en el orden de entrada; los errores de una
+    imagen no afectan al resto. Los lotes de más de BATCH_MAX_SINCRONO fotos no
+    caben en el timeout de gunicorn: se convierten en un trabajo asíncrono y se
+    responde 202 con su id, como POST /jobs.
+    """
+    try:
+        # El límite global (MAX_FILE_SIZE) es por foto; un lote admite más
+        request.max_content_length = BATCH_MAX_SIZE
+        
+        archivos = request.files.getlist('image')
+        if not archivos:
+            return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
+        
+        if len(archivos) > BATCH_MAX_IMAGENES:
+            return jsonify({'error': f'Máximo {BATCH_MAX_IMAGENES} imágenes por lote'}), 400
+        
+        try:
+            motor = leer_motor()
+        except ValueError:
+            return jsonify({'error': f'Motor de OCR no válido (usa: {", ".join(MOTORES_OCR)})'}), 400
+        
+        if len(archivos) > BATCH_MAX_SINCRONO:
+            imagenes = []
+            for indice, file in enumerate(archivos):
+                if not allowed_file(file.filename):
+                    return jsonify({'error': f'Tipo de archivo no permitido: {file.filename}'}), 400
+                imagenes.append((file.stream, secure_filename(file.filename) or f'imagen_{indice + 1}'))
+            return respuesta_trabajo(gestor_trabajos.crear(imagenes, {'motor': motor}))
+        
+        parametros = dict(PARAMETROS_CAUDALIMETRO, motor=motor)
+        cola = obtener_cola()
+        ventana = max(1, cola.procesos)
+        resultados = [None] * len(archivos)
+        en_curso = {}
+        
+        def recoger(futuros):
+            for futuro in futuros:
+                indice, clave, nombre = en_curso.pop(futuro)
+                try:
+                    resultado = futuro.result()[0]
+                    cache_resultados.guardar(clave, resultado)
+                except Exception as e:
+                    resultado = {'archivo': nombre, 'error': str(e)}
+                resultados[indice] = {'indice': indice, **resultado}
+        
+        for indice, file in enumerate(archivos):
+            nombre = secure_filename(file.filename) or f'imagen_{indice + 1}'
+            
+            if not allowed_file(file.filename):
+                resultados[indice] = {'indice': indice, 'archivo': nombre,
+                                      'error': 'Tipo de archivo no permitido'}
+                continue
+            
+            datos = file.read()
+            clave = clave_cache(datos, parametros)
+            resultado = cache_resultados.obtener(clave)
+            if resultado is not None:
+                resultado['archivo'] = nombre
+                resultados[indice] = {'indice': indice, **resultado}
+                continue
+            
+            # Limitar las imágenes en vuelo para no acaparar la cola de OCR
+            if len(en_curso) >= ventana:
+                terminados, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                recoger(terminados)
+            
+            try:
+                futuro = cola.enviar(
+                    procesar_caudalimetro,
+                    datos,
+                    idioma='spa',
+                    guardar_debug=False,
+                    nombre_archivo=nombre,
+                    modo_lote=OCR_MODO_LOTE,
+                    umbral_rojo=UMBRAL_ROJO,
+                    motor=motor,
+                    bloquear=True,
+                    timeout=BATCH_ESPERA_COLA
+                )
+            except ColaLlenaError as e:
+                resultados[indice] = {'indice': indice, 'archivo': nombre, 'error': str(e)}
+                continue
+            en_curso[futuro] = (indice, clave, nombre)
+        
+        recoger(list(en_curso))
+        
+        errores = sum(1 for r in resultados if 'error' in r)
+        return jsonify({
+            'total': len(resultados),
+            'correctas': len(resultados) - errores,
+            'errores': errores,
+            'resultados': resultados
+        })
+    
+    except ColaLlenaError as e:
+        return respuesta_cola_llena(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/health')
 def health():
     """Endpoint de salud para verificar que el servidor está funcionando."""
-    return jsonify({'status': 'ok', 'message': 'Servidor funcionando correctamente'})
+    return jsonify({
+        'status': 'ok',
+        'message': 'Servidor funcionando correctamente',
+        'cola_ocr': obtener_cola().estado(),
+        'cache_qr': caches_qr.estado()
+    })
 
 
 if __name__ == '__main__':
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Caché de Resultados en Disco
+Guarda los resultados de OCR indexados por el hash del contenido de la imagen y
+los parámetros de procesamiento. Es seguro entre procesos (workers de gunicorn):
+las escrituras son atómicas y la limpieza LRU se coordina con un bloqueo de archivo.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+# fcntl solo existe en sistemas Unix; sin él la limpieza no se coordina entre procesos
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+CACHE_DIR = os.getenv('CACHE_DIR', '/data/cache')
+CACHE_MAX_MB = int(os.getenv('CACHE_MAX_MB', '512'))
+CACHE_TTL = int(os.getenv('CACHE_TTL', str(7 * 24 * 3600)))  # 7 días
+
+# Cada cuántas escrituras se revisa el tamaño y la antigüedad de la caché
+LIMPIEZA_CADA = 50
+
+
+class CacheResultados:
+    """
+    Caché de resultados en disco con expulsión LRU por tamaño y antigüedad.
+
+    Cada entrada es un archivo JSON cuyo nombre es la clave (SHA-256). La fecha
+    de modificación se actualiza en cada acierto y sirve como marca de último uso.
+    """
+
+    def __init__(self, directorio: str = CACHE_DIR, max_mb: int = CACHE_MAX_MB,
+                 ttl: int = CACHE_TTL):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttl = ttl
+        self._escrituras = 0
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def clave(datos: bytes, parametros: Dict[str, any]) -> str:
+        """
+        Calcula la clave de una entrada a partir de los bytes de la imagen y
+        los parámetros que afectan al resultado.
+        """
+        h = hashlib.sha256(datos)
+        h.update(json.dumps(parametros, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / clave[:2] / f'{clave}.json'
+
+    def obtener(self, clave: str) -> Optional[Dict[str, any]]:
+        """
+        Devuelve el resultado guardado o None si no existe o ha caducado.
+        """
+        ruta = self._ruta(clave)
+        try:
+            if time.time() - ruta.stat().st_mtime > self.ttl:
+                ruta.unlink()
+                return None
+            with open(ruta, 'r', encoding='utf-8') as f:
+                resultado = json.load(f)
+            # Marcar como usado recientemente (LRU)
+            os.utime(ruta)
+            return resultado
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def guardar(self, clave: str, resultado: Dict[str, any]):
+        """
+        Guarda un resultado de forma atómica (escritura temporal + rename).
+        """
+        ruta = self._ruta(clave)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(resultado, f, ensure_ascii=False)
+            os.replace(tmp, ruta)
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        self._escrituras += 1
+        if self._escrituras % LIMPIEZA_CADA == 0:
+            self.limpiar()
+
+    def limpiar(self):
+        """
+        Elimina entradas caducadas y, si se supera el tamaño máximo, las menos
+        usadas recientemente. Solo un proceso limpia a la vez; si otro ya lo
+        está haciendo, se omite.
+        """
+        with open(self.directorio / '.limpieza.lock', 'w') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return
+
+            ahora = time.time()
+            entradas = []
+            total = 0
+            for ruta in self.directorio.glob('*/*'):
+                try:
+                    stat = ruta.stat()
+                except FileNotFoundError:
+                    continue
+                # Entradas caducadas y temporales huérfanos de escrituras interrumpidas
+                if ahora - stat.st_mtime > self.ttl or \
+                        (ruta.suffix == '.tmp' and ahora - stat.st_mtime > 3600):
+                    ruta.unlink(missing_ok=True)
+                    continue
+                if ruta.suffix == '.json':
+                    entradas.append((stat.st_mtime, stat.st_size, ruta))
+                    total += stat.st_size
+
+            # Expulsar las menos usadas hasta quedar por debajo del límite
+            entradas.sort()
+            for _, tamano, ruta in entradas:
+                if total <= self.max_bytes:
+                    break
+                ruta.unlink(missing_ok=True)
+                total -= tamano
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cola de OCR Acotada
+Ejecuta el trabajo de CPU (detección y OCR) en un pool de procesos con una cola
+de espera de tamaño máximo. Cuando la cola está llena se rechaza la petición de
+inmediato para que el servidor responda 429 en lugar de agotar el timeout.
+"""
+
+import os
+import time
+import atexit
+import threading
+import functools
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Procesos de OCR por worker de gunicorn (0 = ejecutar en el thread de la petición)
+OCR_PROCESOS = int(os.getenv('OCR_PROCESOS', '2'))
+# Peticiones que pueden esperar a que quede libre un proceso
+OCR_MAX_COLA = int(os.getenv('OCR_MAX_COLA', '4'))
+# Segundos sugeridos al cliente en la cabecera Retry-After
+OCR_RETRY_AFTER = int(os.getenv('OCR_RETRY_AFTER', '5'))
+
+
+class ColaLlenaError(Exception):
+    """La cola de OCR está llena; el cliente debe reintentar más tarde."""
+
+    def __init__(self, reintentar_en: int = OCR_RETRY_AFTER):
+        super().__init__('Servidor ocupado, reintenta en unos segundos')
+        self.reintentar_en = reintentar_en
+
+
+def _inicializar_proceso():
+    """Importa el pipeline una vez por proceso para no pagarlo en la primera tarea."""
+    import extractor_rojo  # noqa: F401
+
+
+def _ejecutar(funcion: Callable, args: tuple, kwargs: dict, enviado: float):
+    """Ejecuta la tarea en el proceso hijo y mide cuánto esperó en la cola."""
+    espera = time.time() - enviado
+    return funcion(*args, **kwargs), espera
+
+
+class ColaOCR:
+    """
+    Pool de procesos de OCR con admisión acotada y métricas de espera.
+
+    Como máximo hay `procesos + max_cola` tareas admitidas a la vez por worker;
+    el resto se rechaza con ColaLlenaError. Cada tarea admitida ocupa un thread
+    de gunicorn mientras espera, así que GUNICORN_THREADS debe superar esa cifra.
+
+    Si un proceso hijo muere (p. ej. por falta de memoria) el pool queda roto:
+    fallan solo las tareas que estaban en él y la siguiente crea un pool nuevo.
+    """
+
+    def __init__(self, procesos: int = OCR_PROCESOS, max_cola: int = OCR_MAX_COLA):
+        self.procesos = max(0, procesos)
+        self.capacidad = max(1, self.procesos) + max(0, max_cola)
+        self._huecos = threading.BoundedSemaphore(self.capacidad)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pendientes = 0
+        self._completadas = 0
+        self._rechazadas = 0
+        self._esperas = deque(maxlen=100)
+
+    def _obtener_executor(self) -> Optional[ProcessPoolExecutor]:
+        """Crea el pool de procesos la primera vez (ya dentro del worker de gunicorn)."""
+        if self.procesos == 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' evita heredar threads y locks del worker al hacer fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_inicializar_proceso
+                )
+            return self._executor
+
+    def _descartar_executor(self, executor: ProcessPoolExecutor):
+        """Retira un pool roto para que la siguiente tarea cree otro."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def enviar(self, funcion: Callable, *args, bloquear: bool = False,
+               timeout: Optional[float] = None, **kwargs) -> Future:
+        """
+        Encola una tarea y devuelve un Future con la tupla (resultado, espera_s).
+
+        Args:
+            funcion: Función a nivel de módulo (debe poder serializarse con pickle)
+            bloquear: Si True, espera a que haya hueco en la cola en lugar de rechazar
+            timeout: Segundos máximos de espera cuando `bloquear` es True
+
+        Raises:
+            ColaLlenaError: Si la cola está llena
+        """
+        if bloquear:
+            admitida = self._huecos.acquire(timeout=timeout)
+        else:
+            admitida = self._huecos.acquire(blocking=False)
+        if not admitida:
+            with self._lock:
+                self._rechazadas += 1
+            raise ColaLlenaError()
+
+        with self._lock:
+            self._pendientes += 1
+
+        enviado = time.time()
+        try:
+            executor = self._obtener_executor()
+            if executor is None:
+                futuro = Future()
+                try:
+                    futuro.set_result(_ejecutar(funcion, args, kwargs, enviado))
+                except Exception as e:
+                    futuro.set_exception(e)
+            else:
+                try:
+                    futuro = executor.submit(_ejecutar, funcion, args, kwargs, enviado)
+                except BrokenProcessPool:
+                    # Un hijo murió desde la última tarea: reintentar en un pool nuevo
+                    self._descartar_executor(executor)
+                    executor = self._obtener_executor()
+                    futuro = executor.submit(_ejecutar, funcion, args, kwargs, enviado)
+        except Exception:
+            self._terminar(None)
+            raise
+
+        futuro.add_done_callback(functools.partial(self._terminar, executor=executor))
+        return futuro
+
+    def ejecutar(self, funcion: Callable, *args, **kwargs) -> Tuple[any, float]:
+        """
+        Ejecuta una tarea en el pool y espera su resultado.
+
+        Returns:
+            Tupla (resultado, segundos de espera en la cola)
+
+        Raises:
+            ColaLlenaError: Si la cola está llena
+        """
+        return self.enviar(funcion, *args, **kwargs).result()
+
+    def _terminar(self, futuro: Optional[Future],
+                  executor: Optional[ProcessPoolExecutor] = None):
+        """Libera el hueco de la tarea y registra su tiempo de espera."""
+        if executor is not None and futuro is not None and not futuro.cancelled() and \
+                isinstance(futuro.exception(), BrokenProcessPool):
+            self._descartar_executor(executor)
+        with self._lock:
+            self._pendientes -= 1
+            self._completadas += 1
+            if futuro is not None and not futuro.cancelled() and futuro.exception() is None:
+                self._esperas.append(futuro.result()[1])
+        self._huecos.release()
+
+    def estado(self) -> Dict[str, any]:
+        """Profundidad de la cola y tiempos de espera recientes."""
+        with self._lock:
+            esperas = list(self._esperas)
+            return {
+                'procesos': self.procesos,
+                'capacidad': self.capacidad,
+                'pendientes': self._pendientes,
+                'en_espera': max(0, self._pendientes - max(1, self.procesos)),
+                'completadas': self._completadas,
+                'rechazadas': self._rechazadas,
+                'espera_media_s': round(sum(esperas) / len(esperas), 3) if esperas else 0.0,
+                'espera_max_s': round(max(esperas), 3) if esperas else 0.0
+            }
+
+    def cerrar(self):
+        """Detiene el pool de procesos sin esperar a las tareas pendientes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_cola: Optional[ColaOCR] = None
+_cola_lock = threading.Lock()
+
+
+def obtener_cola() -> ColaOCR:
+    """Devuelve la cola de OCR del proceso actual (una por worker de gunicorn)."""
+    global _cola
+    if _cola is None:
+        with _cola_lock:
+            if _cola is None:
+                _cola = ColaOCR()
+                atexit.register(_cola.cerrar)
+    return _cola
@@ -5,10 +5,15 @@ Extractor de Texto y Números de Imágenes
 Este programa utiliza OCR para extraer texto y datos numéricos de imágenes.
 """
 
+import os
 import re
+import sys
 import json
+import time
+import hashlib
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import argparse
 
 try:
@@ -20,6 +25,10 @@ except ImportError as e:
     exit(1)
 
 
+# Manifiesto de imágenes ya procesadas dentro de cada carpeta (una línea JSON por archivo)
+MANIFIESTO = '.extraccion_manifest.jsonl'
+
+
 def preprocesar_imagen(ruta_imagen: str) -> Image.Image:
     """
     Preprocesa la imagen para mejorar la calidad del OCR.
@@ -60,18 +69,18 @@ def extraer_texto_completo(ruta_imagen: str, idioma: str = 'spa') -> str:
         
     Returns:
         Texto extraído de la imagen
-    """
-    try:
-        imagen = preprocesar_imagen(ruta_imagen)
         
-        # Configuración de OCR para mejor precisión
-        config = '--psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÁÉÍÓÚáéíóúÑñ.,;:()[]{}!?@#$%&*-+=/ '
-        
-        texto = pytesseract.image_to_string(imagen, lang=idioma, config=config)
-        return texto.strip()
-    except Exception as e:
-        print(f"Error al extraer texto de {ruta_imagen}: {e}")
-        return ""
+    Raises:
+        Exception: Si la imagen no se puede leer o falla el OCR (el llamador
+                   lo registra como error de esa imagen)
+    """
+    imagen = preprocesar_imagen(ruta_imagen)
+    
+    # Configuración de OCR para mejor precisión
+    config = '--psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÁÉÍÓÚáéíóúÑñ.,;:()[]{}!?@#$%&*-+=/ '
+    
+    texto = pytesseract.image_to_string(imagen, lang=idioma, config=config)
+    return texto.strip()
 
 
 def extraer_numeros(texto: str) -> List[Dict[str, any]]:
@@ -167,7 +176,7 @@ def procesar_imagen(ruta_imagen: str, idioma: str = 'spa', guardar_json: bool =
     if not ruta.exists():
         raise FileNotFoundError(f"La imagen {ruta_imagen} no existe")
     
-    print(f"Procesando: {ruta.name}...")
+    print(f"Procesando: {ruta.name}...", file=sys.stderr)
     
     # Extraer texto completo
     texto_completo = extraer_texto_completo(ruta_imagen, idioma)
@@ -202,22 +211,108 @@ def procesar_imagen(ruta_imagen: str, idioma: str = 'spa', guardar_json: bool =
         json_path = ruta.parent / f"{ruta.stem}_extraccion.json"
         with open(json_path, 'w', encoding='utf-8') as f:
             json.dump(resultados, f, ensure_ascii=False, indent=2)
-        print(f"Resultados guardados en: {json_path}")
+        print(f"Resultados guardados en: {json_path}", file=sys.stderr)
     
     return resultados
 
 
-def procesar_carpeta(carpeta: str, idioma: str = 'spa', extensiones: List[str] = None) -> List[Dict[str, any]]:
+def listar_imagenes(carpeta_path: Path, extensiones: List[str]) -> List[Path]:
+    """
+    Lista las imágenes de una carpeta en una sola pasada, sin distinguir
+    mayúsculas en la extensión.
+    
+    Args:
+        carpeta_path: Carpeta a recorrer
+        extensiones: Lista de extensiones de archivo a incluir
+        
+    Returns:
+        Rutas de las imágenes ordenadas por nombre
+    """
+    sufijos = {ext.lower() for ext in extensiones}
+    return sorted(p for p in carpeta_path.iterdir()
+                  if p.suffix.lower() in sufijos and p.is_file())
+
+
+def hash_archivo(ruta: Path) -> str:
+    """Calcula el SHA-256 del contenido de un archivo leyéndolo por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def cargar_manifiesto(ruta_manifiesto: Path) -> Tuple[Dict[str, Dict], set]:
+    """
+    Lee el manifiesto de archivos ya procesados.
+    
+    Returns:
+        Tupla (entradas por nombre de archivo, conjunto de hashes procesados)
+    """
+    entradas = {}
+    hashes = set()
+    if not ruta_manifiesto.exists():
+        return entradas, hashes
+    
+    with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                entrada = json.loads(linea)
+            except json.JSONDecodeError:
+                # Línea incompleta por una interrupción a mitad de escritura
+                continue
+            entradas[entrada['ruta']] = entrada
+            hashes.add(entrada['sha256'])
+    
+    return entradas, hashes
+
+
+def _procesar_para_manifiesto(ruta_imagen: str, idioma: str, guardar_json: bool = True,
+                              sha256: Optional[str] = None) -> Tuple[Dict[str, any], Dict[str, any]]:
+    """
+    Procesa una imagen y devuelve sus resultados junto con la entrada del manifiesto.
+    Se ejecuta en los procesos del modo paralelo.
+    """
+    ruta = Path(ruta_imagen)
+    stat = ruta.stat()
+    entrada = {
+        'ruta': ruta.name,
+        'tamano': stat.st_size,
+        'mtime': stat.st_mtime,
+        'sha256': sha256 or hash_archivo(ruta)
+    }
+    return procesar_imagen(ruta_imagen, idioma, guardar_json), entrada
+
+
+def iterar_carpeta(carpeta: str, idioma: str = 'spa', extensiones: List[str] = None,
+                   workers: int = 1, reanudar: bool = True,
+                   guardar_json: bool = True,
+                   ruta_manifiesto: Optional[str] = None) -> Iterator[Dict[str, any]]:
     """
-    Procesa todas las imágenes en una carpeta.
+    Procesa todas las imágenes en una carpeta y entrega cada resultado en cuanto
+    termina, sin acumularlos en memoria.
+    
+    Los archivos terminados se anotan en un manifiesto (ruta, tamaño, mtime y
+    hash del contenido), por defecto dentro de la carpeta, de modo que una nueva
+    ejecución omite lo ya procesado y continúa tras una interrupción. Los
+    archivos nuevos o modificados se leen una vez para calcular su hash y se
+    omiten también si su contenido ya se procesó (copias o renombrados). Una imagen se anota
+    después de que el consumidor haya recibido su resultado. Las imágenes que
+    fallan no se anotan (se reintentan en la siguiente ejecución) y se entregan
+    como {'archivo': ..., 'error': ...}, igual que en el modo lote de extractor_rojo.
     
     Args:
         carpeta: Ruta a la carpeta
         idioma: Idioma para OCR
         extensiones: Lista de extensiones de archivo a procesar
+        workers: Número de procesos en paralelo (1 = secuencial)
+        reanudar: Si False, ignora el manifiesto y vuelve a procesar todo
+        guardar_json: Si True, guarda un archivo JSON junto a cada imagen
+        ruta_manifiesto: Manifiesto a usar (por defecto, MANIFIESTO dentro de la
+                         carpeta); necesario si la carpeta es de solo lectura
         
-    Returns:
-        Lista de resultados de todas las imágenes
+    Yields:
+        Resultados (o registros de error) de las imágenes procesadas en esta ejecución
     """
     if extensiones is None:
         extensiones = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif']
@@ -226,20 +321,117 @@ def procesar_carpeta(carpeta: str, idioma: str = 'spa', extensiones: List[str] =
     if not carpeta_path.exists():
         raise FileNotFoundError(f"La carpeta {carpeta} no existe")
     
-    imagenes = []
-    for ext in extensiones:
-        imagenes.extend(carpeta_path.glob(f'*{ext}'))
-        imagenes.extend(carpeta_path.glob(f'*{ext.upper()}'))
+    imagenes = listar_imagenes(carpeta_path, extensiones)
+    
+    ruta_manifiesto = Path(ruta_manifiesto) if ruta_manifiesto else carpeta_path / MANIFIESTO
+    if reanudar:
+        entradas, hashes = cargar_manifiesto(ruta_manifiesto)
+    else:
+        entradas, hashes = {}, set()
+        ruta_manifiesto.unlink(missing_ok=True)
+    
+    manifiesto = open(ruta_manifiesto, 'a', encoding='utf-8')
     
-    resultados = []
+    def anotar(entrada: Dict[str, any]):
+        # Escribir y forzar a disco cada entrada para poder reanudar tras un fallo
+        manifiesto.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+        manifiesto.flush()
+        os.fsync(manifiesto.fileno())
+        hashes.add(entrada['sha256'])
+    
+    # Omitir las imágenes sin cambios (mismo tamaño y mtime) o con contenido ya procesado
+    pendientes = []
     for imagen in imagenes:
-        try:
-            resultado = procesar_imagen(str(imagen), idioma)
-            resultados.append(resultado)
-        except Exception as e:
-            print(f"Error procesando {imagen.name}: {e}")
+        stat = imagen.stat()
+        entrada = entradas.get(imagen.name)
+        if entrada and entrada['tamano'] == stat.st_size and entrada['mtime'] == stat.st_mtime:
+            continue
+        # Archivo nuevo, modificado o tocado: comprobar si su contenido ya se procesó
+        contenido = hash_archivo(imagen) if hashes else None
+        if contenido in hashes:
+            anotar({'ruta': imagen.name, 'tamano': stat.st_size,
+                    'mtime': stat.st_mtime, 'sha256': contenido})
+            continue
+        pendientes.append((imagen, contenido))
+    
+    omitidas = len(imagenes) - len(pendientes)
+    if omitidas:
+        print(f"Omitidas {omitidas} imágenes ya procesadas (manifiesto: {ruta_manifiesto})",
+              file=sys.stderr)
+    
+    total = len(pendientes)
+    inicio = time.monotonic()
+    
+    def informar(hechas: int, nombre: str):
+        velocidad = hechas / max(time.monotonic() - inicio, 1e-6)
+        print(f"[{hechas}/{total}] {nombre} ({velocidad:.1f} img/s)", file=sys.stderr)
     
-    return resultados
+    try:
+        if workers <= 1:
+            for hechas, (imagen, contenido) in enumerate(pendientes, 1):
+                try:
+                    resultado, entrada = _procesar_para_manifiesto(str(imagen), idioma,
+                                                                   guardar_json, contenido)
+                except Exception as e:
+                    print(f"Error procesando {imagen.name}: {e}", file=sys.stderr)
+                    resultado, entrada = {'archivo': imagen.name, 'error': str(e)}, None
+                informar(hechas, imagen.name)
+                yield resultado
+                if entrada is not None:
+                    anotar(entrada)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futuros = {executor.submit(_procesar_para_manifiesto, str(imagen), idioma,
+                                           guardar_json, contenido): imagen
+                           for imagen, contenido in pendientes}
+                for hechas, futuro in enumerate(as_completed(futuros), 1):
+                    imagen = futuros[futuro]
+                    try:
+                        resultado, entrada = futuro.result()
+                    except Exception as e:
+                        print(f"Error procesando {imagen.name}: {e}", file=sys.stderr)
+                        resultado, entrada = {'archivo': imagen.name, 'error': str(e)}, None
+                    informar(hechas, imagen.name)
+                    yield resultado
+                    if entrada is not None:
+                        anotar(entrada)
+    finally:
+        manifiesto.close()
+
+
+def procesar_carpeta(carpeta: str, idioma: str = 'spa', extensiones: List[str] = None,
+                     workers: int = 1, reanudar: bool = True,
+                     ruta_manifiesto: Optional[str] = None) -> List[Dict[str, any]]:
+    """
+    Procesa todas las imágenes en una carpeta (ver `iterar_carpeta`).
+    
+    Args:
+        carpeta: Ruta a la carpeta
+        idioma: Idioma para OCR
+        extensiones: Lista de extensiones de archivo a procesar
+        workers: Número de procesos en paralelo (1 = secuencial)
+        reanudar: Si False, ignora el manifiesto y vuelve a procesar todo
+        ruta_manifiesto: Manifiesto a usar (por defecto, dentro de la carpeta)
+        
+    Returns:
+        Lista de resultados (o registros de error) de las imágenes procesadas
+        en esta ejecución
+    """
+    return list(iterar_carpeta(carpeta, idioma, extensiones, workers, reanudar,
+                               ruta_manifiesto=ruta_manifiesto))
+
+
+def abrir_salida_jsonl(destino: str) -> TextIO:
+    """Abre la salida JSONL: '-' para stdout o una ruta de archivo (se añade al final)."""
+    if destino == '-':
+        return sys.stdout
+    return open(destino, 'a', encoding='utf-8')
+
+
+def escribir_jsonl(salida: TextIO, resultado: Dict[str, any]):
+    """Escribe un resultado como una línea JSON compacta y la vuelca de inmediato."""
+    salida.write(json.dumps(resultado, ensure_ascii=False, separators=(',', ':')) + '\n')
+    salida.flush()
 
 
 def imprimir_resultados(resultados: Dict[str, any]):
@@ -285,6 +477,9 @@ Ejemplos de uso:
   python extractor_imagenes.py imagen.jpg
   python extractor_imagenes.py imagen.jpg --idioma eng
   python extractor_imagenes.py --carpeta ./imagenes
+  python extractor_imagenes.py --carpeta ./imagenes --workers 4
+  python extractor_imagenes.py --carpeta ./imagenes --jsonl - | ingesta
+  python extractor_imagenes.py --carpeta /mnt/fotos --manifiesto fotos.jsonl --jsonl -
   python extractor_imagenes.py imagen.jpg --no-json
         """
     )
@@ -297,18 +492,66 @@ Ejemplos de uso:
                        help='No guardar resultados en archivo JSON')
     parser.add_argument('--imprimir', '-p', action='store_true', 
                        help='Imprimir resultados en consola')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                       help='Procesos en paralelo al procesar una carpeta. Default: 1')
+    parser.add_argument('--reprocesar', action='store_true',
+                       help='Ignorar el manifiesto de la carpeta y procesar todas las imágenes')
+    parser.add_argument('--manifiesto', metavar='RUTA',
+                       help=f'Manifiesto de imágenes procesadas. Default: {MANIFIESTO} en la carpeta '
+                            '(úsalo si la carpeta es de solo lectura)')
+    parser.add_argument('--jsonl', nargs='?', const='-', metavar='RUTA',
+                       help='Escribir un registro JSON compacto por imagen a medida que termina '
+                            '(en RUTA o en stdout si se omite) en lugar de un JSON por imagen')
     
     args = parser.parse_args()
     
     try:
-        if args.carpeta:
+        if args.carpeta and args.jsonl:
+            # Procesar carpeta en streaming: un registro por imagen, sin acumular resultados
+            salida = abrir_salida_jsonl(args.jsonl)
+            total = 0
+            errores = 0
+            try:
+                for resultado in iterar_carpeta(args.carpeta, args.idioma,
+                                                workers=args.workers,
+                                                reanudar=not args.reprocesar,
+                                                guardar_json=False,
+                                                ruta_manifiesto=args.manifiesto):
+                    escribir_jsonl(salida, resultado)
+                    total += 1
+                    errores += 'error' in resultado
+            finally:
+                if salida is not sys.stdout:
+                    salida.close()
+            print(f"\n✓ Procesadas {total - errores} imágenes ({errores} con error)", file=sys.stderr)
+        
+        elif args.carpeta:
             # Procesar carpeta completa
-            resultados = procesar_carpeta(args.carpeta, args.idioma)
-            print(f"\n✓ Procesadas {len(resultados)} imágenes")
+            resultados = procesar_carpeta(args.carpeta, args.idioma,
+                                          workers=args.workers,
+                                          reanudar=not args.reprocesar,
+                                          ruta_manifiesto=args.manifiesto)
+            errores = [r for r in resultados if 'error' in r]
+            print(f"\n✓ Procesadas {len(resultados) - len(errores)} imágenes ({len(errores)} con error)")
             
             if args.imprimir:
                 for resultado in resultados:
-                    imprimir_resultados(resultado)
+                    if 'error' in resultado:
+                        print(f"\n✗ {resultado['archivo']}: {resultado['error']}")
+                    else:
+                        imprimir_resultados(resultado)
+        
+        elif args.archivo and args.jsonl:
+            # Archivo individual como un registro JSONL (o un registro de error)
+            try:
+                resultado = procesar_imagen(args.archivo, args.idioma, guardar_json=False)
+            except Exception as e:
+                print(f"Error procesando {Path(args.archivo).name}: {e}", file=sys.stderr)
+                resultado = {'archivo': Path(args.archivo).name, 'error': str(e)}
+            salida = abrir_salida_jsonl(args.jsonl)
+            escribir_jsonl(salida, resultado)
+            if salida is not sys.stdout:
+                salida.close()
         
         elif args.archivo:
             # Procesar archivo individual
@@ -7,77 +7,274 @@ Extrae solo el texto que está marcado/subrayado en rojo en imágenes de caudal
 
 import re
 import json
+import time
 import numpy as np
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional, Union
 import cv2
 
 try:
-    from PIL import Image, ImageEnhance
-    import pytesseract
+    from PIL import Image, ImageEnhance, ImageOps
 except ImportError as e:
     print(f"Error: Faltan dependencias. Instala con: pip install -r requirements.txt")
     print(f"Error específico: {e}")
     exit(1)
 
+from motor_ocr import reconocer_palabras
+from lector_lcd import leer_siete_segmentos
 
-def detectar_areas_rojas(imagen_path: str, umbral_rojo: int = 100) -> List[Tuple[int, int, int, int]]:
+
+# Versión del preprocesado y la detección: cambiarla invalida los resultados en caché
+VERSION_PREPROCESADO = 8
+
+# Lado mayor (px) de la copia reducida sobre la que se buscan las áreas rojas
+LADO_MAX_DETECCION = 1600
+
+# Semiancho del rango de matiz del rojo alrededor de 0/180 (escala HSV de OpenCV)
+MATIZ_ROJO = 10
+
+# Fracción de solape (de área o de altura) a partir de la cual dos áreas se fusionan
+SOLAPE_FUSION = 0.5
+
+# Caracteres permitidos en el OCR de las áreas rojas
+LISTA_BLANCA_OCR = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÁÉÍÓÚáéíóúÑñ.,;:()[]{}!?@#$%&*-+=/ m³hΣ+−'
+
+# Caracteres de las lecturas numéricas de un display (primer nivel de OCR)
+LISTA_BLANCA_DIGITOS = '0123456789.,:+-−/ m³hl'
+
+# Confianza media por palabra (0-100) a partir de la cual no se escala de nivel
+CONFIANZA_MINIMA = 70
+
+# Niveles de OCR de más barato a más caro:
+# (nombre, realzar contraste y nitidez, usar el PSM alternativo, lista blanca)
+NIVELES_OCR = (
+    ('digitos', False, False, LISTA_BLANCA_DIGITOS),
+    ('realzado', True, False, LISTA_BLANCA_OCR),
+    ('bloque', True, True, LISTA_BLANCA_OCR),
+)
+
+# Motores de OCR seleccionables: 'lcd' prueba antes el lector de siete
+# segmentos y solo recurre a Tesseract cuando no está seguro
+MOTORES_OCR = ('tesseract', 'lcd')
+
+# Extensiones que se procesan al pasar una carpeta por línea de comandos
+EXTENSIONES_IMAGEN = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif', '.webp'}
+
+# Píxeles en blanco entre recortes en la imagen compuesta del modo lote
+SEPARACION_LOTE = 20
+
+# Alto mínimo (px) que debe conservar un área al decodificar el JPEG a escala reducida
+ALTO_MIN_AREA_OCR = 96
+
+# Orientaciones EXIF que giran la imagen 90 o 270 grados (intercambian ancho y alto)
+ORIENTACIONES_GIRADAS = {5, 6, 7, 8}
+
+
+# Una imagen puede llegar como ruta, como bytes codificados (JPEG, PNG...)
+# o ya decodificada como array BGR de OpenCV
+FuenteImagen = Union[str, Path, bytes, bytearray, memoryview, np.ndarray]
+
+
+def cargar_imagen(fuente: FuenteImagen) -> np.ndarray:
     """
-    Detecta áreas rojas (subrayados/marcas) en la imagen.
+    Decodifica una imagen una sola vez y la devuelve como array BGR de OpenCV.
+    Si ya es un array, se devuelve sin volver a decodificar.
     
     Args:
-        imagen_path: Ruta a la imagen
-        umbral_rojo: Sensibilidad para detectar rojo (0-255)
+        fuente: Ruta a la imagen, bytes codificados o array de NumPy
         
     Returns:
-        Lista de tuplas (x, y, ancho, alto) con las coordenadas de las áreas rojas
+        Imagen BGR con forma (alto, ancho, 3)
     """
+    if isinstance(fuente, np.ndarray):
+        if fuente.ndim == 2:
+            return cv2.cvtColor(fuente, cv2.COLOR_GRAY2BGR)
+        if fuente.shape[2] == 4:
+            return cv2.cvtColor(fuente, cv2.COLOR_BGRA2BGR)
+        return fuente
+    
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(fuente, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            # Intentar con PIL si OpenCV falla (ej: GIF)
+            pil_img = Image.open(BytesIO(fuente)).convert('RGB')
+            img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        return img
+    
     # Leer imagen con OpenCV
-    img = cv2.imread(imagen_path)
+    img = cv2.imread(str(fuente))
     if img is None:
         # Intentar con PIL si OpenCV falla
-        pil_img = Image.open(imagen_path)
+        pil_img = Image.open(fuente).convert('RGB')
         img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+    return img
+
+
+def cargar_area_jpeg(fuente: FuenteImagen, x: int, y: int, ancho: int, alto: int
+                     ) -> Optional[Tuple[np.ndarray, Tuple[int, int, int, int]]]:
+    """
+    Decodifica solo lo necesario de un JPEG para leer un área.
     
-    # Convertir a HSV para mejor detección de color
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    El decodificador JPEG de PIL (draft) entrega directamente la luminancia, sin
+    convertir a color, y a 1/2, 1/4 u 1/8 de escala cuando el área sigue
+    teniendo al menos ALTO_MIN_AREA_OCR píxeles de alto. Las coordenadas son
+    las de la imagen completa ya orientada según su EXIF (como la muestra el
+    navegador).
     
-    # Definir rangos para rojo (en HSV, el rojo está en dos rangos)
-    # Rango 1: rojos con matiz bajo (0-10)
-    lower_red1 = np.array([0, 50, 50])
-    upper_red1 = np.array([10, 255, 255])
+    Args:
+        fuente: Ruta a la imagen o bytes codificados
+        x, y: Coordenadas del punto superior izquierdo del área
+        ancho, alto: Dimensiones del área
+        
+    Returns:
+        Tupla (recorte en escala de grises, área ajustada a la imagen completa)
+        o None si la fuente no es un JPEG
+    """
+    if isinstance(fuente, np.ndarray):
+        return None
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        fuente = BytesIO(fuente)
     
-    # Rango 2: rojos con matiz alto (170-180)
-    lower_red2 = np.array([170, 50, 50])
-    upper_red2 = np.array([180, 255, 255])
+    img = Image.open(fuente)
+    if img.format != 'JPEG':
+        return None
     
-    # Crear máscaras para ambos rangos
-    mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-    mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
+    # Tamaño de la imagen completa tal como se muestra (orientación EXIF aplicada)
+    orientacion = img.getexif().get(0x0112, 1)
+    img_ancho, img_alto = img.size
+    if orientacion in ORIENTACIONES_GIRADAS:
+        img_ancho, img_alto = img_alto, img_ancho
     
-    # Combinar máscaras
-    mask = cv2.bitwise_or(mask1, mask2)
+    # Asegurar que las coordenadas estén dentro de la imagen
+    x = max(0, min(x, img_ancho))
+    y = max(0, min(y, img_alto))
+    ancho = max(1, min(ancho, img_ancho - x))
+    alto = max(1, min(alto, img_alto - y))
+    
+    # Mayor reducción que deja el área con alto suficiente para el OCR
+    factor = 1
+    while factor < 8 and alto / (factor * 2) >= ALTO_MIN_AREA_OCR:
+        factor *= 2
+    img.draft('L', (-(-img.size[0] // factor), -(-img.size[1] // factor)))
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'L':
+        img = img.convert('L')
+    
+    # Escala real elegida por el decodificador
+    escala = img.size[0] / img_ancho
+    caja = (int(x * escala), int(y * escala),
+            max(int(x * escala) + 1, int(round((x + ancho) * escala))),
+            max(int(y * escala) + 1, int(round((y + alto) * escala))))
+    return np.asarray(img.crop(caja)), (x, y, ancho, alto)
+
+
+@lru_cache(maxsize=8)
+def tabla_rojo(umbral_rojo: int = 100) -> np.ndarray:
+    """
+    Tabla de consulta HSV para cv2.LUT: marca con 255 los valores de cada canal
+    que entran en el rango del rojo.
+    
+    Args:
+        umbral_rojo: Sensibilidad (0-255); la saturación y el brillo mínimos son
+                     la mitad de este valor (100 -> 50, los rangos históricos)
+        
+    Returns:
+        Tabla (1, 256, 3) para matiz, saturación y brillo
+    """
+    minimo = max(0, min(255, umbral_rojo)) // 2
+    valores = np.arange(256)
+    tabla = np.zeros((1, 256, 3), np.uint8)
+    # En OpenCV el matiz va de 0 a 180: el rojo está en ambos extremos
+    tabla[0, :, 0] = np.where((valores <= MATIZ_ROJO) |
+                              ((valores >= 180 - MATIZ_ROJO) & (valores <= 180)), 255, 0)
+    tabla[0, :, 1] = np.where(valores >= minimo, 255, 0)
+    tabla[0, :, 2] = np.where(valores >= minimo, 255, 0)
+    return tabla
+
+
+def componentes_rojos(img: np.ndarray, umbral_rojo: int = 100,
+                      lado_max: Optional[int] = LADO_MAX_DETECCION) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Obtiene las cajas de las manchas rojas y sus píxeles rojos, filtradas por tamaño.
+    
+    Args:
+        img: Imagen BGR ya decodificada
+        umbral_rojo: Sensibilidad para detectar rojo (0-255)
+        lado_max: Lado mayor de la copia reducida (None = resolución completa)
+        
+    Returns:
+        Tupla (cajas (N, 4) con x, y, ancho, alto en coordenadas originales,
+        píxeles rojos de cada caja escalados a resolución original),
+        ordenadas de arriba a abajo
+    """
+    alto_img, ancho_img = img.shape[:2]
+    
+    # Reducir la imagen para detectar; las cajas se escalan de vuelta al final
+    escala = 1.0
+    if lado_max and max(alto_img, ancho_img) > lado_max:
+        escala = lado_max / max(alto_img, ancho_img)
+        img = cv2.resize(img, (round(ancho_img * escala), round(alto_img * escala)),
+                         interpolation=cv2.INTER_AREA)
+    
+    # Convertir a HSV y clasificar los tres canales con una sola tabla de consulta;
+    # un píxel es rojo si los tres canales están dentro del rango
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(cv2.LUT(hsv, tabla_rojo(umbral_rojo)), (255, 255, 255), (255, 255, 255))
     
     # Aplicar operaciones morfológicas para limpiar la máscara
     kernel = np.ones((3, 3), np.uint8)
     mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
     mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
     
-    # Encontrar contornos
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    # Cajas y superficie de todas las manchas en una sola llamada (la fila 0 es el fondo)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    stats = stats[1:]
+    x = stats[:, cv2.CC_STAT_LEFT]
+    y = stats[:, cv2.CC_STAT_TOP]
+    w = stats[:, cv2.CC_STAT_WIDTH]
+    h = stats[:, cv2.CC_STAT_HEIGHT]
+    pixeles = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
     
-    # Obtener rectángulos que encierran las áreas rojas
-    areas_rojas = []
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        # Filtrar áreas muy pequeñas (ruido)
-        if w > 20 and h > 5:  # Mínimo ancho y alto para subrayados
-            areas_rojas.append((x, y, w, h))
+    # Volver a coordenadas de la imagen original
+    if escala != 1.0:
+        x0 = (x / escala).astype(np.int64)
+        y0 = (y / escala).astype(np.int64)
+        x1 = np.minimum(ancho_img, np.ceil((x + w) / escala).astype(np.int64))
+        y1 = np.minimum(alto_img, np.ceil((y + h) / escala).astype(np.int64))
+        x, y, w, h = x0, y0, x1 - x0, y1 - y0
+        pixeles /= escala * escala
+    
+    # Filtrar áreas muy pequeñas (ruido): mínimo ancho y alto para subrayados
+    seleccion = (w > 20) & (h > 5)
+    cajas = np.stack([x, y, w, h], axis=1)[seleccion]
+    pixeles = pixeles[seleccion]
     
     # Ordenar por posición Y (de arriba a abajo)
-    areas_rojas.sort(key=lambda a: a[1])
+    orden = np.argsort(cajas[:, 1], kind='stable')
+    return cajas[orden], pixeles[orden]
+
+
+def detectar_areas_rojas(imagen: FuenteImagen, umbral_rojo: int = 100,
+                         lado_max: Optional[int] = LADO_MAX_DETECCION) -> List[Tuple[int, int, int, int]]:
+    """
+    Detecta áreas rojas (subrayados/marcas) en la imagen.
     
-    return areas_rojas
+    La detección se hace sobre una copia reducida (los subrayados son trazos
+    grandes) y las cajas se devuelven en coordenadas de la imagen original.
+    
+    Args:
+        imagen: Imagen BGR ya decodificada, bytes codificados o ruta a la imagen
+        umbral_rojo: Sensibilidad para detectar rojo (0-255); a mayor valor,
+                     más saturado y brillante debe ser el rojo
+        lado_max: Lado mayor de la copia reducida (None = resolución completa)
+        
+    Returns:
+        Lista de tuplas (x, y, ancho, alto) con las coordenadas de las áreas rojas
+    """
+    cajas, _ = componentes_rojos(cargar_imagen(imagen), umbral_rojo, lado_max)
+    return [tuple(int(v) for v in caja) for caja in cajas]
 
 
 def expandir_area_roja(x: int, y: int, w: int, h: int, ancho_img: int, alto_img: int, 
@@ -105,31 +302,147 @@ def expandir_area_roja(x: int, y: int, w: int, h: int, ancho_img: int, alto_img:
     return (x_nuevo, y_nuevo, w_nuevo, h_nuevo)
 
 
-def extraer_texto_de_area(imagen: Image.Image, area: Tuple[int, int, int, int], 
-                          idioma: str = 'spa', modo_linea: bool = True) -> str:
+def _union_cajas(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+    """Caja mínima que contiene a las dos cajas (x, y, w, h)."""
+    x = min(a[0], b[0])
+    y = min(a[1], b[1])
+    return (x, y, max(a[0] + a[2], b[0] + b[2]) - x, max(a[1] + a[3], b[1] + b[3]) - y)
+
+
+def puntuar_area(original: Tuple[int, int, int, int], pixeles: float, ancho_img: int) -> float:
     """
-    Extrae texto de un área específica de la imagen.
-    Optimizado para lectura de izquierda a derecha en una sola línea.
+    Estima entre 0 y 1 la probabilidad de que un área roja marque una lectura:
+    los subrayados son trazos alargados, de un ancho apreciable y rellenos de rojo.
+    """
+    x, y, w, h = original
+    alargamiento = min((w / max(h, 1)) / 10.0, 1.0)
+    anchura = min(w / (0.15 * ancho_img), 1.0)
+    relleno = min(pixeles / max(w * h, 1), 1.0)
+    return round(0.4 * alargamiento + 0.4 * anchura + 0.2 * relleno, 3)
+
+
+def _pares_fusionables(cajas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Índices (i, j), con i < j, de todos los pares de cajas expandidas que
+    cubren el mismo texto, evaluados a la vez con NumPy: se solapan en buena
+    parte (SOLAPE_FUSION del área menor) o están en la misma línea separadas
+    por un hueco no mayor que su altura (subrayado roto).
+    """
+    x, y, w, h = (cajas[:, k].astype(np.int64) for k in range(4))
+    inter_w = np.minimum.outer(x + w, x + w) - np.maximum.outer(x, x)
+    inter_h = np.minimum.outer(y + h, y + h) - np.maximum.outer(y, y)
+    area = w * h
+    
+    solapadas = (inter_w > 0) & (inter_h > 0) & \
+        (inter_w * inter_h >= SOLAPE_FUSION * np.minimum.outer(area, area))
+    colineales = (inter_h > 0) & (inter_h >= SOLAPE_FUSION * np.minimum.outer(h, h)) & \
+        (-inter_w <= np.maximum.outer(h, h))
+    return np.nonzero(np.triu(solapadas | colineales, k=1))
+
+
+def consolidar_areas(cajas: np.ndarray, pixeles: np.ndarray,
+                     ancho_img: int, alto_img: int) -> List[Dict[str, any]]:
+    """
+    Fusiona las áreas rojas que cubren el mismo texto una vez expandidas
+    (solapadas, casi duplicadas o trozos de un subrayado roto) y las ordena
+    por probabilidad de ser una lectura, para no pasar el OCR dos veces por
+    los mismos píxeles.
+    
+    Cada ronda evalúa todos los pares de una vez y une los grupos con
+    union-find; como las cajas unidas crecen y pueden alcanzar a otras, se
+    repite hasta que una ronda no fusiona nada (normalmente una o dos).
+    
+    Args:
+        cajas: Cajas (N, 4) de las áreas rojas detectadas
+        pixeles: Píxeles rojos de cada caja
+        ancho_img, alto_img: Dimensiones de la imagen
+        
+    Returns:
+        Lista de diccionarios con 'original', 'expandida' y 'puntuacion',
+        de mayor a menor puntuación
+    """
+    originales = [tuple(int(v) for v in caja) for caja in cajas]
+    sumas = [float(p) for p in pixeles]
+    expandidas = [expandir_area_roja(*o, ancho_img, alto_img) for o in originales]
+    
+    while len(originales) > 1:
+        pares_i, pares_j = _pares_fusionables(np.array(expandidas))
+        if len(pares_i) == 0:
+            break
+        
+        padre = list(range(len(originales)))
+        
+        def raiz(k: int) -> int:
+            while padre[k] != k:
+                padre[k] = padre[padre[k]]
+                k = padre[k]
+            return k
+        
+        for i, j in zip(pares_i.tolist(), pares_j.tolist()):
+            ri, rj = raiz(i), raiz(j)
+            if ri != rj:
+                padre[max(ri, rj)] = min(ri, rj)
+        
+        # Un grupo por raíz, en el orden de su primera caja
+        grupos: Dict[int, list] = {}
+        for k in range(len(originales)):
+            grupo = grupos.get(raiz(k))
+            if grupo is None:
+                grupos[raiz(k)] = [originales[k], sumas[k], expandidas[k]]
+            else:
+                grupo[0] = _union_cajas(grupo[0], originales[k])
+                grupo[1] += sumas[k]
+                grupo[2] = _union_cajas(grupo[2], expandidas[k])
+        
+        originales = [g[0] for g in grupos.values()]
+        sumas = [g[1] for g in grupos.values()]
+        expandidas = [_union_cajas(expandir_area_roja(*g[0], ancho_img, alto_img), g[2])
+                      for g in grupos.values()]
+    
+    resultado = [
+        {
+            'original': original,
+            'expandida': expandida,
+            'puntuacion': puntuar_area(original, suma, ancho_img)
+        }
+        for original, suma, expandida in zip(originales, sumas, expandidas)
+    ]
+    resultado.sort(key=lambda g: g['puntuacion'], reverse=True)
+    return resultado
+
+
+def recortar_gris(imagen: Union[Image.Image, np.ndarray],
+                  area: Tuple[int, int, int, int]) -> Image.Image:
+    """
+    Recorta un área de la imagen y la convierte a escala de grises.
     
     Args:
-        imagen: Imagen PIL
+        imagen: Imagen PIL o array BGR de OpenCV ya decodificado
         area: Tupla (x, y, w, h) con las coordenadas
-        idioma: Idioma para OCR
-        modo_linea: Si True, fuerza lectura en una sola línea (izquierda a derecha)
         
     Returns:
-        Texto extraído en una sola línea
+        Recorte PIL en escala de grises, sin más preprocesado
     """
     x, y, w, h = area
     
-    # Recortar el área
-    area_recortada = imagen.crop((x, y, x + w, y + h))
-    
-    # Preprocesar el área recortada
-    # Convertir a escala de grises
-    if area_recortada.mode != 'L':
-        area_recortada = area_recortada.convert('L')
+    # Recortar el área y convertir a escala de grises
+    if isinstance(imagen, np.ndarray):
+        recorte = imagen[y:y + h, x:x + w]
+        if recorte.ndim == 3:
+            recorte = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY)
+        area_recortada = Image.fromarray(recorte)
+    else:
+        area_recortada = imagen.crop((x, y, x + w, y + h))
+        if area_recortada.mode != 'L':
+            area_recortada = area_recortada.convert('L')
     
+    return area_recortada
+
+
+def realzar_recorte(area_recortada: Image.Image) -> Image.Image:
+    """
+    Aumenta el contraste y la nitidez de un recorte en escala de grises.
+    """
     # Aumentar contraste
     enhancer = ImageEnhance.Contrast(area_recortada)
     area_recortada = enhancer.enhance(2.0)
@@ -138,55 +451,228 @@ def extraer_texto_de_area(imagen: Image.Image, area: Tuple[int, int, int, int],
     enhancer = ImageEnhance.Sharpness(area_recortada)
     area_recortada = enhancer.enhance(2.0)
     
-    # Configuración OCR optimizada para lectura de izquierda a derecha
+    return area_recortada
+
+
+def preprocesar_area(imagen: Union[Image.Image, np.ndarray],
+                     area: Tuple[int, int, int, int]) -> Image.Image:
+    """
+    Recorta un área de la imagen y la prepara para el OCR.
+    
+    Args:
+        imagen: Imagen PIL o array BGR de OpenCV ya decodificado
+        area: Tupla (x, y, w, h) con las coordenadas
+        
+    Returns:
+        Recorte PIL en escala de grises con contraste y nitidez aumentados
+    """
+    return realzar_recorte(recortar_gris(imagen, area))
+
+
+def confianza_media(palabras: List[Dict[str, any]]) -> float:
+    """
+    Media de la confianza por palabra de Tesseract (0 si no hay palabras).
+    Las palabras sin confianza (valor negativo) no cuentan.
+    """
+    confianzas = [p['confianza'] for p in palabras if p['confianza'] >= 0]
+    if not confianzas:
+        return 0.0
+    return round(sum(confianzas) / len(confianzas), 1)
+
+
+def leer_area(imagen: Union[Image.Image, np.ndarray], area: Tuple[int, int, int, int],
+              idioma: str = 'spa', modo_linea: bool = True,
+              motor: str = 'tesseract') -> Dict[str, any]:
+    """
+    Lee el texto de un área escalando de nivel de OCR solo si hace falta.
+    
+    Empieza con una pasada orientada a dígitos sobre el recorte en grises sin
+    realzar; si la confianza media de las palabras queda por debajo de
+    CONFIANZA_MINIMA, prueba los siguientes niveles de NIVELES_OCR (realzado,
+    otro PSM) y se queda con la lectura de mayor confianza. Con el motor 'lcd'
+    se intenta antes el lector de siete segmentos.
+    
+    Args:
+        imagen: Imagen PIL o array BGR de OpenCV ya decodificado
+        area: Tupla (x, y, w, h) con las coordenadas
+        idioma: Idioma para OCR
+        modo_linea: Si True, fuerza lectura en una sola línea (izquierda a derecha)
+        motor: Motor de OCR (uno de MOTORES_OCR)
+        
+    Returns:
+        Diccionario con 'texto' (una línea), 'confianza' (0-100) y 'nivel_ocr'
+    """
+    recorte = recortar_gris(imagen, area)
+    
+    if motor == 'lcd':
+        lectura = leer_siete_segmentos(np.asarray(recorte))
+        if lectura is not None:
+            return lectura
+    
+    realzado = None
+    
     # PSM 7 = Tratar la imagen como una sola línea de texto
     # PSM 6 = Asumir un bloque uniforme de texto
-    psm_mode = '7' if modo_linea else '6'
+    psm_base = 7 if modo_linea else 6
+    psm_alternativo = 6 if modo_linea else 7
     
-    config = f'--psm {psm_mode} -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÁÉÍÓÚáéíóúÑñ.,;:()[]{{}}!?@#$%&*-+=/ m³hΣ+−'
+    mejor = None
+    for nivel, realzar, alternativo, lista_blanca in NIVELES_OCR:
+        if realzar and realzado is None:
+            realzado = realzar_recorte(recorte)
+        
+        # OCR en el área con un motor del pool (sin lanzar un subproceso por área)
+        palabras = reconocer_palabras(realzado if realzar else recorte, idioma,
+                                      psm_alternativo if alternativo else psm_base,
+                                      lista_blanca)
+        lectura = {
+            'texto': ' '.join(p['texto'] for p in palabras),
+            'confianza': confianza_media(palabras),
+            'nivel_ocr': nivel
+        }
+        
+        if mejor is None or lectura['confianza'] > mejor['confianza']:
+            mejor = lectura
+        if lectura['confianza'] >= CONFIANZA_MINIMA:
+            break
     
-    # OCR en el área
-    texto = pytesseract.image_to_string(area_recortada, lang=idioma, config=config)
+    return mejor
+
+
+def extraer_texto_de_area(imagen: Union[Image.Image, np.ndarray], area: Tuple[int, int, int, int], 
+                          idioma: str = 'spa', modo_linea: bool = True,
+                          motor: str = 'tesseract') -> str:
+    """
+    Extrae texto de un área específica de la imagen.
+    Optimizado para lectura de izquierda a derecha en una sola línea.
     
-    # Limpiar el texto: eliminar saltos de línea y espacios múltiples
-    texto = ' '.join(texto.split())
+    Args:
+        imagen: Imagen PIL o array BGR de OpenCV ya decodificado
+        area: Tupla (x, y, w, h) con las coordenadas
+        idioma: Idioma para OCR
+        modo_linea: Si True, fuerza lectura en una sola línea (izquierda a derecha)
+        motor: Motor de OCR (uno de MOTORES_OCR)
+        
+    Returns:
+        Texto extraído en una sola línea
+    """
+    return leer_area(imagen, area, idioma, modo_linea, motor)['texto']
+
+
+def extraer_textos_por_lote(imagen: Union[Image.Image, np.ndarray],
+                            areas: List[Tuple[int, int, int, int]],
+                            idioma: str = 'spa') -> List[Dict[str, any]]:
+    """
+    Extrae el texto de varias áreas con una sola llamada de OCR.
+    Los recortes se apilan en una imagen compuesta con desplazamientos conocidos
+    y cada palabra reconocida se asigna al área en cuya franja cae su centro.
+    
+    Args:
+        imagen: Imagen PIL o array BGR de OpenCV ya decodificado
+        areas: Lista de tuplas (x, y, w, h) con las coordenadas
+        idioma: Idioma para OCR
+        
+    Returns:
+        Lista con la lectura de cada área ('texto', 'confianza', 'nivel_ocr'),
+        en el mismo orden que `areas`
+    """
+    if not areas:
+        return []
+    
+    recortes = [preprocesar_area(imagen, area) for area in areas]
+    
+    # Componer los recortes uno debajo de otro, separados por franjas blancas
+    ancho = max(r.width for r in recortes) + SEPARACION_LOTE * 2
+    alto = sum(r.height for r in recortes) + SEPARACION_LOTE * (len(recortes) + 1)
+    compuesta = Image.new('L', (ancho, alto), 255)
+    
+    franjas = []
+    y_actual = SEPARACION_LOTE
+    for recorte in recortes:
+        compuesta.paste(recorte, (SEPARACION_LOTE, y_actual))
+        franjas.append((y_actual, y_actual + recorte.height))
+        y_actual += recorte.height + SEPARACION_LOTE
+    
+    # PSM 11 = Texto disperso: el orden lo reconstruimos con las franjas
+    palabras = reconocer_palabras(compuesta, idioma, 11, LISTA_BLANCA_OCR)
+    
+    # Asignar cada palabra a su área y ordenar de izquierda a derecha
+    palabras_por_area = [[] for _ in areas]
+    for palabra in palabras:
+        x, y, w, h = palabra['caja']
+        centro_y = y + h / 2
+        for i, (y_inicio, y_fin) in enumerate(franjas):
+            if y_inicio <= centro_y < y_fin:
+                palabras_por_area[i].append(palabra)
+                break
     
-    return texto.strip()
+    lecturas = []
+    for lista in palabras_por_area:
+        lista.sort(key=lambda p: p['caja'][0])
+        lecturas.append({
+            'texto': ' '.join(p['texto'] for p in lista),
+            'confianza': confianza_media(lista),
+            'nivel_ocr': 'lote'
+        })
+    return lecturas
 
 
-def procesar_area_especifica(ruta_imagen: str, x: int, y: int, ancho: int, alto: int,
-                             idioma: str = 'spa') -> Dict[str, any]:
+def _nombre_fuente(fuente: FuenteImagen, nombre_archivo: Optional[str]) -> str:
+    """
+    Devuelve el nombre a mostrar en los resultados y comprueba que la ruta exista.
+    """
+    if isinstance(fuente, (str, Path)):
+        ruta = Path(fuente)
+        if not ruta.exists():
+            raise FileNotFoundError(f"La imagen {fuente} no existe")
+        return nombre_archivo or ruta.name
+    return nombre_archivo or 'imagen'
+
+
+def procesar_area_especifica(fuente: FuenteImagen, x: int, y: int, ancho: int, alto: int,
+                             idioma: str = 'spa', nombre_archivo: Optional[str] = None,
+                             motor: str = 'tesseract') -> Dict[str, any]:
     """
     Procesa un área específica de la imagen para extraer texto.
     
     Args:
-        ruta_imagen: Ruta a la imagen
+        fuente: Ruta a la imagen, bytes codificados o array ya decodificado
+                (BGR o luminancia)
         x, y: Coordenadas del punto superior izquierdo del área
         ancho, alto: Dimensiones del área a procesar
         idioma: Idioma para OCR
+        nombre_archivo: Nombre a mostrar en los resultados (por defecto, el de la ruta)
+        motor: Motor de OCR (uno de MOTORES_OCR)
         
     Returns:
         Diccionario con los datos extraídos
     """
-    ruta = Path(ruta_imagen)
-    if not ruta.exists():
-        raise FileNotFoundError(f"La imagen {ruta_imagen} no existe")
+    nombre = _nombre_fuente(fuente, nombre_archivo)
     
-    # Cargar imagen
-    imagen = Image.open(ruta_imagen)
-    img_ancho, img_alto = imagen.size
-    
-    # Asegurar que las coordenadas estén dentro de la imagen
-    x = max(0, min(x, img_ancho))
-    y = max(0, min(y, img_alto))
-    ancho = max(1, min(ancho, img_ancho - x))
-    alto = max(1, min(alto, img_alto - y))
-    
-    # Recortar el área específica
-    area_recortada = imagen.crop((x, y, x + ancho, y + alto))
+    # En JPEG decodificar solo la luminancia, a escala reducida si el área lo permite
+    area_jpeg = cargar_area_jpeg(fuente, x, y, ancho, alto)
+    if area_jpeg is not None:
+        recorte, (x, y, ancho, alto) = area_jpeg
+        imagen = recorte
+        area = (0, 0, recorte.shape[1], recorte.shape[0])
+    else:
+        # Una luminancia ya decodificada (sesion_imagenes) se recorta tal cual
+        if isinstance(fuente, np.ndarray) and fuente.ndim == 2:
+            imagen = fuente
+        else:
+            imagen = cargar_imagen(fuente)
+        img_alto, img_ancho = imagen.shape[:2]
+        
+        # Asegurar que las coordenadas estén dentro de la imagen
+        x = max(0, min(x, img_ancho))
+        y = max(0, min(y, img_alto))
+        ancho = max(1, min(ancho, img_ancho - x))
+        alto = max(1, min(alto, img_alto - y))
+        area = (x, y, ancho, alto)
     
     # Extraer texto del área (modo línea única, izquierda a derecha)
-    texto = extraer_texto_de_area(imagen, (x, y, ancho, alto), idioma, modo_linea=True)
+    lectura = leer_area(imagen, area, idioma, modo_linea=True, motor=motor)
+    texto = lectura['texto']
     
     # Extraer números del texto
     numeros = extraer_numeros(texto)
@@ -195,7 +681,7 @@ def procesar_area_especifica(ruta_imagen: str, x: int, y: int, ancho: int, alto:
     texto_linea = ' '.join(texto.split())
     
     return {
-        'archivo': ruta.name,
+        'archivo': nombre,
         'area_seleccionada': {
             'x': x,
             'y': y,
@@ -204,6 +690,8 @@ def procesar_area_especifica(ruta_imagen: str, x: int, y: int, ancho: int, alto:
         },
         'texto_extraido': texto_linea,
         'texto_una_linea': texto_linea,  # Texto en una sola línea
+        'confianza': lectura['confianza'],
+        'nivel_ocr': lectura['nivel_ocr'],
         'numeros_encontrados': numeros,
         'resumen': {
             'total_numeros': len(numeros),
@@ -212,76 +700,148 @@ def procesar_area_especifica(ruta_imagen: str, x: int, y: int, ancho: int, alto:
     }
 
 
-def procesar_caudalimetro(ruta_imagen: str, idioma: str = 'spa', 
-                          guardar_debug: bool = False) -> Dict[str, any]:
+def procesar_caudalimetro(fuente: FuenteImagen, idioma: str = 'spa', 
+                          guardar_debug: bool = False,
+                          nombre_archivo: Optional[str] = None,
+                          modo_lote: bool = False,
+                          umbral_rojo: int = 100,
+                          presupuesto_s: Optional[float] = None,
+                          inicio: Optional[float] = None,
+                          motor: str = 'tesseract',
+                          componentes: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict[str, any]:
     """
     Procesa una imagen de caudalímetro y extrae solo el texto marcado en rojo.
+    La imagen se decodifica una sola vez y el mismo buffer se usa para la
+    detección de rojo, los recortes, el OCR y la imagen de debug.
     
     Args:
-        ruta_imagen: Ruta a la imagen
+        fuente: Ruta a la imagen, bytes codificados o array BGR ya decodificado
         idioma: Idioma para OCR
         guardar_debug: Si True, guarda imágenes de debug con las áreas detectadas
+        nombre_archivo: Nombre a mostrar en los resultados (por defecto, el de la ruta)
+        modo_lote: Si True, ejecuta un solo OCR para todas las áreas de la imagen
+        umbral_rojo: Sensibilidad para detectar rojo (0-255)
+        presupuesto_s: Segundos disponibles; las áreas de menor prioridad que no
+                       quepan se omiten y se indican en 'areas_omitidas' (en
+                       modo_lote, el lote solo lleva las que caben)
+        inicio: Instante (time.time()) desde el que corre el presupuesto, por
+                ejemplo la llegada de la petición (por defecto, ahora)
+        motor: Motor de OCR (uno de MOTORES_OCR)
+        componentes: Resultado de componentes_rojos(imagen, umbral_rojo) si ya
+                     se calculó (p. ej. mientras se leía el QR)
         
     Returns:
         Diccionario con los datos extraídos
     """
-    ruta = Path(ruta_imagen)
-    if not ruta.exists():
-        raise FileNotFoundError(f"La imagen {ruta_imagen} no existe")
+    limite = None
+    if presupuesto_s is not None:
+        limite = (inicio if inicio is not None else time.time()) + presupuesto_s
+    
+    nombre = _nombre_fuente(fuente, nombre_archivo)
     
-    # Cargar imagen
-    imagen = Image.open(ruta_imagen)
-    ancho, alto = imagen.size
+    # Decodificar imagen una sola vez
+    imagen = cargar_imagen(fuente)
+    alto, ancho = imagen.shape[:2]
     
     # Detectar áreas rojas
-    areas_rojas = detectar_areas_rojas(ruta_imagen)
+    cajas, pixeles = componentes if componentes is not None else componentes_rojos(imagen, umbral_rojo)
     
-    if not areas_rojas:
+    if len(cajas) == 0:
         return {
-            'archivo': ruta.name,
+            'archivo': nombre,
             'texto_rojo': [],
             'texto_completo': '',
             'areas_detectadas': 0,
             'error': 'No se detectaron áreas rojas en la imagen'
         }
     
-    # Expandir áreas y extraer texto
+    # Expandir áreas, fusionar las que cubren el mismo texto y ordenarlas por
+    # probabilidad de ser una lectura (el OCR se hace en ese orden)
+    areas = consolidar_areas(cajas, pixeles, ancho, alto)
+    for prioridad, area in enumerate(areas, 1):
+        area['prioridad'] = prioridad
+    
+    # Extraer texto (un OCR por área o uno solo para todas en modo lote)
+    if modo_lote:
+        pendientes = areas
+        if motor == 'lcd':
+            # Tesseract solo para las áreas que el lector LCD no reconoce
+            for area in areas:
+                lectura = leer_siete_segmentos(np.asarray(recortar_gris(imagen, area['expandida'])))
+                if lectura is not None:
+                    area['lectura'] = lectura
+            pendientes = [a for a in areas if 'lectura' not in a]
+        if limite is not None and len(pendientes) > 1:
+            # El área de mayor prioridad se lee sola y mide el coste por píxel;
+            # el lote lleva después las siguientes mientras quepan en lo que queda
+            inicio_ocr = time.time()
+            primera = pendientes[0]
+            primera['lectura'] = extraer_textos_por_lote(imagen, [primera['expandida']], idioma)[0]
+            _, _, w, h = primera['expandida']
+            coste_pixel = (time.time() - inicio_ocr) / max(1, w * h)
+            restante = limite - time.time()
+            lote = []
+            for area in pendientes[1:]:
+                _, _, w, h = area['expandida']
+                restante -= coste_pixel * w * h
+                if restante < 0:
+                    break
+                lote.append(area)
+            pendientes = lote
+        lecturas = extraer_textos_por_lote(imagen, [a['expandida'] for a in pendientes], idioma)
+        for area, lectura in zip(pendientes, lecturas):
+            area['lectura'] = lectura
+    else:
+        # La primera área siempre se procesa; las siguientes solo si el tiempo
+        # medio por área cabe en lo que queda de presupuesto
+        inicio_ocr = time.time()
+        for hechas, area in enumerate(areas):
+            if limite is not None and hechas > 0:
+                media = (time.time() - inicio_ocr) / hechas
+                if time.time() + media > limite:
+                    break
+            area['lectura'] = leer_area(imagen, area['expandida'], idioma, motor=motor)
+    
+    # Presentar las áreas de arriba a abajo
+    areas.sort(key=lambda a: (a['expandida'][1], a['expandida'][0]))
+    
     textos_rojos = []
-    imagen_debug = None
-    
-    if guardar_debug:
-        # Crear imagen de debug con OpenCV
-        img_debug = cv2.imread(ruta_imagen)
-        if img_debug is None:
-            pil_img = Image.open(ruta_imagen)
-            img_debug = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-    
-    for i, area in enumerate(areas_rojas):
-        # Expandir área para capturar texto completo
-        area_expandida = expandir_area_roja(area[0], area[1], area[2], area[3], 
-                                           ancho, alto)
-        
-        # Extraer texto
-        texto = extraer_texto_de_area(imagen, area_expandida, idioma)
-        
-        if texto:
+    areas_omitidas = []
+    img_debug = imagen.copy() if guardar_debug else None
+    
+    for i, area in enumerate(areas):
+        if 'lectura' not in area:
+            areas_omitidas.append({
+                'area': i + 1,
+                'prioridad': area['prioridad'],
+                'coordenadas_expandidas': area['expandida'],
+                'motivo': 'presupuesto_agotado'
+            })
+        elif area['lectura']['texto']:
             textos_rojos.append({
                 'area': i + 1,
-                'texto': texto,
-                'coordenadas_originales': area,
-                'coordenadas_expandidas': area_expandida
+                'texto': area['lectura']['texto'],
+                'confianza': area['lectura']['confianza'],
+                'nivel_ocr': area['lectura']['nivel_ocr'],
+                'prioridad': area['prioridad'],
+                'puntuacion': area['puntuacion'],
+                'coordenadas_originales': area['original'],
+                'coordenadas_expandidas': area['expandida']
             })
         
         # Dibujar en imagen de debug
         if guardar_debug:
-            x, y, w, h = area_expandida
+            x, y, w, h = area['expandida']
             cv2.rectangle(img_debug, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.putText(img_debug, f"Area {i+1}", (x, y-5), 
+            cv2.putText(img_debug, f"Area {i+1} (P{area['prioridad']})", (x, y-5), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
     
     # Guardar imagen de debug si se solicita
     if guardar_debug and img_debug is not None:
-        debug_path = ruta.parent / f"{ruta.stem}_debug.jpg"
+        if isinstance(fuente, (str, Path)):
+            debug_path = Path(fuente).parent / f"{Path(fuente).stem}_debug.jpg"
+        else:
+            debug_path = Path(f"{Path(nombre).stem}_debug.jpg")
         cv2.imwrite(str(debug_path), img_debug)
     
     # Combinar todos los textos
@@ -291,13 +851,15 @@ def procesar_caudalimetro(ruta_imagen: str, idioma: str = 'spa',
     numeros = extraer_numeros(texto_completo)
     
     resultados = {
-        'archivo': ruta.name,
+        'archivo': nombre,
         'texto_rojo': textos_rojos,
         'texto_completo': texto_completo,
-        'areas_detectadas': len(areas_rojas),
+        'areas_detectadas': len(areas),
+        'areas_omitidas': areas_omitidas,
+        'parcial': bool(areas_omitidas),
         'numeros_encontrados': numeros,
         'resumen': {
-            'total_areas': len(areas_rojas),
+            'total_areas': len(areas),
             'total_textos': len(textos_rojos),
             'total_numeros': len(numeros)
         }
@@ -306,6 +868,122 @@ def procesar_caudalimetro(ruta_imagen: str, idioma: str = 'spa',
     return resultados
 
 
+def _recortar_region_qr(imagen: np.ndarray, esquinas_qr: np.ndarray,
+                       caja: Tuple[float, float, float, float]) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+    """
+    Recorta una región de un perfil medida desde el QR del medidor.
+    
+    La caja (x, y, w, h) está en lados de QR con origen en su esquina superior
+    izquierda y ejes a lo largo de sus bordes superior e izquierdo, así que el
+    recorte se endereza aunque la foto esté girada o en perspectiva.
+    
+    Args:
+        imagen: Imagen BGR ya decodificada
+        esquinas_qr: Esquinas del QR (ver qr_processor.localizar_qr)
+        caja: Región del perfil en lados de QR
+        
+    Returns:
+        Tupla (recorte enderezado, caja (x, y, w, h) que ocupa en la foto)
+    """
+    unidad = np.float32([[0, 0], [1, 0], [1, 1], [0, 1]])
+    homografia = cv2.getPerspectiveTransform(unidad, esquinas_qr.astype(np.float32))
+    
+    # Píxeles por lado de QR: media de sus cuatro bordes en la foto
+    lado = float(np.mean(np.linalg.norm(esquinas_qr - np.roll(esquinas_qr, -1, axis=0), axis=1)))
+    rx, ry, rw, rh = caja
+    ancho_recorte = max(1, int(round(rw * lado)))
+    alto_recorte = max(1, int(round(rh * lado)))
+    
+    # Píxel del recorte -> lados de QR -> píxel de la foto
+    a_qr = np.array([[1 / lado, 0, rx], [0, 1 / lado, ry], [0, 0, 1]])
+    recorte = cv2.warpPerspective(imagen, homografia @ a_qr, (ancho_recorte, alto_recorte),
+                                  flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                  borderMode=cv2.BORDER_REPLICATE)
+    
+    esquinas = np.float32([[rx, ry], [rx + rw, ry], [rx + rw, ry + rh], [rx, ry + rh]])
+    en_foto = cv2.perspectiveTransform(esquinas.reshape(-1, 1, 2), homografia).reshape(-1, 2)
+    alto, ancho = imagen.shape[:2]
+    x1, y1 = np.clip(en_foto.min(axis=0), 0, [ancho - 1, alto - 1]).astype(int)
+    x2, y2 = np.clip(en_foto.max(axis=0), 0, [ancho, alto]).astype(int)
+    return recorte, (int(x1), int(y1), int(max(1, x2 - x1)), int(max(1, y2 - y1)))
+
+
+def procesar_con_perfil(fuente: FuenteImagen, perfil: Dict[str, any], idioma: str = 'spa',
+                        nombre_archivo: Optional[str] = None,
+                        motor: Optional[str] = None, **opciones) -> Dict[str, any]:
+    """
+    Lee un caudalímetro de modelo conocido solo en las regiones de su perfil,
+    sin detectar áreas rojas. Las regiones se miden desde el QR del medidor,
+    que tiene que aparecer en la foto; si no se localiza, la foto se procesa
+    con procesar_caudalimetro como la de un medidor sin perfil.
+    
+    Args:
+        fuente: Ruta a la imagen, bytes codificados o array BGR ya decodificado
+        perfil: Perfil del modelo (ver perfiles_medidor) con 'modelo' y 'regiones';
+                cada región tiene 'caja' (x, y, w, h en lados de QR desde su
+                esquina superior izquierda) y, opcionalmente, 'nombre' y
+                'formato' (expresión regular)
+        idioma: Idioma para OCR
+        nombre_archivo: Nombre a mostrar en los resultados (por defecto, el de la ruta)
+        motor: Motor de OCR (por defecto, el del perfil o 'tesseract')
+        **opciones: Parámetros de procesar_caudalimetro si no se localiza el QR
+        
+    Returns:
+        Diccionario con los datos extraídos, con la misma forma que
+        procesar_caudalimetro más 'perfil' y, por región, 'formato_valido'
+        ('perfil' es None si no se localizó el QR)
+    """
+    # Importado aquí: qr_processor importa este módulo
+    from qr_processor import localizar_qr
+    
+    nombre = _nombre_fuente(fuente, nombre_archivo)
+    motor = motor or perfil.get('motor', 'tesseract')
+    
+    imagen = cargar_imagen(fuente)
+    esquinas_qr = localizar_qr(imagen)
+    if esquinas_qr is None:
+        resultados = procesar_caudalimetro(imagen, idioma, nombre_archivo=nombre, motor=motor, **opciones)
+        resultados['perfil'] = None
+        return resultados
+    
+    textos = []
+    for i, region in enumerate(perfil.get('regiones', [])):
+        recorte, caja = _recortar_region_qr(imagen, esquinas_qr, region['caja'])
+        alto_recorte, ancho_recorte = recorte.shape[:2]
+        
+        lectura = leer_area(recorte, (0, 0, ancho_recorte, alto_recorte), idioma, motor=motor)
+        formato = region.get('formato')
+        textos.append({
+            'area': i + 1,
+            'nombre': region.get('nombre', f'region_{i + 1}'),
+            'texto': lectura['texto'],
+            'confianza': lectura['confianza'],
+            'nivel_ocr': lectura['nivel_ocr'],
+            'formato_valido': bool(re.search(formato, lectura['texto'])) if formato else None,
+            'coordenadas_expandidas': caja
+        })
+    
+    textos_leidos = [t for t in textos if t['texto']]
+    texto_completo = ' '.join(t['texto'] for t in textos_leidos)
+    numeros = extraer_numeros(texto_completo)
+    
+    return {
+        'archivo': nombre,
+        'perfil': perfil['modelo'],
+        'texto_rojo': textos_leidos,
+        'texto_completo': texto_completo,
+        'areas_detectadas': len(textos),
+        'areas_omitidas': [],
+        'parcial': False,
+        'numeros_encontrados': numeros,
+        'resumen': {
+            'total_areas': len(textos),
+            'total_textos': len(textos_leidos),
+            'total_numeros': len(numeros)
+        }
+    }
+
+
 def extraer_numeros(texto: str) -> List[Dict[str, any]]:
     """
     Extrae números del texto, incluyendo unidades como m³/h, m³, etc.
@@ -343,55 +1021,103 @@ def extraer_numeros(texto: str) -> List[Dict[str, any]]:
     return valores_unicos
 
 
+def expandir_rutas(rutas: List[str]) -> Iterator[Path]:
+    """
+    Expande la lista de rutas de la línea de comandos: los archivos se devuelven
+    tal cual y las carpetas se recorren en busca de imágenes.
+    """
+    for ruta in rutas:
+        ruta = Path(ruta)
+        if ruta.is_dir():
+            yield from sorted(p for p in ruta.iterdir()
+                              if p.suffix.lower() in EXTENSIONES_IMAGEN and p.is_file())
+        else:
+            yield ruta
+
+
+def imprimir_resultados(resultados: Dict[str, any]):
+    """Imprime los resultados de una imagen de forma legible."""
+    print("\n" + "="*70)
+    print(f"RESULTADOS PARA: {resultados['archivo']}")
+    print("="*70)
+    print(f"\nÁreas rojas detectadas: {resultados['areas_detectadas']}")
+    
+    if resultados['texto_rojo']:
+        print("\n--- TEXTO EN ÁREAS ROJAS ---")
+        for area in resultados['texto_rojo']:
+            print(f"  Área {area['area']}: {area['texto']} "
+                  f"(confianza {area['confianza']}, nivel {area['nivel_ocr']})")
+    
+    if resultados.get('numeros_encontrados'):
+        print("\n--- NÚMEROS Y VALORES ---")
+        for num in resultados['numeros_encontrados']:
+            print(f"  [{num['tipo']}] {num['valor']}")
+    
+    print(f"\n--- TEXTO COMPLETO ---")
+    print(resultados['texto_completo'])
+
+
 def main():
     """Función principal para uso desde línea de comandos."""
     import argparse
+    import sys
     
     parser = argparse.ArgumentParser(
         description='Extrae texto marcado en rojo de imágenes de caudalímetros'
     )
-    parser.add_argument('archivo', help='Ruta a la imagen')
+    parser.add_argument('archivos', nargs='+', help='Rutas a imágenes o carpetas con imágenes')
     parser.add_argument('--idioma', '-l', default='spa', help='Idioma para OCR')
     parser.add_argument('--debug', '-d', action='store_true', 
                        help='Guardar imagen de debug con áreas detectadas')
     parser.add_argument('--json', '-j', action='store_true', 
                        help='Guardar resultados en JSON')
+    parser.add_argument('--lote', action='store_true',
+                       help='Ejecutar un solo OCR para todas las áreas rojas de la imagen')
+    parser.add_argument('--jsonl', nargs='?', const='-', metavar='RUTA',
+                       help='Escribir un registro JSON compacto por imagen a medida que termina '
+                            '(en RUTA o en stdout si se omite)')
+    parser.add_argument('--motor', choices=MOTORES_OCR, default='tesseract',
+                       help="Motor de OCR ('lcd' prueba antes el lector de siete segmentos)")
     
     args = parser.parse_args()
     
+    salida = None
+    if args.jsonl:
+        salida = sys.stdout if args.jsonl == '-' else open(args.jsonl, 'a', encoding='utf-8')
+    
     try:
-        resultados = procesar_caudalimetro(args.archivo, args.idioma, args.debug)
-        
-        print("\n" + "="*70)
-        print(f"RESULTADOS PARA: {resultados['archivo']}")
-        print("="*70)
-        print(f"\nÁreas rojas detectadas: {resultados['areas_detectadas']}")
-        
-        if resultados['texto_rojo']:
-            print("\n--- TEXTO EN ÁREAS ROJAS ---")
-            for area in resultados['texto_rojo']:
-                print(f"  Área {area['area']}: {area['texto']}")
-        
-        if resultados['numeros_encontrados']:
-            print("\n--- NÚMEROS Y VALORES ---")
-            for num in resultados['numeros_encontrados']:
-                print(f"  [{num['tipo']}] {num['valor']}")
-        
-        print(f"\n--- TEXTO COMPLETO ---")
-        print(resultados['texto_completo'])
-        
-        if args.json:
-            json_path = Path(args.archivo).parent / f"{Path(args.archivo).stem}_resultado.json"
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(resultados, f, ensure_ascii=False, indent=2)
-            print(f"\n✓ Resultados guardados en: {json_path}")
-        
-    except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
+        for ruta in expandir_rutas(args.archivos):
+            try:
+                resultados = procesar_caudalimetro(str(ruta), args.idioma, args.debug,
+                                                   modo_lote=args.lote, motor=args.motor)
+            except Exception as e:
+                if salida is None:
+                    print(f"Error: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    continue
+                resultados = {'archivo': ruta.name, 'error': str(e)}
+            
+            if salida is not None:
+                # Un registro compacto por imagen, volcado en cuanto termina
+                salida.write(json.dumps(resultados, ensure_ascii=False, separators=(',', ':')) + '\n')
+                salida.flush()
+                continue
+            
+            imprimir_resultados(resultados)
+            
+            if args.json:
+                json_path = ruta.parent / f"{ruta.stem}_resultado.json"
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(resultados, f, ensure_ascii=False, indent=2)
+                print(f"\n✓ Resultados guardados en: {json_path}")
+    
+    except KeyboardInterrupt:
+        print("\n\nProceso cancelado por el usuario", file=sys.stderr)
+    finally:
+        if salida is not None and salida is not sys.stdout:
+            salida.close()
 
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lector de Displays de Siete Segmentos
+Reconoce los dígitos de displays LCD/LED de siete segmentos con OpenCV y NumPy,
+sin Tesseract ni subprocesos: segmenta cada dígito y lo clasifica según qué
+segmentos están encendidos. Si no está seguro devuelve None para que el
+llamador recurra a Tesseract.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import cv2
+    import numpy as np
+except ImportError as e:
+    print(f"Error: Faltan dependencias. Instala con: pip install -r requirements.txt")
+    print(f"Error específico: {e}")
+    exit(1)
+
+
+# Segmentos encendidos (arriba, arriba-izq, arriba-der, centro, abajo-izq, abajo-der, abajo)
+DIGITOS_SEGMENTOS = {
+    (1, 1, 1, 0, 1, 1, 1): '0',
+    (0, 0, 1, 0, 0, 1, 0): '1',
+    (1, 0, 1, 1, 1, 0, 1): '2',
+    (1, 0, 1, 1, 0, 1, 1): '3',
+    (0, 1, 1, 1, 0, 1, 0): '4',
+    (1, 1, 0, 1, 0, 1, 1): '5',
+    (1, 1, 0, 1, 1, 1, 1): '6',
+    (0, 1, 0, 1, 1, 1, 1): '6',  # Sin segmento superior
+    (1, 0, 1, 0, 0, 1, 0): '7',
+    (1, 1, 1, 0, 0, 1, 0): '7',  # Con segmento arriba-izquierda
+    (1, 1, 1, 1, 1, 1, 1): '8',
+    (1, 1, 1, 1, 0, 1, 1): '9',
+    (1, 1, 1, 1, 0, 1, 0): '9',  # Sin segmento inferior
+}
+
+# Ocupación de un segmento (fracción de píxeles encendidos) a partir de la que está encendido
+OCUPACION_SEGMENTO = 0.5
+
+# Margen mínimo respecto a OCUPACION_SEGMENTO; por debajo el segmento es dudoso
+MARGEN_DUDOSO = 0.1
+
+# Relación ancho/alto por debajo de la cual un dígito es un '1' (solo segmentos derechos)
+RELACION_UNO = 0.4
+
+# Confianza (0-100) por debajo de la cual la lectura se descarta
+CONFIANZA_MINIMA_LCD = 50
+
+# Fracción del ancho del recorte a partir de la que un trazo horizontal
+# continuo es el subrayado rojo (ningún segmento de un dígito es tan ancho)
+FRACCION_SUBRAYADO = 0.6
+
+# Fracción del ancho que deben tener las filas vecinas (bordes difuminados)
+# para seguir considerándose parte del subrayado
+FRACCION_BORDE_SUBRAYADO = 0.3
+
+
+def binarizar(gris: np.ndarray) -> np.ndarray:
+    """
+    Binariza un recorte en escala de grises con Otsu dejando los dígitos a 1.
+    Los segmentos son la clase minoritaria, sean oscuros sobre claro o al revés.
+
+    Args:
+        gris: Recorte en escala de grises (uint8)
+
+    Returns:
+        Array uint8 con 1 en los píxeles de los dígitos y 0 en el fondo
+    """
+    _, binaria = cv2.threshold(gris, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    if binaria.mean() > 0.5:
+        binaria = 1 - binaria
+    return binaria
+
+
+def _tramo_mas_largo(fila: np.ndarray) -> int:
+    """Longitud del tramo continuo de píxeles a 1 más largo de una fila."""
+    if not fila.any():
+        return 0
+    bordes = np.flatnonzero(np.diff(np.concatenate(([0], fila.astype(np.int8), [0]))))
+    return int((bordes[1::2] - bordes[::2]).max())
+
+
+def quitar_subrayado(binaria: np.ndarray) -> np.ndarray:
+    """
+    Borra el subrayado rojo que marca la lectura. El recorte expandido lo
+    incluye en su parte inferior y, en grises, queda tan oscuro como los
+    dígitos: sin quitarlo, la dilatación lo une a los segmentos inferiores y
+    todo el número se convierte en una sola componente.
+
+    Se buscan en la mitad inferior las filas con un trazo continuo de al menos
+    FRACCION_SUBRAYADO del ancho y se extienden a las filas vecinas con trazos
+    de al menos FRACCION_BORDE_SUBRAYADO.
+
+    Args:
+        binaria: Imagen binarizada (1 = dígito)
+
+    Returns:
+        Copia de la imagen sin las filas del subrayado (o la misma si no hay)
+    """
+    alto, ancho = binaria.shape
+    tramos = [_tramo_mas_largo(fila) for fila in binaria]
+    filas = [i for i in range(alto // 2, alto) if tramos[i] >= ancho * FRACCION_SUBRAYADO]
+    if not filas:
+        return binaria
+
+    sin_subrayado = binaria.copy()
+    borrar = set(filas)
+    for i in filas:
+        for paso in (-1, 1):
+            j = i + paso
+            while 0 <= j < alto and j not in borrar and tramos[j] >= ancho * FRACCION_BORDE_SUBRAYADO:
+                borrar.add(j)
+                j += paso
+    sin_subrayado[sorted(borrar), :] = 0
+    return sin_subrayado
+
+
+def _margen(ocupacion: float) -> float:
+    """Distancia (0-1) de una ocupación al umbral de encendido."""
+    return abs(ocupacion - OCUPACION_SEGMENTO) / OCUPACION_SEGMENTO
+
+
+def clasificar_digito(binaria: np.ndarray,
+                      caja: Tuple[int, int, int, int]) -> Optional[Tuple[str, float]]:
+    """
+    Clasifica un dígito por la ocupación de sus siete segmentos.
+
+    Args:
+        binaria: Imagen binarizada (1 = dígito)
+        caja: Tupla (x, y, w, h) del dígito
+
+    Returns:
+        Tupla (dígito, confianza 0-1) o None si el patrón no es un dígito o
+        algún segmento es dudoso
+    """
+    x, y, w, h = caja
+    digito = binaria[y:y + h, x:x + w]
+
+    # Un '1' solo tiene los segmentos de la derecha: es mucho más alto que ancho
+    if w < h * RELACION_UNO:
+        ocupacion = float(digito.mean())
+        if ocupacion < OCUPACION_SEGMENTO:
+            return None
+        return '1', _margen(ocupacion)
+
+    d_ancho = max(1, int(w * 0.25))
+    d_alto = max(1, int(h * 0.15))
+    d_centro = max(1, int(h * 0.05))
+    mitad = h // 2
+
+    regiones = (
+        (0, 0, w, d_alto),                                # arriba
+        (0, 0, d_ancho, mitad),                           # arriba-izquierda
+        (w - d_ancho, 0, w, mitad),                       # arriba-derecha
+        (0, mitad - d_centro, w, mitad + d_centro),       # centro
+        (0, mitad, d_ancho, h),                           # abajo-izquierda
+        (w - d_ancho, mitad, w, h),                       # abajo-derecha
+        (0, h - d_alto, w, h),                            # abajo
+    )
+
+    encendidos = []
+    margenes = []
+    for x1, y1, x2, y2 in regiones:
+        ocupacion = float(digito[y1:y2, x1:x2].mean())
+        margen = _margen(ocupacion)
+        if margen < MARGEN_DUDOSO:
+            return None
+        encendidos.append(int(ocupacion >= OCUPACION_SEGMENTO))
+        margenes.append(margen)
+
+    valor = DIGITOS_SEGMENTOS.get(tuple(encendidos))
+    if valor is None:
+        return None
+    return valor, min(1.0, sum(margenes) / len(margenes))
+
+
+def _cajas(binaria: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Cajas (x, y, w, h) de los dígitos y signos, de izquierda a derecha.
+    Los segmentos de un mismo dígito están separados por huecos finos, así que
+    se unen con una dilatación antes de buscar componentes conexas.
+    """
+    k = max(1, int(round(binaria.shape[0] * 0.06)))
+    unida = cv2.dilate(binaria, np.ones((k, k), np.uint8))
+    n, _, stats, _ = cv2.connectedComponentsWithStats(unida, connectivity=8)
+
+    cajas = []
+    for x, y, w, h, _ in stats[1:]:
+        # Deshacer el crecimiento de la dilatación
+        x0, y0 = x + k // 2, y + k // 2
+        w0, h0 = max(1, w - k + 1), max(1, h - k + 1)
+        cajas.append((int(x0), int(y0), int(w0), int(h0)))
+    cajas.sort()
+    return cajas
+
+
+def leer_siete_segmentos(gris: np.ndarray) -> Optional[Dict[str, any]]:
+    """
+    Lee la cifra de un display de siete segmentos.
+
+    El subrayado rojo se borra antes de segmentar (quitar_subrayado). Los
+    dígitos son las componentes de altura parecida a la mayor; las manchas
+    pequeñas a la altura de la base se leen como punto decimal y las bajas y
+    anchas a media altura como signo menos. El resto (unidades, ruido) se ignora.
+
+    Args:
+        gris: Recorte en escala de grises (uint8) con la lectura
+
+    Returns:
+        Diccionario con 'texto', 'confianza' (0-100) y 'nivel_ocr' ('lcd'),
+        o None si no hay dígitos o la lectura no es fiable
+    """
+    if gris.ndim != 2 or min(gris.shape) < 8:
+        return None
+
+    binaria = quitar_subrayado(binarizar(gris))
+    cajas = _cajas(binaria)
+    if not cajas:
+        return None
+
+    alto_max = max(h for _, _, _, h in cajas)
+    alturas = [h for _, _, _, h in cajas if h >= alto_max * 0.5]
+    alto_digito = float(np.median(alturas))
+    digitos = [c for c in cajas if c[3] >= alto_digito * 0.75]
+    if not digitos:
+        return None
+
+    base = float(np.median([y + h for _, y, _, h in digitos]))
+    centro = float(np.median([y + h / 2 for _, y, _, h in digitos]))
+    inicio = digitos[0][0]
+    fin = digitos[-1][0] + digitos[-1][2]
+
+    caracteres = []
+    confianzas = []
+    for caja in cajas:
+        x, y, w, h = caja
+        if caja in digitos:
+            clasificado = clasificar_digito(binaria, caja)
+            if clasificado is None:
+                return None
+            valor, confianza = clasificado
+            caracteres.append(valor)
+            confianzas.append(confianza)
+        elif w <= alto_digito * 0.25 and h <= alto_digito * 0.25 and \
+                abs(y + h - base) <= alto_digito * 0.15 and inicio < x < fin:
+            caracteres.append('.')
+        elif h <= alto_digito * 0.25 and w >= alto_digito * 0.3 and \
+                abs(y + h / 2 - centro) <= alto_digito * 0.15 and x < inicio:
+            caracteres.append('-')
+
+    confianza = round(100 * min(confianzas), 1)
+    if confianza < CONFIANZA_MINIMA_LCD:
+        return None
+
+    return {
+        'texto': ''.join(caracteres),
+        'confianza': confianza,
+        'nivel_ocr': 'lcd'
+    }
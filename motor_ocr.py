@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool de Motores Tesseract
+Mantiene motores OCR de larga duración (tesserocr, en el mismo proceso) para no
+lanzar un subproceso `tesseract` ni recargar el traineddata en cada área.
+Si tesserocr no está instalado se usa pytesseract como respaldo.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    from PIL import Image
+    import pytesseract
+except ImportError as e:
+    print(f"Error: Faltan dependencias. Instala con: pip install -r requirements.txt")
+    print(f"Error específico: {e}")
+    exit(1)
+
+# tesserocr es opcional: enlaza directamente con la API C de Tesseract
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+
+# Número máximo de motores por idioma en cada proceso. El OCR corre en los
+# procesos de la cola (uno cada vez), así que basta uno; súbelo solo si el OCR
+# corre en varios threads de un mismo proceso (OCR_PROCESOS=0)
+TAMANO_POOL = int(os.getenv('OCR_POOL_SIZE', '1'))
+
+
+class PoolTesseract:
+    """
+    Pool de motores tesserocr reutilizables, seguro entre threads.
+
+    Cada motor se inicializa una sola vez (carga del modelo de idioma) y se
+    presta a un único thread a la vez. Los motores se crean bajo demanda hasta
+    `tamano` por idioma; si todos están ocupados, el thread espera a que se
+    libere uno.
+    """
+
+    def __init__(self, tamano: int = TAMANO_POOL, ruta_tessdata: Optional[str] = None):
+        self.tamano = max(1, tamano)
+        self.ruta_tessdata = ruta_tessdata or os.getenv('TESSDATA_PREFIX')
+        self._libres: Dict[str, queue.LifoQueue] = {}
+        self._creados: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _crear_motor(self, idioma: str):
+        """Crea e inicializa un motor tesserocr para el idioma indicado."""
+        if self.ruta_tessdata:
+            return tesserocr.PyTessBaseAPI(path=self.ruta_tessdata, lang=idioma)
+        return tesserocr.PyTessBaseAPI(lang=idioma)
+
+    @contextmanager
+    def motor(self, idioma: str = 'spa'):
+        """
+        Presta un motor inicializado para `idioma` y lo devuelve al pool al salir.
+        """
+        with self._lock:
+            libres = self._libres.setdefault(idioma, queue.LifoQueue())
+            crear = libres.empty() and self._creados.get(idioma, 0) < self.tamano
+            if crear:
+                self._creados[idioma] = self._creados.get(idioma, 0) + 1
+
+        if crear:
+            try:
+                api = self._crear_motor(idioma)
+            except Exception:
+                with self._lock:
+                    self._creados[idioma] -= 1
+                raise
+        else:
+            api = libres.get()
+
+        try:
+            yield api
+        finally:
+            # Limpiar imagen y resultados antes de devolver el motor
+            api.Clear()
+            libres.put(api)
+
+    def cerrar(self):
+        """Libera todos los motores que no estén en uso."""
+        with self._lock:
+            for idioma, libres in self._libres.items():
+                while not libres.empty():
+                    libres.get_nowait().End()
+                    self._creados[idioma] -= 1
+
+
+_pool: Optional[PoolTesseract] = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool() -> Optional[PoolTesseract]:
+    """
+    Devuelve el pool del proceso actual (se crea una vez por worker).
+    Devuelve None si tesserocr no está disponible.
+    """
+    global _pool
+    if tesserocr is None:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolTesseract()
+    return _pool
+
+
+def reconocer_palabras(imagen: Image.Image, idioma: str = 'spa', psm: int = 6,
+                       lista_blanca: Optional[str] = None) -> List[Dict[str, any]]:
+    """
+    Ejecuta OCR sobre una imagen y devuelve las palabras con su caja y confianza.
+
+    Args:
+        imagen: Imagen PIL (preferiblemente en escala de grises)
+        idioma: Idioma para OCR
+        psm: Modo de segmentación de página de Tesseract
+        lista_blanca: Caracteres permitidos (None = todos)
+
+    Returns:
+        Lista de diccionarios con 'texto', 'confianza' (0-100) y 'caja' (x, y, w, h)
+    """
+    palabras = []
+    pool = obtener_pool()
+
+    if pool is None:
+        config = f'--psm {psm}'
+        if lista_blanca:
+            config += f' -c tessedit_char_whitelist={lista_blanca}'
+        datos = pytesseract.image_to_data(imagen, lang=idioma, config=config,
+                                          output_type=pytesseract.Output.DICT)
+        for i, texto in enumerate(datos['text']):
+            texto = texto.strip()
+            if not texto:
+                continue
+            palabras.append({
+                'texto': texto,
+                'confianza': float(datos['conf'][i]),
+                'caja': (datos['left'][i], datos['top'][i],
+                         datos['width'][i], datos['height'][i])
+            })
+        return palabras
+
+    nivel = tesserocr.RIL.WORD
+    with pool.motor(idioma) as api:
+        api.SetPageSegMode(psm)
+        api.SetVariable('tessedit_char_whitelist', lista_blanca or '')
+        api.SetImage(imagen)
+        api.Recognize()
+        iterador = api.GetIterator()
+        if iterador is None:
+            return palabras
+        for resultado in tesserocr.iterate_level(iterador, nivel):
+            texto = (resultado.GetUTF8Text(nivel) or '').strip()
+            if not texto:
+                continue
+            x1, y1, x2, y2 = resultado.BoundingBox(nivel)
+            palabras.append({
+                'texto': texto,
+                'confianza': float(resultado.Confidence(nivel)),
+                'caja': (x1, y1, x2 - x1, y2 - y1)
+            })
+    return palabras
@@ -0,0 +1,1074 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Interfaz Web Móvil
+Página, estilos y JavaScript de la interfaz. Se preparan una sola vez al
+arrancar: los estilos y el JavaScript se sirven en URLs con el hash de su
+contenido (cacheables indefinidamente) y todo queda ya comprimido con gzip
+y, si está instalado, brotli.
+"""
+
+import gzip
+import hashlib
+from typing import Dict
+
+# brotli es opcional: sin él se sirve gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+PAGINA_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
+    <title>Extractor Caudalímetros</title>
+    <link rel="stylesheet" href="__CSS__">
+</head>
+<body>
+    <div class="container">
+        <h1>📊 Extractor Caudalímetros</h1>
+        <p class="subtitle">Captura y extrae datos de medidores</p>
+        
+        <div class="camera-container">
+            <video id="video" autoplay playsinline></video>
+            <canvas id="canvas"></canvas>
+            <div class="preview-wrapper" id="previewWrapper">
+                <img id="preview" class="preview-image" alt="Vista previa">
+                <canvas id="selectionCanvas"></canvas>
+            </div>
+        </div>
+        
+        <div class="selection-info" id="selectionInfo">
+            Selecciona un área arrastrando sobre la imagen
+        </div>
+        
+        <div class="button-group">
+            <button id="startCamera" class="btn-primary">📷 Activar Cámara</button>
+            <button id="capture" class="btn-success" style="display: none;">📸 Capturar</button>
+            <button id="retake" class="btn-secondary" style="display: none;">🔄 Volver a Capturar</button>
+            <button id="selectArea" class="btn-primary" style="display: none;">🎯 Seleccionar Área</button>
+            <button id="process" class="btn-primary" style="display: none;">⚙️ Procesar Imagen Completa</button>
+            <button id="processArea" class="btn-success" style="display: none;">✅ Procesar Área Seleccionada</button>
+            
+            <div class="file-input-wrapper">
+                <label for="fileInput" class="file-input-label">📁 Seleccionar desde Galería</label>
+                <input type="file" id="fileInput" accept="image/*" capture="environment">
+            </div>
+        </div>
+        
+        <div class="loading" id="loading">
+            <div class="spinner"></div>
+            <p>Procesando imagen...</p>
+        </div>
+        
+        <div class="error" id="error"></div>
+        
+        <div class="results" id="results">
+            <h2>📋 Resultados</h2>
+            <div id="resultsContent"></div>
+        </div>
+    </div>
+    
+    <script src="__JS__"></script>
+</body>
+</html>
+"""
+
+PAGINA_CSS = """* {
+    margin: 0;
+    padding: 0;
+    box-sizing: border-box;
+}
+
+body {
+    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    min-height: 100vh;
+    padding: 20px;
+    display: flex;
+    flex-direction: column;
+    align-items: center;
+    justify-content: center;
+}
+
+.container {
+    background: white;
+    border-radius: 20px;
+    padding: 30px;
+    max-width: 500px;
+    width: 100%;
+    box-shadow: 0 20px 60px rgba(0,0,0,0.3);
+}
+
+h1 {
+    color: #333;
+    text-align: center;
+    margin-bottom: 10px;
+    font-size: 24px;
+}
+
+.subtitle {
+    text-align: center;
+    color: #666;
+    margin-bottom: 30px;
+    font-size: 14px;
+}
+
+.camera-container {
+    position: relative;
+    margin-bottom: 20px;
+}
+
+#video {
+    width: 100%;
+    border-radius: 10px;
+    background: #000;
+    display: none;
+}
+
+#canvas {
+    display: none;
+}
+
+.preview-image {
+    width: 100%;
+    border-radius: 10px;
+    margin-bottom: 20px;
+    display: block;
+}
+
+.preview-wrapper {
+    position: relative;
+    display: none;
+    margin-bottom: 20px;
+    width: 100%;
+}
+
+#selectionCanvas {
+    position: absolute;
+    top: 0;
+    left: 0;
+    width: 100%;
+    height: 100%;
+    border-radius: 10px;
+    cursor: crosshair;
+    display: none;
+}
+
+.selection-info {
+    background: rgba(102, 126, 234, 0.9);
+    color: white;
+    padding: 10px;
+    border-radius: 5px;
+    margin-bottom: 10px;
+    display: none;
+    font-size: 14px;
+}
+
+.button-group {
+    display: flex;
+    flex-direction: column;
+    gap: 10px;
+}
+
+button {
+    padding: 15px 25px;
+    border: none;
+    border-radius: 10px;
+    font-size: 16px;
+    font-weight: 600;
+    cursor: pointer;
+    transition: all 0.3s;
+    color: white;
+}
+
+.btn-primary {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+}
+
+.btn-primary:hover {
+    transform: translateY(-2px);
+    box-shadow: 0 5px 15px rgba(102, 126, 234, 0.4);
+}
+
+.btn-secondary {
+    background: #6c757d;
+}
+
+.btn-success {
+    background: #28a745;
+}
+
+.btn-danger {
+    background: #dc3545;
+}
+
+button:disabled {
+    opacity: 0.6;
+    cursor: not-allowed;
+}
+
+.results {
+    margin-top: 20px;
+    padding: 20px;
+    background: #f8f9fa;
+    border-radius: 10px;
+    display: none;
+}
+
+.results h2 {
+    color: #333;
+    margin-bottom: 15px;
+    font-size: 20px;
+}
+
+.result-item {
+    background: white;
+    padding: 15px;
+    margin-bottom: 10px;
+    border-radius: 8px;
+    border-left: 4px solid #667eea;
+}
+
+.result-item strong {
+    color: #667eea;
+    display: block;
+    margin-bottom: 5px;
+}
+
+.result-value {
+    font-size: 18px;
+    color: #333;
+    font-weight: 600;
+}
+
+.loading {
+    text-align: center;
+    padding: 20px;
+    display: none;
+}
+
+.spinner {
+    border: 4px solid #f3f3f3;
+    border-top: 4px solid #667eea;
+    border-radius: 50%;
+    width: 40px;
+    height: 40px;
+    animation: spin 1s linear infinite;
+    margin: 0 auto 10px;
+}
+
+@keyframes spin {
+    0% { transform: rotate(0deg); }
+    100% { transform: rotate(360deg); }
+}
+
+.error {
+    background: #f8d7da;
+    color: #721c24;
+    padding: 15px;
+    border-radius: 8px;
+    margin-top: 10px;
+    display: none;
+}
+
+.file-input-wrapper {
+    position: relative;
+    overflow: hidden;
+    display: inline-block;
+    width: 100%;
+}
+
+.file-input-wrapper input[type=file] {
+    position: absolute;
+    left: -9999px;
+}
+
+.file-input-label {
+    display: block;
+    padding: 15px 25px;
+    background: #6c757d;
+    color: white;
+    border-radius: 10px;
+    text-align: center;
+    cursor: pointer;
+    transition: all 0.3s;
+}
+
+.file-input-label:hover {
+    background: #5a6268;
+}
+"""
+
+PAGINA_JS = """const video = document.getElementById('video');
+const canvas = document.getElementById('canvas');
+const preview = document.getElementById('preview');
+const previewWrapper = document.getElementById('previewWrapper');
+const selectionCanvas = document.getElementById('selectionCanvas');
+const selectionInfo = document.getElementById('selectionInfo');
+const startBtn = document.getElementById('startCamera');
+const captureBtn = document.getElementById('capture');
+const retakeBtn = document.getElementById('retake');
+const selectAreaBtn = document.getElementById('selectArea');
+const processBtn = document.getElementById('process');
+const processAreaBtn = document.getElementById('processArea');
+const fileInput = document.getElementById('fileInput');
+const loading = document.getElementById('loading');
+const error = document.getElementById('error');
+const results = document.getElementById('results');
+const resultsContent = document.getElementById('resultsContent');
+
+let stream = null;
+let currentImageData = null;
+let isSelecting = false;
+let selectionStart = { x: 0, y: 0 };
+let selectionEnd = { x: 0, y: 0 };
+let selectedArea = null;
+
+// Activar cámara
+startBtn.addEventListener('click', async () => {
+    try {
+        stream = await navigator.mediaDevices.getUserMedia({
+            video: { 
+                facingMode: 'environment', // Cámara trasera
+                width: { ideal: 1920 },
+                height: { ideal: 1080 }
+            }
+        });
+        video.srcObject = stream;
+        video.style.display = 'block';
+        startBtn.style.display = 'none';
+        captureBtn.style.display = 'block';
+        hideError();
+    } catch (err) {
+        showError('Error al acceder a la cámara: ' + err.message);
+    }
+});
+
+// Capturar foto
+captureBtn.addEventListener('click', () => {
+    canvas.width = video.videoWidth;
+    canvas.height = video.videoHeight;
+    const ctx = canvas.getContext('2d');
+    ctx.drawImage(video, 0, 0);
+
+    canvas.toBlob((blob) => {
+        const reader = new FileReader();
+        reader.onload = (e) => {
+            currentImageData = e.target.result;
+            preview.src = currentImageData;
+            // Asegurar que la imagen se muestre
+            previewWrapper.style.display = 'block';
+            preview.style.display = 'block';
+
+            preview.onload = () => {
+                setupPreview();
+                // Asegurar visibilidad después de cargar
+                previewWrapper.style.display = 'block';
+                preview.style.display = 'block';
+            };
+
+            video.style.display = 'none';
+            captureBtn.style.display = 'none';
+            retakeBtn.style.display = 'block';
+            processBtn.style.display = 'block';
+            selectAreaBtn.style.display = 'block';
+
+            // Detener cámara
+            if (stream) {
+                stream.getTracks().forEach(track => track.stop());
+                stream = null;
+            }
+        };
+        reader.readAsDataURL(blob);
+    }, 'image/jpeg', 0.9);
+});
+
+// Volver a capturar
+retakeBtn.addEventListener('click', () => {
+    previewWrapper.style.display = 'none';
+    selectionCanvas.style.display = 'none';
+    selectionInfo.style.display = 'none';
+    currentImageData = null;
+    selectedArea = null;
+    retakeBtn.style.display = 'none';
+    processBtn.style.display = 'none';
+    selectAreaBtn.style.display = 'none';
+    processAreaBtn.style.display = 'none';
+    results.style.display = 'none';
+    startBtn.style.display = 'block';
+    hideError();
+});
+
+// Configurar preview y canvas de selección
+function setupPreview() {
+    // Esperar a que la imagen se cargue completamente
+    if (preview.complete) {
+        const rect = preview.getBoundingClientRect();
+        selectionCanvas.width = preview.offsetWidth;
+        selectionCanvas.height = preview.offsetHeight;
+    } else {
+        preview.onload = () => {
+            const rect = preview.getBoundingClientRect();
+            selectionCanvas.width = preview.offsetWidth;
+            selectionCanvas.height = preview.offsetHeight;
+        };
+    }
+}
+
+// Activar modo de selección
+selectAreaBtn.addEventListener('click', () => {
+    isSelecting = true;
+    selectedArea = null;
+    // Asegurar que la imagen esté visible
+    previewWrapper.style.display = 'block';
+    preview.style.display = 'block';
+    // Mostrar canvas de selección sobre la imagen
+    selectionCanvas.style.display = 'block';
+    selectionInfo.style.display = 'block';
+    selectionCanvas.style.cursor = 'crosshair';
+    processAreaBtn.style.display = 'none';
+    // Ocultar botón de procesar imagen completa mientras se selecciona
+    processBtn.style.display = 'none';
+});
+
+// Manejar selección de área
+function getEventPos(e) {
+    const rect = selectionCanvas.getBoundingClientRect();
+    const scaleX = preview.naturalWidth / preview.offsetWidth;
+    const scaleY = preview.naturalHeight / preview.offsetHeight;
+    return {
+        x: (e.clientX - rect.left) * scaleX,
+        y: (e.clientY - rect.top) * scaleY
+    };
+}
+
+selectionCanvas.addEventListener('mousedown', (e) => {
+    if (!isSelecting) return;
+    const pos = getEventPos(e);
+    selectionStart = pos;
+    selectionEnd = pos;
+});
+
+selectionCanvas.addEventListener('mousemove', (e) => {
+    if (!isSelecting) return;
+    if (e.buttons === 1) {
+        selectionEnd = getEventPos(e);
+        drawSelection();
+    }
+});
+
+selectionCanvas.addEventListener('mouseup', (e) => {
+    if (!isSelecting) return;
+    selectionEnd = getEventPos(e);
+    drawSelection();
+    finalizeSelection();
+});
+
+// Touch events para móviles
+selectionCanvas.addEventListener('touchstart', (e) => {
+    if (!isSelecting) return;
+    e.preventDefault();
+    const touch = e.touches[0];
+    const pos = getEventPos(touch);
+    selectionStart = pos;
+    selectionEnd = pos;
+});
+
+selectionCanvas.addEventListener('touchmove', (e) => {
+    if (!isSelecting) return;
+    e.preventDefault();
+    const touch = e.touches[0];
+    selectionEnd = getEventPos(touch);
+    drawSelection();
+});
+
+selectionCanvas.addEventListener('touchend', (e) => {
+    if (!isSelecting) return;
+    e.preventDefault();
+    finalizeSelection();
+});
+
+function drawSelection() {
+    const ctx = selectionCanvas.getContext('2d');
+    ctx.clearRect(0, 0, selectionCanvas.width, selectionCanvas.height);
+
+    const x = Math.min(selectionStart.x / (preview.naturalWidth / preview.offsetWidth), 
+                     selectionEnd.x / (preview.naturalWidth / preview.offsetWidth));
+    const y = Math.min(selectionStart.y / (preview.naturalHeight / preview.offsetHeight),
+                     selectionEnd.y / (preview.naturalHeight / preview.offsetHeight));
+    const w = Math.abs(selectionEnd.x - selectionStart.x) / (preview.naturalWidth / preview.offsetWidth);
+    const h = Math.abs(selectionEnd.y - selectionStart.y) / (preview.naturalHeight / preview.offsetHeight);
+
+    // Dibujar rectángulo de selección
+    ctx.strokeStyle = '#667eea';
+    ctx.lineWidth = 2;
+    ctx.setLineDash([5, 5]);
+    ctx.strokeRect(x, y, w, h);
+
+    // Relleno semitransparente
+    ctx.fillStyle = 'rgba(102, 126, 234, 0.2)';
+    ctx.fillRect(x, y, w, h);
+}
+
+function finalizeSelection() {
+    const x = Math.min(selectionStart.x, selectionEnd.x);
+    const y = Math.min(selectionStart.y, selectionEnd.y);
+    const ancho = Math.abs(selectionEnd.x - selectionStart.x);
+    const alto = Math.abs(selectionEnd.y - selectionStart.y);
+
+    if (ancho > 10 && alto > 10) {
+        selectedArea = { x, y, ancho, alto };
+        processAreaBtn.style.display = 'block';
+        selectionInfo.textContent = `✅ Área seleccionada: ${Math.round(ancho)}x${Math.round(alto)}px - Haz clic en "Procesar Área Seleccionada"`;
+        // Mostrar la imagen y el área seleccionada
+        previewWrapper.style.display = 'block';
+        preview.style.display = 'block';
+    }
+}
+
+// Imagen ya subida al servidor para procesar áreas (id y foto de origen)
+let imagenSubida = null;
+
+async function obtenerIdImagen(resubir) {
+    if (!resubir && imagenSubida && imagenSubida.datos === currentImageData) {
+        return imagenSubida.id;
+    }
+    const blob = await (await fetch(currentImageData)).blob();
+    const formData = new FormData();
+    formData.append('image', blob, 'caudalimetro.jpg');
+
+    const response = await fetch('/images', {
+        method: 'POST',
+        body: formData
+    });
+    const data = await response.json();
+    if (data.error) {
+        throw new Error(data.error);
+    }
+    imagenSubida = { datos: currentImageData, id: data.imagen_id };
+    return data.imagen_id;
+}
+
+// Procesar área seleccionada
+processAreaBtn.addEventListener('click', async () => {
+    if (!selectedArea || !currentImageData) {
+        showError('Por favor, selecciona un área primero');
+        return;
+    }
+
+    // Asegurar que la imagen esté visible
+    previewWrapper.style.display = 'block';
+    preview.style.display = 'block';
+
+    loading.style.display = 'block';
+    results.style.display = 'none';
+    hideError();
+    processAreaBtn.disabled = true;
+
+    try {
+        // La foto se sube una sola vez; cada área solo envía su id y coordenadas
+        async function enviarArea(resubir) {
+            const formData = new FormData();
+            formData.append('imagen_id', await obtenerIdImagen(resubir));
+            formData.append('x', Math.round(selectedArea.x));
+            formData.append('y', Math.round(selectedArea.y));
+            formData.append('ancho', Math.round(selectedArea.ancho));
+            formData.append('alto', Math.round(selectedArea.alto));
+
+            return fetch('/process-area', {
+                method: 'POST',
+                body: formData
+            });
+        }
+
+        let response = await enviarArea(false);
+        if (response.status === 404) {
+            // La imagen caducó en el servidor: subirla de nuevo
+            response = await enviarArea(true);
+        }
+
+        const data = await response.json();
+
+        if (data.error) {
+            showError(data.error);
+        } else {
+            // Mantener la imagen visible y mostrar resultados
+            previewWrapper.style.display = 'block';
+            preview.style.display = 'block';
+            displayAreaResults(data);
+        }
+    } catch (err) {
+        showError('Error al procesar área: ' + err.message);
+    } finally {
+        loading.style.display = 'none';
+        processAreaBtn.disabled = false;
+    }
+});
+
+let valorMedidorExtraido = null;
+
+function displayAreaResults(data) {
+    resultsContent.innerHTML = '';
+
+    if (data.texto_una_linea || data.texto_extraido) {
+        const texto = data.texto_una_linea || data.texto_extraido;
+        valorMedidorExtraido = texto;
+        const div = document.createElement('div');
+        div.className = 'result-item';
+        div.innerHTML = `
+            <strong>Texto Extraído (Izquierda a Derecha):</strong>
+            <div class="result-value" style="font-size: 20px; font-weight: bold; color: #667eea;">${texto}</div>
+        `;
+        resultsContent.appendChild(div);
+    }
+
+    if (data.numeros_encontrados && data.numeros_encontrados.length > 0) {
+        const div = document.createElement('div');
+        div.className = 'result-item';
+        div.innerHTML = `
+            <strong>Números Detectados:</strong>
+            <div class="result-value">${data.numeros_encontrados.map(n => n.valor).join(', ')}</div>
+        `;
+        resultsContent.appendChild(div);
+    }
+
+    // Agregar botón para escanear QR y rellenar formulario
+    if (valorMedidorExtraido) {
+        const qrDiv = document.createElement('div');
+        qrDiv.className = 'result-item';
+        qrDiv.style.background = '#e7f3ff';
+        qrDiv.style.borderLeft = '4px solid #2196F3';
+        qrDiv.innerHTML = `
+            <strong>📋 Siguiente Paso: Rellenar Formulario</strong>
+            <p style="margin: 10px 0; color: #666;">Escanea el código QR del formulario de Google para rellenarlo automáticamente</p>
+            <button id="scanQRBtn" class="btn-primary" style="width: 100%; margin-top: 10px;">
+                📷 Escanear QR del Formulario
+            </button>
+        `;
+        resultsContent.appendChild(qrDiv);
+    }
+
+    results.style.display = 'block';
+}
+
+// Procesar imagen
+processBtn.addEventListener('click', async () => {
+    if (!currentImageData) return;
+
+    loading.style.display = 'block';
+    results.style.display = 'none';
+    hideError();
+    processBtn.disabled = true;
+
+    try {
+        // Convertir data URL a blob
+        const blob = await (await fetch(currentImageData)).blob();
+        const formData = new FormData();
+        formData.append('image', blob, 'caudalimetro.jpg');
+
+        // Lectura y QR del formulario en una sola subida
+        const response = await fetch('/process-qr', {
+            method: 'POST',
+            body: formData
+        });
+
+        const data = await response.json();
+
+        if (data.error) {
+            showError(data.error);
+        } else {
+            displayResults(data);
+        }
+    } catch (err) {
+        showError('Error al procesar: ' + err.message);
+    } finally {
+        loading.style.display = 'none';
+        processBtn.disabled = false;
+    }
+});
+
+function displayResults(data) {
+    resultsContent.innerHTML = '';
+
+    if (data.texto_rojo && data.texto_rojo.length > 0) {
+        data.texto_rojo.forEach((area, index) => {
+            const div = document.createElement('div');
+            div.className = 'result-item';
+            div.innerHTML = `
+                <strong>Área ${area.area}:</strong>
+                <div class="result-value">${area.texto}</div>
+            `;
+            resultsContent.appendChild(div);
+        });
+    }
+
+    if (data.numeros_encontrados && data.numeros_encontrados.length > 0) {
+        const div = document.createElement('div');
+        div.className = 'result-item';
+        div.innerHTML = `
+            <strong>Valores Detectados:</strong>
+            <div class="result-value">${data.numeros_encontrados.map(n => n.valor).join(', ')}</div>
+        `;
+        resultsContent.appendChild(div);
+    }
+
+    if (data.texto_completo) {
+        const div = document.createElement('div');
+        div.className = 'result-item';
+        div.innerHTML = `
+            <strong>Texto Completo:</strong>
+            <div>${data.texto_completo}</div>
+        `;
+        resultsContent.appendChild(div);
+    }
+
+    if (data.parcial) {
+        const div = document.createElement('div');
+        div.className = 'result-item';
+        div.innerHTML = `
+            <strong>Resultado parcial:</strong>
+            <div>${data.areas_omitidas.length} área(s) sin procesar por falta de tiempo</div>
+        `;
+        resultsContent.appendChild(div);
+    }
+
+    // El QR del formulario venía en la misma foto: rellenarlo sin escanear
+    if (data.qr && data.qr.es_google_forms) {
+        const qrDiv = document.createElement('div');
+        qrDiv.className = 'result-item';
+        qrDiv.style.background = '#e7f3ff';
+        qrDiv.style.borderLeft = '4px solid #2196F3';
+        qrDiv.innerHTML = `
+            <strong>📋 Formulario Detectado en la Foto</strong>
+            <button id="rellenarFormBtn" class="btn-primary" style="width: 100%; margin-top: 10px;">
+                📝 Rellenar Formulario
+            </button>
+        `;
+        resultsContent.appendChild(qrDiv);
+        document.getElementById('rellenarFormBtn').addEventListener('click', () => {
+            rellenarFormularioGoogle(data.qr.url_formulario, data.qr.valor_medidor);
+        });
+    }
+
+    results.style.display = 'block';
+}
+
+function showError(message) {
+    error.textContent = message;
+    error.style.display = 'block';
+}
+
+function hideError() {
+    error.style.display = 'none';
+}
+
+// Seleccionar desde galería
+fileInput.addEventListener('change', (e) => {
+    const file = e.target.files[0];
+    if (file) {
+        const reader = new FileReader();
+        reader.onload = (e) => {
+            currentImageData = e.target.result;
+            preview.src = currentImageData;
+
+            // Asegurar que la imagen se muestre
+            previewWrapper.style.display = 'block';
+            preview.style.display = 'block';
+
+            preview.onload = () => {
+                setupPreview();
+                // Asegurar visibilidad después de cargar
+                previewWrapper.style.display = 'block';
+                preview.style.display = 'block';
+            };
+
+            video.style.display = 'none';
+            captureBtn.style.display = 'none';
+            retakeBtn.style.display = 'block';
+            processBtn.style.display = 'block';
+            selectAreaBtn.style.display = 'block';
+
+            if (stream) {
+                stream.getTracks().forEach(track => track.stop());
+                stream = null;
+            }
+        };
+        reader.readAsDataURL(file);
+    }
+});
+
+// Funcionalidad de escaneo de QR y rellenado de formulario
+let qrStream = null;
+let qrVideo = null;
+let qrCanvas = null;
+
+// Escuchar clics en el botón de escanear QR (se crea dinámicamente)
+document.addEventListener('click', async (e) => {
+    if (e.target.id === 'scanQRBtn') {
+        iniciarEscaneoQR();
+    }
+});
+
+async function iniciarEscaneoQR() {
+    try {
+        // Crear modal para escanear QR
+        const modal = document.createElement('div');
+        modal.id = 'qrModal';
+        modal.style.cssText = 'position: fixed; top: 0; left: 0; width: 100%; height: 100%; background: rgba(0,0,0,0.9); z-index: 10000; display: flex; flex-direction: column; align-items: center; justify-content: center;';
+        modal.innerHTML = `
+            <div style="background: white; padding: 20px; border-radius: 10px; max-width: 90%; text-align: center;">
+                <h2 style="margin-bottom: 20px;">📷 Escanear Código QR</h2>
+                <video id="qrVideo" autoplay playsinline style="width: 100%; max-width: 400px; border-radius: 10px;"></video>
+                <canvas id="qrCanvas" style="display: none;"></canvas>
+                <p id="qrEstado" style="margin: 15px 0; color: #666;">Apunta la cámara hacia el código QR del formulario</p>
+                <button id="cerrarQR" class="btn-danger" style="margin-top: 10px;">Cerrar</button>
+            </div>
+        `;
+        document.body.appendChild(modal);
+
+        qrVideo = document.getElementById('qrVideo');
+        qrCanvas = document.getElementById('qrCanvas');
+
+        // Activar cámara
+        qrStream = await navigator.mediaDevices.getUserMedia({
+            video: { facingMode: 'environment' }
+        });
+        qrVideo.srcObject = qrStream;
+
+        // Iniciar detección de QR
+        iniciarDeteccionQR();
+
+        // Cerrar modal
+        document.getElementById('cerrarQR').addEventListener('click', cerrarEscaneoQR);
+
+    } catch (err) {
+        showError('Error al acceder a la cámara: ' + err.message);
+    }
+}
+
+function cerrarEscaneoQR() {
+    detenerDeteccionQR();
+    if (qrStream) {
+        qrStream.getTracks().forEach(track => track.stop());
+        qrStream = null;
+    }
+    const modal = document.getElementById('qrModal');
+    if (modal) {
+        modal.remove();
+    }
+}
+
+let qrSocket = null;
+let qrTemporizador = null;
+// Id de la sesión de escaneo: el servidor solo reutiliza lecturas de la misma sesión
+let qrSesion = null;
+
+function detenerDeteccionQR() {
+    clearTimeout(qrTemporizador);
+    qrTemporizador = null;
+    if (qrSocket) {
+        const socket = qrSocket;
+        qrSocket = null;
+        socket.close();
+    }
+}
+
+// Captura el frame actual reducido (lado mayor 960 px) como JPEG
+function capturarFrameQR() {
+    return new Promise((resolve) => {
+        if (!qrStream || !qrVideo || qrVideo.readyState !== qrVideo.HAVE_ENOUGH_DATA) {
+            resolve(null);
+            return;
+        }
+        const escala = Math.min(1, 960 / Math.max(qrVideo.videoWidth, qrVideo.videoHeight));
+        qrCanvas.width = Math.round(qrVideo.videoWidth * escala);
+        qrCanvas.height = Math.round(qrVideo.videoHeight * escala);
+        qrCanvas.getContext('2d').drawImage(qrVideo, 0, 0, qrCanvas.width, qrCanvas.height);
+        qrCanvas.toBlob(resolve, 'image/jpeg', 0.7);
+    });
+}
+
+function resultadoQR(data) {
+    if (data.exito && data.es_google_forms) {
+        // QR encontrado y es formulario de Google
+        cerrarEscaneoQR();
+        rellenarFormularioGoogle(data.url_formulario, valorMedidorExtraido);
+        return true;
+    } else if (data.exito && !data.es_google_forms) {
+        // QR encontrado pero no es formulario de Google: avisar y seguir escaneando
+        const estado = document.getElementById('qrEstado');
+        if (estado) {
+            estado.textContent = 'Ese código QR no es de un formulario de Google; apunta al QR del formulario';
+            estado.style.color = '#dc3545';
+        } else {
+            showError('El QR code no apunta a un formulario de Google');
+        }
+    }
+    return false;
+}
+
+function iniciarDeteccionQR() {
+    if (!qrVideo || !qrCanvas) return;
+    qrSesion = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+
+    // Sesión por WebSocket: se envían frames sin esperar respuesta y el
+    // servidor solo procesa el último; la sesión sigue abierta hasta leer el
+    // QR de un formulario (los QR de otro tipo solo se notifican)
+    if (!window.WebSocket) {
+        sondearQR();
+        return;
+    }
+    const protocolo = location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocolo}//${location.host}/ws/scan-qr`);
+    qrSocket = socket;
+
+    socket.onopen = () => {
+        async function enviarFrame() {
+            if (qrSocket !== socket) return;
+            // No acumular frames si la red no da abasto
+            if (socket.bufferedAmount === 0) {
+                const blob = await capturarFrameQR();
+                if (blob && qrSocket === socket && socket.readyState === WebSocket.OPEN) {
+                    socket.send(blob);
+                }
+            }
+            qrTemporizador = setTimeout(enviarFrame, 300);
+        }
+        enviarFrame();
+    };
+
+    socket.onmessage = (evento) => {
+        const data = JSON.parse(evento.data);
+        if (!resultadoQR(data) && !data.exito) {
+            console.error('Escaneo QR:', data.error);
+        }
+    };
+
+    socket.onclose = () => {
+        // Sin WebSocket (servidor ocupado, proxy...) seguir con peticiones HTTP
+        if (qrSocket === socket) {
+            qrSocket = null;
+            clearTimeout(qrTemporizador);
+            if (qrStream) {
+                sondearQR();
+            }
+        }
+    };
+}
+
+// Respaldo por HTTP: una petición cada vez, sin solapar, con tiempo máximo
+async function sondearQR() {
+    if (!qrStream) return;
+
+    const blob = await capturarFrameQR();
+    if (blob) {
+        const controlador = new AbortController();
+        const limite = setTimeout(() => controlador.abort(), 5000);
+        try {
+            const formData = new FormData();
+            formData.append('image', blob, 'qr.jpg');
+            formData.append('sesion', qrSesion);
+
+            const response = await fetch('/scan-qr', {
+                method: 'POST',
+                body: formData,
+                signal: controlador.signal
+            });
+
+            if (resultadoQR(await response.json())) {
+                return;
+            }
+            // Si no encuentra QR, continuar escaneando
+        } catch (err) {
+            console.error('Error al escanear QR:', err);
+        } finally {
+            clearTimeout(limite);
+        }
+    }
+
+    if (qrStream) {
+        qrTemporizador = setTimeout(sondearQR, 500);
+    }
+}
+
+function rellenarFormularioGoogle(urlFormulario, valor) {
+    if (!valor) {
+        showError('No hay valor del medidor para rellenar');
+        return;
+    }
+
+    // Abrir formulario en nueva ventana/iframe
+    const formWindow = window.open(urlFormulario, '_blank');
+
+    // Intentar rellenar el formulario automáticamente
+    // Nota: Google Forms no permite rellenado directo desde JavaScript externo
+    // por políticas de seguridad. Mostramos instrucciones al usuario.
+
+    const instrucciones = document.createElement('div');
+    instrucciones.className = 'result-item';
+    instrucciones.style.background = '#fff3cd';
+    instrucciones.style.borderLeft = '4px solid #ffc107';
+    instrucciones.innerHTML = `
+        <strong>📋 Instrucciones para Rellenar Formulario</strong>
+        <p style="margin: 10px 0;">Se abrió el formulario en una nueva ventana.</p>
+        <p style="margin: 10px 0;"><strong>Valor a ingresar:</strong></p>
+        <div style="background: white; padding: 15px; border-radius: 5px; font-size: 24px; font-weight: bold; color: #667eea; text-align: center; margin: 10px 0;">
+            ${valor}
+        </div>
+        <p style="margin: 10px 0; color: #666;">
+            Copia el valor de arriba y pégalo en el campo correspondiente del formulario.
+        </p>
+        <button onclick="navigator.clipboard.writeText('${valor}').then(() => alert('Valor copiado al portapapeles!'))" 
+                class="btn-primary" style="width: 100%; margin-top: 10px;">
+            📋 Copiar Valor al Portapapeles
+        </button>
+    `;
+
+    resultsContent.appendChild(instrucciones);
+    results.style.display = 'block';
+}
+"""
+
+
+def _recurso(cuerpo: bytes, tipo: str) -> Dict[str, any]:
+    """
+    Prepara un recurso: hash del contenido y cuerpo en cada codificación.
+    """
+    codificaciones = {
+        'identity': cuerpo,
+        'gzip': gzip.compress(cuerpo, compresslevel=9, mtime=0)
+    }
+    if brotli is not None:
+        codificaciones['br'] = brotli.compress(cuerpo, quality=11)
+    return {
+        'tipo': tipo,
+        'hash': hashlib.sha256(cuerpo).hexdigest()[:16],
+        'codificaciones': codificaciones
+    }
+
+
+def construir_recursos() -> Dict[str, Dict[str, any]]:
+    """
+    Construye la página y sus recursos una sola vez.
+    
+    Returns:
+        Diccionario ruta → recurso con '/' (la página, que enlaza los demás) y
+        '/assets/app.<hash>.css' y '/assets/app.<hash>.js'
+    """
+    css = _recurso(PAGINA_CSS.encode('utf-8'), 'text/css; charset=utf-8')
+    js = _recurso(PAGINA_JS.encode('utf-8'), 'application/javascript; charset=utf-8')
+    ruta_css = f"/assets/app.{css['hash']}.css"
+    ruta_js = f"/assets/app.{js['hash']}.js"
+    
+    html = PAGINA_HTML.replace('__CSS__', ruta_css).replace('__JS__', ruta_js)
+    return {
+        '/': _recurso(html.encode('utf-8'), 'text/html; charset=utf-8'),
+        ruta_css: css,
+        ruta_js: js
+    }
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro de Perfiles de Medidor
+Asocia el contenido del QR de cada medidor (o el form_id de su formulario) a un
+modelo de caudalímetro. Cada modelo guarda las regiones del display donde
+aparecen sus valores y el formato esperado de cada valor, de modo que los
+medidores conocidos se leen sin marcar nada en rojo.
+
+Las regiones se miden desde la pegatina QR del medidor, no desde los bordes
+de la foto (que cambian con cada encuadre): 'caja' es [x, y, ancho, alto] en
+lados de QR, con origen en la esquina superior izquierda del QR, x hacia su
+esquina superior derecha e y hacia la inferior izquierda. Los valores
+negativos quedan a la izquierda o por encima del QR.
+
+Formato del archivo JSON (PERFILES_MEDIDOR):
+
+    {
+      "modelos": {
+        "contador_lcd_a": {
+          "descripcion": "Caudalímetro electromagnético, display LCD",
+          "motor": "lcd",
+          "regiones": [
+            {"nombre": "caudal", "caja": [-3.40, 0.10, 2.80, 0.55],
+             "formato": "^[+-]?\\\\d+[.,]\\\\d+$"},
+            {"nombre": "volumen", "caja": [-3.40, 0.75, 2.80, 0.55]}
+          ]
+        }
+      },
+      "medidores": {
+        "https://docs.google.com/forms/d/e/1FAIpQLSe.../viewform": "contador_lcd_a",
+        "1FAIpQLSe...": "contador_lcd_a"
+      }
+    }
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from qr_processor import parsear_url_google_forms
+
+
+PERFILES_MEDIDOR = os.getenv('PERFILES_MEDIDOR', '/data/perfiles_medidor.json')
+
+
+class RegistroPerfiles:
+    """
+    Registro de perfiles de medidor leído de un archivo JSON.
+
+    El archivo se vuelve a leer cuando cambia su fecha de modificación, así que
+    se pueden dar de alta medidores sin reiniciar los workers.
+    """
+
+    def __init__(self, ruta: str = PERFILES_MEDIDOR):
+        self.ruta = Path(ruta)
+        self._mtime = None
+        self._modelos: Dict[str, Dict] = {}
+        self._medidores: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _recargar(self):
+        """Relee el archivo si ha cambiado desde la última lectura."""
+        try:
+            mtime = self.ruta.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            datos = {}
+            if mtime is not None:
+                try:
+                    with open(self.ruta, 'r', encoding='utf-8') as f:
+                        datos = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    # Archivo a medio escribir o mal formado: mantener los perfiles anteriores
+                    print(f"Error al leer perfiles de medidor {self.ruta}: {e}")
+                    return
+            self._modelos = datos.get('modelos', {})
+            self._medidores = datos.get('medidores', {})
+            self._mtime = mtime
+
+    def version(self) -> Optional[float]:
+        """
+        Fecha de modificación del registro leído (None si no hay archivo).
+        Sirve para invalidar resultados en caché al cambiar los perfiles.
+        """
+        self._recargar()
+        return self._mtime
+
+    def buscar(self, qr: str) -> Optional[Dict[str, any]]:
+        """
+        Busca el perfil del medidor a partir del contenido de su QR.
+
+        Primero se busca el contenido completo y, si es una URL de Google
+        Forms, después su form_id.
+
+        Args:
+            qr: Contenido del QR del medidor
+
+        Returns:
+            Perfil con 'modelo', 'regiones' y, opcionalmente, 'motor' y
+            'descripcion'; None si el medidor no está registrado
+        """
+        if not qr:
+            return None
+        self._recargar()
+
+        modelo = self._medidores.get(qr)
+        if modelo is None and qr.startswith('http'):
+            form_id = parsear_url_google_forms(qr).get('form_id')
+            if form_id:
+                modelo = self._medidores.get(form_id)
+
+        if modelo is None or modelo not in self._modelos:
+            return None
+        return {'modelo': modelo, **self._modelos[modelo]}
+
+
+_registro: Optional[RegistroPerfiles] = None
+
+
+def obtener_registro() -> RegistroPerfiles:
+    """Devuelve el registro de perfiles del proceso actual."""
+    global _registro
+    if _registro is None:
+        _registro = RegistroPerfiles()
+    return _registro
@@ -5,9 +5,14 @@ Procesador de Códigos QR y Formularios de Google
 Escanea QR codes y rellena automáticamente formularios de Google Forms
 """
 
+import os
 import re
 import json
+import time
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, Tuple
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
@@ -21,6 +26,170 @@ except ImportError as e:
     print(f"Error específico: {e}")
     exit(1)
 
+from extractor_rojo import (FuenteImagen, cargar_imagen, componentes_rojos, procesar_caudalimetro,
+                            procesar_con_perfil)
+
+
+# Lado mayor (px) de la copia sobre la que se binariza y se localiza el QR
+LADO_INTERMEDIO_QR = 960
+
+# Lados mayores (px) a los que se prueba a leer el QR, de menor a mayor; None = original
+ESCALAS_QR = (480, LADO_INTERMEDIO_QR, None)
+
+# Margen (fracción del lado) alrededor de la región localizada por QRCodeDetector
+MARGEN_REGION_QR = 0.15
+
+# Lado mínimo (px) del recorte de la región; si es menor se amplía antes de leer
+LADO_MIN_REGION_QR = 300
+
+# Caché de lecturas de QR por frame (en memoria, una por sesión de escaneo)
+QR_CACHE_TTL = float(os.getenv('QR_CACHE_TTL', '5'))
+# Segundos que se recuerda que un frame no tenía QR (corto: el siguiente puede enfocar)
+QR_CACHE_TTL_FALLO = float(os.getenv('QR_CACHE_TTL_FALLO', '1'))
+QR_CACHE_MAX = int(os.getenv('QR_CACHE_MAX', '16'))
+# Bits distintos (de 64) del hash perceptual hasta los que dos frames se consideran iguales
+QR_CACHE_DISTANCIA = int(os.getenv('QR_CACHE_DISTANCIA', '4'))
+# Sesiones de escaneo con caché propia que recuerda cada worker
+QR_CACHE_SESIONES = 64
+
+
+def hash_perceptual(gray: np.ndarray) -> int:
+    """
+    Hash por diferencias (dHash) de 64 bits de una imagen en grises: cada bit
+    indica si un píxel de la miniatura de 9x8 es más claro que su vecino.
+    Frames casi idénticos dan hashes a pocos bits de distancia.
+    """
+    miniatura = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (miniatura[:, 1:] > miniatura[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class CacheQR:
+    """
+    Caché LRU con caducidad de lecturas de QR indexadas por hash perceptual,
+    propia de una sesión de escaneo (un operario apuntando a un medidor).
+
+    Los frames sin QR se guardan como lectura vacía ('') con una caducidad
+    mucho más corta (`ttl_fallo`): los frames repetidos de una cámara quieta no
+    recorren toda la escalera de decodificación, pero en cuanto la imagen
+    cambia (o pasa ese segundo) se vuelve a escanear.
+    """
+
+    def __init__(self, ttl: float = QR_CACHE_TTL, max_entradas: int = QR_CACHE_MAX,
+                 distancia: int = QR_CACHE_DISTANCIA, ttl_fallo: float = QR_CACHE_TTL_FALLO):
+        self.ttl = ttl
+        self.ttl_fallo = ttl_fallo
+        self.max_entradas = max(1, max_entradas)
+        self.distancia = distancia
+        self._entradas: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave: int) -> Optional[str]:
+        """
+        Busca un frame cercano (distancia de Hamming <= `distancia`).
+
+        Returns:
+            Contenido del QR de ese frame, '' si se escaneó hace poco sin
+            encontrar QR, o None si no hay ninguna lectura vigente
+        """
+        ahora = time.time()
+        with self._lock:
+            # La caducidad cuenta desde que se escaneó el frame, no desde el último uso
+            caducadas = [h for h, (qr_content, instante) in self._entradas.items()
+                         if ahora - instante > (self.ttl if qr_content else self.ttl_fallo)]
+            for hash_caducado in caducadas:
+                del self._entradas[hash_caducado]
+
+            # Una lectura con QR tiene prioridad sobre un frame vacío cercano
+            vacio = None
+            for hash_guardado, (qr_content, _) in self._entradas.items():
+                if bin(hash_guardado ^ clave).count('1') <= self.distancia:
+                    if qr_content:
+                        self._entradas.move_to_end(hash_guardado)
+                        self.aciertos += 1
+                        return qr_content
+                    if vacio is None:
+                        vacio = hash_guardado
+
+            if vacio is not None:
+                self._entradas.move_to_end(vacio)
+                self.aciertos += 1
+                return ''
+
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave: int, qr_content: str):
+        """
+        Guarda la lectura de un frame ('' si no tenía QR), expulsando la menos
+        usada si está llena.
+        """
+        with self._lock:
+            self._entradas[clave] = (qr_content, time.time())
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entradas)
+
+
+class CachesQR:
+    """
+    Cachés de QR por sesión de escaneo de un worker. Cada sesión (conexión
+    WebSocket o id de sesión enviado por el cliente) tiene la suya, para que
+    dos operarios no reciban nunca el QR leído por el otro.
+    """
+
+    def __init__(self, max_sesiones: int = QR_CACHE_SESIONES):
+        self.max_sesiones = max(1, max_sesiones)
+        self._sesiones: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # Contadores de las sesiones ya descartadas
+        self._aciertos = 0
+        self._fallos = 0
+
+    def de_sesion(self, sesion: str) -> CacheQR:
+        """Devuelve la caché de una sesión, creándola si no existe."""
+        with self._lock:
+            cache = self._sesiones.get(sesion)
+            if cache is None:
+                cache = self._sesiones[sesion] = CacheQR()
+            self._sesiones.move_to_end(sesion)
+            while len(self._sesiones) > self.max_sesiones:
+                _, descartada = self._sesiones.popitem(last=False)
+                self._acumular(descartada)
+            return cache
+
+    def cerrar(self, sesion: str):
+        """Descarta la caché de una sesión terminada."""
+        with self._lock:
+            cache = self._sesiones.pop(sesion, None)
+            if cache is not None:
+                self._acumular(cache)
+
+    def _acumular(self, cache: CacheQR):
+        self._aciertos += cache.aciertos
+        self._fallos += cache.fallos
+
+    def estado(self) -> Dict[str, int]:
+        """Sesiones, entradas y contadores de aciertos y fallos."""
+        with self._lock:
+            caches = list(self._sesiones.values())
+            return {
+                'sesiones': len(caches),
+                'entradas': sum(len(c) for c in caches),
+                'aciertos': self._aciertos + sum(c.aciertos for c in caches),
+                'fallos': self._fallos + sum(c.fallos for c in caches)
+            }
+
+
+# Cachés por sesión de cada proceso (worker de gunicorn)
+caches_qr = CachesQR()
+
 
 def escanear_qr_imagen(ruta_imagen: str) -> Optional[str]:
     """
@@ -33,22 +202,167 @@ def escanear_qr_imagen(ruta_imagen: str) -> Optional[str]:
         Contenido del QR code o None si no se encuentra
     """
     try:
-        # Leer imagen con OpenCV
-        img = cv2.imread(ruta_imagen)
-        if img is None:
+        # Leer imagen directamente en escala de grises con OpenCV
+        gray = cv2.imread(ruta_imagen, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
             # Intentar con PIL si OpenCV falla
-            pil_img = Image.open(ruta_imagen)
-            img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+            gray = np.array(Image.open(ruta_imagen).convert('L'))
+        
+        return escanear_qr_array(gray)
+    
+    except Exception as e:
+        print(f"Error al escanear QR: {e}")
+        return None
+
+
+def escanear_qr_bytes(datos: bytes, cache: Optional[CacheQR] = None) -> Optional[str]:
+    """
+    Escanea un código QR en una imagen codificada (JPEG, PNG...) en memoria.
+    La imagen se decodifica directamente en escala de grises, sin pasar por
+    base64 ni por color.
+    
+    Args:
+        datos: Bytes de la imagen tal como se subieron
+        cache: Caché de la sesión de escaneo; si se indica, se reutiliza la
+               lectura (o la ausencia de QR) de un frame casi idéntico reciente
+               en lugar de volver a escanear
+        
+    Returns:
+        Contenido del QR code o None si no se encuentra
+    """
+    try:
+        gray = cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            # Formatos que OpenCV no decodifica (p. ej. algunos GIF o WebP)
+            from io import BytesIO
+            gray = np.array(Image.open(BytesIO(datos)).convert('L'))
+        
+        if cache is None:
+            return escanear_qr_array(gray)
+        
+        clave = hash_perceptual(gray)
+        qr_content = cache.obtener(clave)
+        if qr_content is None:
+            qr_content = escanear_qr_array(gray)
+            cache.guardar(clave, qr_content or '')
+        return qr_content or None
+    
+    except Exception as e:
+        print(f"Error al escanear QR: {e}")
+        return None
+
+
+def _decodificar_qr(gray: np.ndarray) -> Optional[str]:
+    """Lee el primer QR de una imagen en grises (solo busca símbolos QR)."""
+    qr_codes = pyzbar.decode(gray, symbols=[pyzbar.ZBarSymbol.QRCODE])
+    if qr_codes:
+        return qr_codes[0].data.decode('utf-8')
+    return None
+
+
+def _reducir(gray: np.ndarray, lado_max: Optional[int]) -> Optional[np.ndarray]:
+    """
+    Reduce la imagen para que su lado mayor sea `lado_max`.
+    Devuelve None si ya es igual o menor (esa escala no aporta nada nuevo).
+    """
+    lado = max(gray.shape[:2])
+    if lado_max is None:
+        return gray
+    if lado <= lado_max:
+        return None
+    escala = lado_max / lado
+    return cv2.resize(gray, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+
+
+def localizar_qr(imagen: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Localiza el QR con el detector de OpenCV sobre una copia reducida.
+    
+    Args:
+        imagen: Array de OpenCV en BGR o en escala de grises
         
-        # Convertir a escala de grises para mejor detección
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    Returns:
+        Array (4, 2) con las esquinas del QR en píxeles de la imagen original,
+        en el orden del propio código (superior izquierda, superior derecha,
+        inferior derecha, inferior izquierda) aunque la foto esté girada; None
+        si no se localiza
+    """
+    gray = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+    base = _reducir(gray, LADO_INTERMEDIO_QR)
+    if base is None:
+        base = gray
+    encontrado, puntos = cv2.QRCodeDetector().detect(base)
+    if not encontrado or puntos is None:
+        return None
+    return puntos.reshape(-1, 2).astype(np.float32) * (gray.shape[1] / base.shape[1])
+
+
+def _region_qr(gray: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Localiza el QR y devuelve su región de la imagen original (ampliada si es
+    pequeña).
+    """
+    puntos = localizar_qr(gray)
+    if puntos is None:
+        return None
+    
+    x1, y1 = puntos.min(axis=0)
+    x2, y2 = puntos.max(axis=0)
+    margen = MARGEN_REGION_QR * max(x2 - x1, y2 - y1)
+    x1, y1 = int(max(0, x1 - margen)), int(max(0, y1 - margen))
+    x2, y2 = int(min(gray.shape[1], x2 + margen)), int(min(gray.shape[0], y2 + margen))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    
+    region = gray[y1:y2, x1:x2]
+    lado = max(region.shape)
+    if lado < LADO_MIN_REGION_QR:
+        escala = LADO_MIN_REGION_QR / lado
+        region = cv2.resize(region, None, fx=escala, fy=escala, interpolation=cv2.INTER_CUBIC)
+    return region
+
+
+def escanear_qr_array(imagen: np.ndarray) -> Optional[str]:
+    """
+    Escanea un código QR en una imagen ya decodificada.
+    
+    Prueba de lo más barato a lo más caro y se detiene en cuanto lee un QR:
+    primero copias reducidas (ESCALAS_QR) hasta la resolución original, luego
+    una binarización adaptativa (sombras, reflejos) y por último solo la región
+    que localiza QRCodeDetector, ampliada (pegatinas pequeñas o lejanas).
+    
+    Args:
+        imagen: Array de OpenCV en BGR o en escala de grises
         
-        # Escanear códigos QR
-        qr_codes = pyzbar.decode(gray)
+    Returns:
+        Contenido del QR code o None si no se encuentra
+    """
+    try:
+        gray = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY) if imagen.ndim == 3 else imagen
+        
+        # 1. Escalas crecientes
+        for lado_max in ESCALAS_QR:
+            escalada = _reducir(gray, lado_max)
+            if escalada is None:
+                continue
+            qr_content = _decodificar_qr(escalada)
+            if qr_content:
+                return qr_content
         
-        if qr_codes:
-            # Devolver el primer QR code encontrado
-            return qr_codes[0].data.decode('utf-8')
+        # 2. Binarización adaptativa sobre una escala intermedia
+        intermedia = _reducir(gray, LADO_INTERMEDIO_QR)
+        if intermedia is None:
+            intermedia = gray
+        binaria = cv2.adaptiveThreshold(intermedia, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                        cv2.THRESH_BINARY, 31, 5)
+        qr_content = _decodificar_qr(binaria)
+        if qr_content:
+            return qr_content
+        
+        # 3. Solo la región donde OpenCV localiza un QR
+        region = _region_qr(gray)
+        if region is not None:
+            return _decodificar_qr(region)
         
         return None
     
@@ -57,6 +371,11 @@ def escanear_qr_imagen(ruta_imagen: str) -> Optional[str]:
         return None
 
 
+def es_formulario_google(qr_content: str) -> bool:
+    """Indica si el contenido de un QR apunta a un formulario de Google."""
+    return 'docs.google.com/forms' in qr_content or 'forms.gle' in qr_content
+
+
 def escanear_qr_desde_base64(imagen_base64: str) -> Optional[str]:
     """
     Escanea un código QR desde una imagen en base64.
@@ -69,30 +388,13 @@ def escanear_qr_desde_base64(imagen_base64: str) -> Optional[str]:
     """
     try:
         import base64
-        from io import BytesIO
         
         # Remover prefijo si existe
         if ',' in imagen_base64:
             imagen_base64 = imagen_base64.split(',')[1]
         
-        # Decodificar base64
-        imagen_bytes = base64.b64decode(imagen_base64)
-        imagen = Image.open(BytesIO(imagen_bytes))
-        
-        # Convertir a OpenCV
-        import numpy as np
-        img = cv2.cvtColor(np.array(imagen), cv2.COLOR_RGB2BGR)
-        
-        # Convertir a escala de grises
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Escanear códigos QR
-        qr_codes = pyzbar.decode(gray)
-        
-        if qr_codes:
-            return qr_codes[0].data.decode('utf-8')
-        
-        return None
+        # Decodificar base64 y escanear los bytes de la imagen
+        return escanear_qr_bytes(base64.b64decode(imagen_base64))
     
     except Exception as e:
         print(f"Error al escanear QR desde base64: {e}")
@@ -115,12 +417,14 @@ def parsear_url_google_forms(url: str) -> Dict[str, any]:
         # Extraer ID del formulario
         form_id = None
         if 'forms' in parsed.path:
-            # Formato: /forms/d/FORM_ID/viewform
+            # Formato: /forms/d/FORM_ID/viewform o /forms/d/e/FORM_ID/viewform
             parts = parsed.path.split('/')
             if 'forms' in parts:
-                idx = parts.index('forms')
-                if idx + 1 < len(parts):
-                    form_id = parts[idx + 1]
+                idx = parts.index('forms') + 1
+                while idx < len(parts) and parts[idx] in ('d', 'e'):
+                    idx += 1
+                if idx < len(parts) and parts[idx]:
+                    form_id = parts[idx]
         
         # Extraer parámetros de la URL
         params = parse_qs(parsed.query)
@@ -210,7 +514,7 @@ def procesar_qr_y_formulario(ruta_imagen_qr: str, valor_medidor: str) -> Dict[st
         }
     
     # Verificar si es una URL de Google Forms
-    if 'docs.google.com/forms' not in qr_content and 'forms.gle' not in qr_content:
+    if not es_formulario_google(qr_content):
         return {
             'error': 'El QR code no apunta a un formulario de Google',
             'qr_content': qr_content,
@@ -232,3 +536,79 @@ def procesar_qr_y_formulario(ruta_imagen_qr: str, valor_medidor: str) -> Dict[st
         'url_formulario': qr_content
     }
 
+
+def procesar_medidor_y_qr(fuente: FuenteImagen, idioma: str = 'spa',
+                          nombre_archivo: Optional[str] = None, motor: str = 'tesseract',
+                          motor_perfil: bool = True, **opciones) -> Dict[str, any]:
+    """
+    Lee el caudalímetro y el QR de su formulario en una misma foto.
+    
+    La imagen se decodifica una sola vez y el QR se busca en un thread mientras
+    el actual trabaja (OpenCV, pyzbar y Tesseract liberan el GIL). Si no hay
+    registro de perfiles, ese trabajo es la detección de rojo y el OCR. Si lo
+    hay, solo la detección de rojo: si el QR resulta ser de un medidor con
+    perfil, se descarta y se leen las regiones del perfil (procesar_con_perfil);
+    si no, el OCR reutiliza las áreas ya detectadas.
+    
+    Args:
+        fuente: Ruta a la imagen, bytes codificados o array BGR ya decodificado
+        idioma: Idioma para OCR
+        nombre_archivo: Nombre a mostrar en los resultados
+        motor: Motor de OCR
+        motor_perfil: Si True, un medidor con perfil usa el motor de su perfil
+        **opciones: Parámetros adicionales de procesar_caudalimetro
+                    (modo_lote, umbral_rojo, presupuesto_s, inicio...)
+        
+    Returns:
+        Resultado de procesar_caudalimetro (o de procesar_con_perfil) con la
+        clave 'qr': el contenido del QR, si es un formulario de Google y, en
+        ese caso, la información del formulario y del campo a rellenar (None
+        si no hay QR en la foto)
+    """
+    # Importado aquí: perfiles_medidor importa este módulo
+    from perfiles_medidor import obtener_registro
+    
+    if nombre_archivo is None and isinstance(fuente, (str, Path)):
+        nombre_archivo = Path(fuente).name
+    imagen = cargar_imagen(fuente)
+    
+    registro = obtener_registro()
+    with ThreadPoolExecutor(max_workers=1) as hilo:
+        futuro_qr = hilo.submit(escanear_qr_array, imagen)
+        if registro.version() is None:
+            resultados = procesar_caudalimetro(imagen, idioma, nombre_archivo=nombre_archivo,
+                                               motor=motor, **opciones)
+            qr_content = futuro_qr.result()
+        else:
+            componentes = componentes_rojos(imagen, opciones.get('umbral_rojo', 100))
+            qr_content = futuro_qr.result()
+            perfil = registro.buscar(qr_content)
+            if perfil is not None:
+                resultados = procesar_con_perfil(imagen, perfil, idioma, nombre_archivo=nombre_archivo,
+                                                 motor=perfil.get('motor', motor) if motor_perfil else motor,
+                                                 componentes=componentes, **opciones)
+            else:
+                resultados = procesar_caudalimetro(imagen, idioma, nombre_archivo=nombre_archivo,
+                                                   motor=motor, componentes=componentes, **opciones)
+    
+    if not qr_content:
+        resultados['qr'] = None
+        return resultados
+    
+    qr = {
+        'qr_content': qr_content,
+        'es_google_forms': es_formulario_google(qr_content)
+    }
+    if qr['es_google_forms']:
+        # Valor a rellenar: el primer número reconocido o, si no hay, todo el texto
+        numeros = resultados.get('numeros_encontrados') or []
+        valor = numeros[0]['valor'] if numeros else resultados.get('texto_completo', '')
+        form_info = parsear_url_google_forms(qr_content)
+        qr.update({
+            'form_info': form_info,
+            'campo_info': identificar_campo_formulario(form_info, valor),
+            'valor_medidor': valor,
+            'url_formulario': qr_content
+        })
+    resultados['qr'] = qr
+    return resultados
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sesión de Imágenes Subidas
+Permite subir una foto una sola vez y procesar después varias áreas de ella por
+su id. Los bytes se guardan en disco (IMAGENES_DIR, compartido entre workers de
+gunicorn y procesos de OCR) y, la primera vez que se procesa un área, también su
+luminancia ya decodificada (.npy). Las áreas siguientes, las atienda el proceso
+que las atienda, leen esa luminancia con mmap, de modo que repetir una
+selección solo cuesta el OCR del recorte.
+"""
+
+import os
+import re
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import numpy as np
+    from PIL import Image, ImageOps
+except ImportError as e:
+    print(f"Error: Faltan dependencias. Instala con: pip install -r requirements.txt")
+    print(f"Error específico: {e}")
+    exit(1)
+
+# fcntl solo existe en sistemas Unix; sin él la limpieza no se coordina entre procesos
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from extractor_rojo import procesar_area_especifica
+
+
+IMAGENES_DIR = os.getenv('IMAGENES_DIR', '/data/imagenes')
+# Segundos sin uso tras los que una imagen subida caduca
+IMAGENES_TTL = int(os.getenv('IMAGENES_TTL', '3600'))
+# Espacio máximo de las fotos subidas y sus luminancias; por encima se
+# eliminan las menos usadas
+IMAGENES_MAX_MB = int(os.getenv('IMAGENES_MAX_MB', '1024'))
+
+# Cada cuántas escrituras se revisa el tamaño y la antigüedad del almacén
+LIMPIEZA_CADA = 5
+
+PATRON_ID_IMAGEN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def decodificar_luminancia(ruta: Path) -> np.ndarray:
+    """
+    Decodifica la luminancia de una imagen a resolución completa, orientada
+    según su EXIF (las coordenadas de las áreas son las que muestra el navegador).
+    En JPEG el decodificador entrega la luminancia sin pasar por color.
+    """
+    with Image.open(ruta) as img:
+        if img.format == 'JPEG':
+            img.draft('L', img.size)
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'L':
+            img = img.convert('L')
+        return np.asarray(img)
+
+
+class AlmacenImagenes:
+    """
+    Imágenes subidas guardadas en disco por el hash de su contenido.
+
+    Subir dos veces la misma foto devuelve el mismo id. La fecha de modificación
+    se actualiza en cada uso y sirve para la caducidad y para expulsar las
+    menos usadas cuando se supera IMAGENES_MAX_MB.
+    """
+
+    def __init__(self, directorio: str = IMAGENES_DIR, ttl: int = IMAGENES_TTL,
+                 max_mb: int = IMAGENES_MAX_MB):
+        self.directorio = Path(directorio)
+        self.ttl = ttl
+        self.max_bytes = max_mb * 1024 * 1024
+        self._escrituras = 0
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+    def _ruta(self, id_imagen: str) -> Path:
+        return self.directorio / id_imagen
+
+    def _ruta_luminancia(self, id_imagen: str) -> Path:
+        return self.directorio / f'{id_imagen}.npy'
+
+    def _escribir(self, ruta: Path, escribir):
+        """Escribe un archivo de forma atómica con `escribir(f)`."""
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                escribir(f)
+            os.replace(tmp, ruta)
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        self._escrituras += 1
+        if self._escrituras % LIMPIEZA_CADA == 0:
+            self.limpiar()
+
+    def guardar(self, datos: bytes) -> str:
+        """
+        Guarda los bytes de una imagen (escritura atómica) y devuelve su id.
+        """
+        id_imagen = hashlib.sha256(datos).hexdigest()
+        ruta = self._ruta(id_imagen)
+        if ruta.exists():
+            os.utime(ruta)
+        else:
+            self._escribir(ruta, lambda f: f.write(datos))
+        return id_imagen
+
+    def ruta(self, id_imagen: str) -> Optional[Path]:
+        """
+        Devuelve la ruta de una imagen vigente (y la marca como usada) o None
+        si el id no es válido, no existe o ha caducado.
+        """
+        if not PATRON_ID_IMAGEN.match(id_imagen or ''):
+            return None
+        ruta = self._ruta(id_imagen)
+        try:
+            if time.time() - ruta.stat().st_mtime > self.ttl:
+                ruta.unlink(missing_ok=True)
+                self._ruta_luminancia(id_imagen).unlink(missing_ok=True)
+                return None
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        return ruta
+
+    def luminancia(self, id_imagen: str) -> np.ndarray:
+        """
+        Devuelve la luminancia de una imagen vigente como array de solo lectura
+        proyectado en memoria (mmap): recortar un área solo lee sus filas.
+        La primera vez se decodifica y se guarda junto a la imagen.
+
+        Raises:
+            FileNotFoundError: Si la imagen no existe o ha caducado
+        """
+        ruta = self.ruta(id_imagen)
+        if ruta is None:
+            raise FileNotFoundError(f"La imagen {id_imagen} no existe o ha caducado")
+
+        ruta_luminancia = self._ruta_luminancia(id_imagen)
+        try:
+            luminancia = np.load(ruta_luminancia, mmap_mode='r')
+            os.utime(ruta_luminancia)
+            return luminancia
+        except (FileNotFoundError, ValueError):
+            # Aún no decodificada (o escritura interrumpida): decodificar y guardar
+            pass
+
+        luminancia = decodificar_luminancia(ruta)
+        self._escribir(ruta_luminancia, lambda f: np.save(f, luminancia))
+        return luminancia
+
+    def limpiar(self):
+        """
+        Elimina las imágenes y temporales sin uso desde hace más de `ttl` y, si
+        se supera el tamaño máximo, las imágenes menos usadas (con su
+        luminancia). Solo un proceso limpia a la vez.
+        """
+        with open(self.directorio / '.limpieza.lock', 'w') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return
+
+            limite = time.time() - self.ttl
+            imagenes: Dict[str, list] = {}
+            total = 0
+            for ruta in self.directorio.glob('*'):
+                if ruta.name.startswith('.'):
+                    continue
+                try:
+                    stat = ruta.stat()
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime < limite:
+                    ruta.unlink(missing_ok=True)
+                    continue
+                if ruta.suffix == '.tmp':
+                    continue
+                # Imagen y luminancia cuentan juntas; su último uso es el más reciente
+                entrada = imagenes.setdefault(ruta.name.split('.')[0], [0.0, 0, []])
+                entrada[0] = max(entrada[0], stat.st_mtime)
+                entrada[1] += stat.st_size
+                entrada[2].append(ruta)
+                total += stat.st_size
+
+            # Expulsar las menos usadas hasta quedar por debajo del límite
+            for _, tamano, rutas in sorted(imagenes.values(), key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                for ruta in rutas:
+                    ruta.unlink(missing_ok=True)
+                total -= tamano
+
+
+_almacen: Optional[AlmacenImagenes] = None
+
+
+def obtener_almacen() -> AlmacenImagenes:
+    """Devuelve el almacén de imágenes subidas del proceso actual."""
+    global _almacen
+    if _almacen is None:
+        _almacen = AlmacenImagenes()
+    return _almacen
+
+
+def procesar_area_de_sesion(id_imagen: str, x: int, y: int, ancho: int, alto: int,
+                            idioma: str = 'spa', nombre_archivo: Optional[str] = None,
+                            motor: str = 'tesseract') -> Dict[str, any]:
+    """
+    Procesa un área de una imagen subida previamente, sobre su luminancia ya
+    decodificada si algún proceso la decodificó antes.
+
+    Args:
+        id_imagen: Id devuelto al subir la imagen
+        x, y, ancho, alto: Área a procesar (como en procesar_area_especifica)
+        idioma: Idioma para OCR
+        nombre_archivo: Nombre a mostrar en los resultados
+        motor: Motor de OCR
+
+    Returns:
+        Resultado de procesar_area_especifica
+
+    Raises:
+        FileNotFoundError: Si la imagen no existe o ha caducado
+    """
+    luminancia = obtener_almacen().luminancia(id_imagen)
+    return procesar_area_especifica(luminancia, x, y, ancho, alto, idioma,
+                                    nombre_archivo=nombre_archivo or 'imagen', motor=motor)
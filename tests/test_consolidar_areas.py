@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la fusión de áreas rojas: la comparación vectorizada de pares
+contra la regla escalar caja a caja, y consolidar_areas con cadenas,
+contención y entrada vacía.
+"""
+
+import numpy as np
+import pytest
+
+from extractor_rojo import SOLAPE_FUSION, _pares_fusionables, consolidar_areas
+
+
+def deben_fusionarse(a, b):
+    """Regla de referencia, caja a caja, que implementa _pares_fusionables."""
+    inter_w = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    inter_h = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+
+    # Solapadas o casi duplicadas
+    if inter_w > 0 and inter_h > 0 and \
+            inter_w * inter_h >= SOLAPE_FUSION * min(a[2] * a[3], b[2] * b[3]):
+        return True
+
+    # Colineales: comparten la mayor parte de su franja vertical y el hueco es corto
+    if inter_h <= 0 or inter_h < SOLAPE_FUSION * min(a[3], b[3]):
+        return False
+    return -inter_w <= max(a[3], b[3])
+
+
+@pytest.mark.parametrize('semilla', range(20))
+def test_pares_fusionables_coincide_con_la_regla_escalar(semilla):
+    rng = np.random.default_rng(semilla)
+    n = 25
+    cajas = np.column_stack([rng.integers(0, 800, n), rng.integers(0, 600, n),
+                             rng.integers(5, 200, n), rng.integers(5, 60, n)])
+
+    pares_i, pares_j = _pares_fusionables(cajas)
+
+    esperados = {(i, j) for i in range(n) for j in range(i + 1, n)
+                 if deben_fusionarse(cajas[i], cajas[j])}
+    assert set(zip(pares_i.tolist(), pares_j.tolist())) == esperados
+
+
+def test_pares_fusionables_sin_cajas():
+    pares_i, pares_j = _pares_fusionables(np.empty((0, 4), dtype=int))
+
+    assert len(pares_i) == 0 and len(pares_j) == 0
+
+
+def test_consolidar_sin_cajas():
+    assert consolidar_areas(np.empty((0, 4), dtype=int), np.empty(0), 1000, 1000) == []
+
+
+def test_consolidar_una_sola_caja():
+    areas = consolidar_areas(np.array([[100, 100, 200, 20]]), np.array([3000.0]), 1000, 1000)
+
+    assert len(areas) == 1
+    assert areas[0]['original'] == (100, 100, 200, 20)
+
+
+def test_caja_contenida_en_otra_se_fusiona():
+    cajas = np.array([[100, 100, 300, 40], [150, 110, 50, 20]])
+
+    areas = consolidar_areas(cajas, np.array([8000.0, 800.0]), 1000, 1000)
+
+    assert len(areas) == 1
+    assert areas[0]['original'] == (100, 100, 300, 40)
+
+
+def test_subrayado_roto_en_cadena_se_fusiona_entero():
+    # Trozos en la misma línea: cada uno solo alcanza a su vecino
+    cajas = np.array([[100 + i * 120, 300, 100, 10] for i in range(5)])
+
+    areas = consolidar_areas(cajas, np.full(5, 900.0), 2000, 1000)
+
+    assert len(areas) == 1
+    assert areas[0]['original'] == (100, 300, 580, 10)
+
+
+def test_areas_lejanas_no_se_fusionan():
+    cajas = np.array([[100, 100, 200, 20], [100, 600, 200, 20], [700, 350, 200, 20]])
+
+    areas = consolidar_areas(cajas, np.full(3, 3000.0), 1000, 1000)
+
+    assert len(areas) == 3
+    assert sorted(a['original'] for a in areas) == sorted(tuple(c) for c in cajas.tolist())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas del lector de siete segmentos con displays sintéticos, con y sin el
+subrayado rojo que incluye el recorte expandido de un área.
+"""
+
+import numpy as np
+import pytest
+
+from lector_lcd import binarizar, clasificar_digito, leer_siete_segmentos, quitar_subrayado
+
+
+SEGMENTOS = {
+    '0': 'abcdef', '1': 'bc', '2': 'abged', '3': 'abgcd', '4': 'fgbc',
+    '5': 'afgcd', '6': 'afgedc', '7': 'abc', '8': 'abcdefg', '9': 'abcdfg'
+}
+
+FONDO = 210
+TINTA = 30
+# Luminancia aproximada del rojo del subrayado
+TINTA_SUBRAYADO = 80
+
+ALTO = 60
+ANCHO = 32
+GROSOR = 7
+SEPARACION = 14
+MARGEN = 20
+
+
+def dibujar_digito(lienzo: np.ndarray, x: int, y: int, digito: str):
+    """Dibuja un dígito de siete segmentos con la esquina superior izquierda en (x, y)."""
+    m = GROSOR // 2
+    mitad = ALTO // 2
+    vertical = mitad - 2 * m + GROSOR // 2
+    segmentos = {
+        'a': (x + m, y, ANCHO - 2 * m, GROSOR),
+        'f': (x, y + m, GROSOR, vertical),
+        'b': (x + ANCHO - GROSOR, y + m, GROSOR, vertical),
+        'g': (x + m, y + mitad - GROSOR // 2, ANCHO - 2 * m, GROSOR),
+        'e': (x, y + mitad + m - GROSOR // 2, GROSOR, vertical),
+        'c': (x + ANCHO - GROSOR, y + mitad + m - GROSOR // 2, GROSOR, vertical),
+        'd': (x + m, y + ALTO - GROSOR, ANCHO - 2 * m, GROSOR),
+    }
+    for segmento in SEGMENTOS[digito]:
+        sx, sy, sw, sh = segmentos[segmento]
+        lienzo[sy:sy + sh, sx:sx + sw] = TINTA
+
+
+def dibujar_display(texto: str, subrayado: bool = False, hueco: int = 3,
+                    grosor_subrayado: int = 6) -> np.ndarray:
+    """
+    Dibuja una lectura (dígitos, punto decimal y signo menos) en grises y,
+    opcionalmente, el subrayado rojo `hueco` píxeles por debajo de los dígitos.
+    """
+    anchos = [ANCHO if c.isdigit() else (8 if c == '.' else 22) for c in texto]
+    ancho_total = sum(anchos) + SEPARACION * (len(texto) - 1) + 2 * MARGEN
+    lienzo = np.full((ALTO + 2 * MARGEN + 14, ancho_total), FONDO, np.uint8)
+
+    x = MARGEN
+    for caracter, ancho in zip(texto, anchos):
+        if caracter.isdigit():
+            dibujar_digito(lienzo, x, MARGEN, caracter)
+        elif caracter == '.':
+            lienzo[MARGEN + ALTO - 8:MARGEN + ALTO, x:x + 8] = TINTA
+        elif caracter == '-':
+            lienzo[MARGEN + ALTO // 2 - 3:MARGEN + ALTO // 2 + 4, x:x + 22] = TINTA
+        x += ancho + SEPARACION
+
+    if subrayado:
+        y = MARGEN + ALTO + hueco
+        lienzo[y:y + grosor_subrayado, 10:ancho_total - 10] = TINTA_SUBRAYADO
+    return lienzo
+
+
+@pytest.mark.parametrize('digito', list(SEGMENTOS))
+def test_clasifica_cada_digito(digito):
+    lienzo = np.full((ALTO + 2 * MARGEN, ANCHO + 2 * MARGEN), FONDO, np.uint8)
+    dibujar_digito(lienzo, MARGEN, MARGEN, digito)
+
+    binaria = binarizar(lienzo)
+    ancho = 10 if digito == '1' else ANCHO
+    x = MARGEN + ANCHO - 10 if digito == '1' else MARGEN
+    clasificado = clasificar_digito(binaria, (x, MARGEN, ancho, ALTO))
+
+    assert clasificado is not None
+    assert clasificado[0] == digito
+
+
+@pytest.mark.parametrize('subrayado', [False, True])
+@pytest.mark.parametrize('texto', ['0123456789', '12.5', '-42', '8888', '7', '1'])
+def test_lee_la_lectura(texto, subrayado):
+    lectura = leer_siete_segmentos(dibujar_display(texto, subrayado=subrayado))
+
+    assert lectura is not None
+    assert lectura['texto'] == texto
+    assert lectura['nivel_ocr'] == 'lcd'
+    assert lectura['confianza'] >= 50
+
+
+@pytest.mark.parametrize('hueco', [0, 1, 3])
+@pytest.mark.parametrize('grosor', [3, 6, 10])
+def test_subrayado_pegado_o_grueso(hueco, grosor):
+    lienzo = dibujar_display('20.75', subrayado=True, hueco=hueco, grosor_subrayado=grosor)
+
+    lectura = leer_siete_segmentos(lienzo)
+
+    assert lectura is not None
+    assert lectura['texto'] == '20.75'
+
+
+def test_quitar_subrayado_no_toca_los_digitos():
+    binaria = binarizar(dibujar_display('0123456789'))
+
+    assert np.array_equal(quitar_subrayado(binaria), binaria)
+
+
+def test_quitar_subrayado_borra_sus_filas():
+    lienzo = dibujar_display('8888', subrayado=True)
+    y = MARGEN + ALTO + 3
+
+    sin_subrayado = quitar_subrayado(binarizar(lienzo))
+
+    assert not sin_subrayado[y:y + 6].any()
+    # Los segmentos inferiores siguen intactos
+    assert sin_subrayado[MARGEN + ALTO - GROSOR:MARGEN + ALTO].any()
+
+
+def test_sin_digitos_devuelve_none():
+    assert leer_siete_segmentos(np.full((80, 200), FONDO, np.uint8)) is None
+
+
+def test_recorte_demasiado_pequeno_devuelve_none():
+    assert leer_siete_segmentos(np.full((5, 5), FONDO, np.uint8)) is None
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas del presupuesto de tiempo en modo lote, con un OCR falso cuyo coste
+es proporcional a los píxeles de las áreas.
+"""
+
+import time
+
+import numpy as np
+
+import extractor_rojo
+
+
+SEGUNDOS_POR_PIXEL = 1e-5
+
+
+def ocr_falso(imagen, areas, idioma='spa'):
+    time.sleep(SEGUNDOS_POR_PIXEL * sum(w * h for _, _, w, h in areas))
+    return [{'texto': '123', 'confianza': 90.0, 'nivel_ocr': 'lote'} for _ in areas]
+
+
+def procesar(monkeypatch, presupuesto_s):
+    monkeypatch.setattr(extractor_rojo, 'extraer_textos_por_lote', ocr_falso)
+    imagen = np.zeros((2000, 2000, 3), np.uint8)
+    # Diez manchas separadas que no se fusionan entre sí
+    cajas = np.array([[100, 100 + i * 180, 300, 40] for i in range(10)])
+    pixeles = np.full(len(cajas), 3000.0)
+    return extractor_rojo.procesar_caudalimetro(
+        imagen, nombre_archivo='foto.jpg', modo_lote=True, presupuesto_s=presupuesto_s,
+        componentes=(cajas, pixeles))
+
+
+def test_sin_presupuesto_se_leen_todas(monkeypatch):
+    resultados = procesar(monkeypatch, None)
+
+    assert resultados['parcial'] is False
+    assert len(resultados['texto_rojo']) == 10
+
+
+def test_el_lote_solo_lleva_las_areas_que_caben(monkeypatch):
+    resultados = procesar(monkeypatch, 0.5)
+
+    omitidas = resultados['areas_omitidas']
+    assert resultados['parcial'] is True
+    assert 0 < len(omitidas) < 10
+    # Se omiten siempre las de menor prioridad
+    leidas = {t['prioridad'] for t in resultados['texto_rojo']}
+    assert max(leidas) < min(a['prioridad'] for a in omitidas)
+    assert 1 in leidas
+
+
+def test_presupuesto_agotado_lee_solo_la_primera(monkeypatch):
+    resultados = procesar(monkeypatch, 0.0)
+
+    assert [t['prioridad'] for t in resultados['texto_rojo']] == [1]
+    assert len(resultados['areas_omitidas']) == 9
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas del recorte de las regiones de un perfil de medidor, medidas en lados
+de QR desde su esquina superior izquierda.
+"""
+
+import numpy as np
+
+from extractor_rojo import _recortar_region_qr
+
+
+def test_region_a_la_derecha_de_un_qr_recto():
+    imagen = np.zeros((400, 600), np.uint8)
+    esquinas = np.float32([[100, 100], [200, 100], [200, 200], [100, 200]])
+    imagen[120:170, 250:350] = 255
+
+    recorte, caja = _recortar_region_qr(imagen, esquinas, (1.5, 0.2, 1.0, 0.5))
+
+    assert recorte.shape == (50, 100)
+    assert recorte.mean() > 240
+    assert caja == (250, 120, 100, 50)
+
+
+def test_region_se_endereza_con_la_foto_girada():
+    # QR girado 90° en sentido horario: su esquina superior izquierda queda arriba a la derecha
+    imagen = np.zeros((600, 800), np.uint8)
+    esquinas = np.float32([[400, 200], [400, 300], [300, 300], [300, 200]])
+    imagen[320:420, 350:400] = 255
+
+    recorte, caja = _recortar_region_qr(imagen, esquinas, (1.2, 0.0, 1.0, 0.5))
+
+    assert recorte.shape == (50, 100)
+    assert recorte.mean() > 240
+    assert caja == (350, 320, 50, 100)
+
+
+def test_region_fuera_de_la_foto_se_recorta_a_sus_bordes():
+    imagen = np.zeros((300, 300), np.uint8)
+    esquinas = np.float32([[10, 10], [60, 10], [60, 60], [10, 60]])
+
+    _, caja = _recortar_region_qr(imagen, esquinas, (-2.0, 0.0, 1.5, 1.0))
+
+    x, y, w, h = caja
+    assert x == 0 and w >= 1 and h == 50
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pruebas del gestor de trabajos asíncronos con un procesador de imágenes falso.
+"""
+
+import io
+import time
+
+from trabajos import GestorTrabajos, vista_publica
+
+
+def esperar(gestor, id_trabajo, estado='completado', intentos=100):
+    for _ in range(intentos):
+        actual = gestor.obtener(id_trabajo)
+        if actual['estado'] == estado:
+            return actual
+        time.sleep(0.02)
+    raise AssertionError(f'El trabajo no llegó a {estado}: {actual}')
+
+
+def test_trabajo_lee_las_imagenes_de_disco_y_las_borra(tmp_path):
+    gestor = GestorTrabajos(lambda datos, nombre: {'archivo': nombre, 'bytes': len(datos)},
+                            directorio=tmp_path)
+    creado = gestor.crear([(b'abc', 'a.jpg'), (io.BytesIO(b'hola!'), 'b.jpg')])
+
+    estado = esperar(gestor, creado['id'])
+
+    assert estado['resultados'] == [{'archivo': 'a.jpg', 'bytes': 3},
+                                    {'archivo': 'b.jpg', 'bytes': 5}]
+    assert not (tmp_path / creado['id']).exists()
+
+
+def test_vista_publica_oculta_el_propietario(tmp_path):
+    gestor = GestorTrabajos(lambda datos, nombre: {}, directorio=tmp_path)
+    creado = gestor.crear([(b'x', 'a.jpg')])
+
+    vista = vista_publica(esperar(gestor, creado['id']))
+
+    assert 'propietario' not in vista
+    assert set(vista) == {'id', 'estado', 'total', 'procesadas', 'resultados'}
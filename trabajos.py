@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Trabajos Asíncronos de OCR
+Recibe una o varias imágenes, devuelve un id de trabajo al instante y las procesa
+en segundo plano. El estado se guarda en disco (JOBS_DIR) para que cualquier
+worker de gunicorn pueda responder a las consultas de estado. Las imágenes se
+escriben en JOBS_DIR/<id>/ al crear el trabajo y la cola del worker solo guarda
+sus rutas. Esa cola vive en la memoria del worker: si este muere, sus trabajos
+sin terminar se marcan como error en lugar de quedarse pendientes para siempre.
+"""
+
+import os
+import re
+import json
+import socket
+import time
+import uuid
+import queue
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+from cola_ocr import ColaLlenaError, OCR_PROCESOS
+
+
+JOBS_DIR = os.getenv('JOBS_DIR', '/data/jobs')
+# Trabajos aceptados y aún sin empezar por worker antes de responder 429
+JOBS_MAX_PENDIENTES = int(os.getenv('JOBS_MAX_PENDIENTES', '20'))
+# Segundos que se conserva el estado de un trabajo terminado
+JOBS_TTL = int(os.getenv('JOBS_TTL', str(24 * 3600)))
+
+PATRON_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Cada cuántos trabajos creados se eliminan los caducados
+LIMPIEZA_CADA = 20
+
+ESTADOS_EN_CURSO = ('pendiente', 'procesando')
+
+HOST = socket.gethostname()
+
+# Campos del estado que se exponen en GET /jobs/<id>; el resto es interno
+CAMPOS_PUBLICOS = ('id', 'estado', 'total', 'procesadas', 'resultados', 'error')
+
+
+def _inicio_proceso(pid: int) -> Optional[str]:
+    """
+    Instante de arranque de un proceso (Linux, en ticks desde el arranque del
+    sistema). Distingue un worker nuevo que reutiliza el pid de uno muerto,
+    como ocurre al reiniciar el contenedor. None si no se puede leer.
+    """
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            # El nombre del proceso va entre paréntesis y puede tener espacios
+            return f.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def vista_publica(estado: Dict[str, any]) -> Dict[str, any]:
+    """Copia del estado de un trabajo sin los datos internos (host y pid del worker)."""
+    return {campo: estado[campo] for campo in CAMPOS_PUBLICOS if campo in estado}
+
+
+class GestorTrabajos:
+    """
+    Cola de trabajos en segundo plano de un worker de gunicorn.
+
+    Un thread despachador toma los trabajos en orden de llegada y reparte sus
+    imágenes entre varios threads, cada uno de los cuales espera su turno en la
+    cola de OCR (sin rechazar) para suavizar los picos de carga.
+    """
+
+    def __init__(self, procesar_imagen: Callable[..., Dict[str, any]],
+                 directorio: str = JOBS_DIR, max_pendientes: int = JOBS_MAX_PENDIENTES,
+                 hilos: int = max(1, OCR_PROCESOS)):
+        self.procesar_imagen = procesar_imagen
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._pendientes = queue.Queue(maxsize=max_pendientes)
+        self._hilos = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='trabajo')
+        self._despachador = None
+        self._creados = 0
+        self._lock = threading.Lock()
+        # Trabajos que dejó a medias un worker anterior (reiniciado o muerto por timeout)
+        self.recuperar_huerfanos()
+
+    def _ruta(self, id_trabajo: str) -> Path:
+        return self.directorio / f'{id_trabajo}.json'
+
+    def _ruta_imagenes(self, id_trabajo: str) -> Path:
+        return self.directorio / id_trabajo
+
+    def _guardar_imagenes(self, id_trabajo: str,
+                          imagenes: List[Tuple[Union[bytes, BinaryIO], str]]) -> List[Tuple[Path, str]]:
+        """Escribe las imágenes de un trabajo en su directorio y devuelve sus rutas."""
+        directorio = self._ruta_imagenes(id_trabajo)
+        directorio.mkdir()
+        rutas = []
+        for indice, (fuente, nombre) in enumerate(imagenes):
+            ruta = directorio / f'{indice:04d}'
+            with open(ruta, 'wb') as f:
+                if isinstance(fuente, (bytes, bytearray)):
+                    f.write(fuente)
+                else:
+                    shutil.copyfileobj(fuente, f)
+            rutas.append((ruta, nombre))
+        return rutas
+
+    def _borrar_imagenes(self, id_trabajo: str):
+        shutil.rmtree(self._ruta_imagenes(id_trabajo), ignore_errors=True)
+
+    def _guardar(self, estado: Dict[str, any]):
+        """Escribe el estado del trabajo de forma atómica."""
+        estado['actualizado'] = time.time()
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(estado, f, ensure_ascii=False)
+            os.replace(tmp, self._ruta(estado['id']))
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def crear(self, imagenes: List[Tuple[Union[bytes, BinaryIO], str]],
+              opciones: Optional[Dict[str, any]] = None) -> Dict[str, any]:
+        """
+        Registra un trabajo nuevo y lo encola para procesarlo en segundo plano.
+        Las imágenes se copian a disco: la cola no retiene sus bytes en memoria.
+
+        Args:
+            imagenes: Lista de tuplas (bytes o archivo abierto de la imagen,
+                      nombre de archivo)
+            opciones: Argumentos adicionales para procesar_imagen (p. ej. el
+                      motor de OCR elegido en la petición)
+
+        Returns:
+            Estado inicial del trabajo
+
+        Raises:
+            ColaLlenaError: Si hay demasiados trabajos pendientes en este worker
+        """
+        self._iniciar_despachador()
+        # Rechazar antes de copiar las imágenes si la cola ya está llena
+        if self._pendientes.full():
+            raise ColaLlenaError()
+        with self._lock:
+            self._creados += 1
+            limpiar = self._creados % LIMPIEZA_CADA == 0
+        if limpiar:
+            self.limpiar()
+
+        estado = {
+            'id': uuid.uuid4().hex,
+            'estado': 'pendiente',
+            'propietario': {'host': HOST, 'pid': os.getpid(),
+                            'inicio': _inicio_proceso(os.getpid())},
+            'creado': time.time(),
+            'total': len(imagenes),
+            'procesadas': 0,
+            'resultados': [None] * len(imagenes),
+            'opciones': opciones or {}
+        }
+        try:
+            rutas = self._guardar_imagenes(estado['id'], imagenes)
+            self._guardar(estado)
+            self._pendientes.put_nowait((estado, rutas))
+        except Exception as e:
+            self._ruta(estado['id']).unlink(missing_ok=True)
+            self._borrar_imagenes(estado['id'])
+            if isinstance(e, queue.Full):
+                raise ColaLlenaError()
+            raise
+
+        return estado
+
+    def obtener(self, id_trabajo: str) -> Optional[Dict[str, any]]:
+        """
+        Devuelve el estado de un trabajo o None si no existe. Si el worker que
+        lo procesaba ya no existe, el trabajo se marca antes como error.
+        """
+        if not PATRON_ID.match(id_trabajo):
+            return None
+        estado = self._leer(self._ruta(id_trabajo))
+        if estado is not None and self._es_huerfano(estado):
+            self._marcar_huerfano(estado)
+        return estado
+
+    def _leer(self, ruta: Path) -> Optional[Dict[str, any]]:
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _es_huerfano(self, estado: Dict[str, any]) -> bool:
+        """
+        Indica si un trabajo sin terminar pertenece a un worker que ya no existe.
+        Solo se comprueban los workers de este mismo host.
+        """
+        if estado.get('estado') not in ESTADOS_EN_CURSO:
+            return False
+        propietario = estado.get('propietario') or {}
+        pid = propietario.get('pid')
+        if propietario.get('host') != HOST or not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        # El pid existe: es otro proceso si arrancó en otro instante
+        inicio = _inicio_proceso(pid)
+        return inicio is not None and propietario.get('inicio') not in (None, inicio)
+
+    def _marcar_huerfano(self, estado: Dict[str, any]):
+        estado['estado'] = 'error'
+        estado['error'] = 'El worker que procesaba el trabajo se reinició; vuelve a enviarlo'
+        self._guardar(estado)
+        self._borrar_imagenes(estado['id'])
+
+    def recuperar_huerfanos(self):
+        """Marca como error los trabajos sin terminar de workers que ya no existen."""
+        for ruta in self.directorio.glob('*.json'):
+            estado = self._leer(ruta)
+            if estado is not None and self._es_huerfano(estado):
+                self._marcar_huerfano(estado)
+
+    def _iniciar_despachador(self):
+        """Arranca el thread despachador la primera vez (ya dentro del worker)."""
+        with self._lock:
+            if self._despachador is None:
+                self._despachador = threading.Thread(
+                    target=self._despachar, name='despachador-trabajos', daemon=True
+                )
+                self._despachador.start()
+
+    def _despachar(self):
+        while True:
+            estado, imagenes = self._pendientes.get()
+            try:
+                self._ejecutar(estado, imagenes)
+            except Exception as e:
+                estado['estado'] = 'error'
+                estado['error'] = str(e)
+                self._guardar(estado)
+            finally:
+                self._borrar_imagenes(estado['id'])
+
+    def _ejecutar(self, estado: Dict[str, any], imagenes: List[Tuple[Path, str]]):
+        """Procesa las imágenes de un trabajo y actualiza su estado al terminar cada una."""
+        estado['estado'] = 'procesando'
+        self._guardar(estado)
+
+        def procesar(indice: int):
+            ruta, nombre = imagenes[indice]
+            try:
+                resultado = self.procesar_imagen(ruta.read_bytes(), nombre, **estado['opciones'])
+            except Exception as e:
+                resultado = {'archivo': nombre, 'error': str(e)}
+            with self._lock:
+                estado['resultados'][indice] = resultado
+                estado['procesadas'] += 1
+                self._guardar(estado)
+
+        list(self._hilos.map(procesar, range(len(imagenes))))
+
+        estado['estado'] = 'completado'
+        self._guardar(estado)
+
+    def limpiar(self):
+        """
+        Elimina el estado y las imágenes de los trabajos más antiguos que
+        JOBS_TTL (las imágenes de trabajos interrumpidos quedan huérfanas).
+        """
+        limite = time.time() - JOBS_TTL
+        for ruta in self.directorio.glob('*'):
+            try:
+                if ruta.stat().st_mtime < limite:
+                    if ruta.is_dir():
+                        shutil.rmtree(ruta, ignore_errors=True)
+                    else:
+                        ruta.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue